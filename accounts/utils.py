@@ -2,6 +2,8 @@ import os
 import boto3
 import string
 import secrets
+import threading
+from cachetools import TLRUCache
 from django.conf import settings
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
@@ -9,24 +11,82 @@ from datetime import datetime, timedelta
 from datetime import datetime
 
 
-def generate_presigned_url(file_name, expiration=3600):
+# 署名付きURLの有効期限（秒）
+PRESIGNED_URL_EXPIRATION = 3600
+
+# 署名付きURLをキャッシュから返すのは、有効期限のこの秒数前まで
+# （クライアントが受け取ったURLをすぐに使えなくならないよう余裕を持たせる）
+PRESIGNED_URL_CACHE_MARGIN = 600
+
+# 署名付きURLのキャッシュの件数
+PRESIGNED_URL_CACHE_SIZE = 4096
+
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+# (ファイル名, 有効期限) → 署名付きURL。キャッシュの有効期限は署名の有効期限より短くする
+_presigned_url_cache = TLRUCache(
+    maxsize=PRESIGNED_URL_CACHE_SIZE,
+    ttu=lambda key, value, now: now + max(key[1] - PRESIGNED_URL_CACHE_MARGIN, 0),
+)
+_presigned_url_cache_lock = threading.Lock()
+
+
+def get_s3_client():
+    """ S3クライアントを返す（プロセス内で1つを使い回す。boto3のクライアントはスレッドセーフ） """
+    global _s3_client
+    if _s3_client is None:
+        with _s3_client_lock:
+            if _s3_client is None:
+                _s3_client = boto3.client(
+                    "s3",
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region_name=settings.AWS_S3_REGION_NAME
+                )
+    return _s3_client
+
+
+def generate_presigned_url(file_name, expiration=PRESIGNED_URL_EXPIRATION):
     """ S3の署名付きURLを発行する（有効期限: 1時間）"""
+    return generate_presigned_urls([file_name], expiration)[file_name]
+
+
+def generate_presigned_urls(file_names, expiration=PRESIGNED_URL_EXPIRATION):
+    """
+    複数のファイルの署名付きURLをまとめて発行する
+
+    有効期限まで十分な時間が残っているURLはキャッシュから返し、それ以外のみ署名する。
+
+    Returns:
+        dict: {ファイル名: 署名付きURL}
+    """
     if settings.DEBUG:
-        return "http://localhost:8000/media/" + file_name
-    else:
-        s3_client = boto3.client(
-            "s3",
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_S3_REGION_NAME
-        )
-
-        url = s3_client.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": settings.AWS_STORAGE_BUCKET_NAME, "Key": "media/images/" + file_name},
-            ExpiresIn=expiration  # 署名の有効期限（秒）
-        )
-    return url
+        return {file_name: "http://localhost:8000/media/" + file_name for file_name in file_names}
+
+    urls = {}
+    with _presigned_url_cache_lock:
+        for file_name in file_names:
+            url = _presigned_url_cache.get((file_name, expiration))
+            if url is not None:
+                urls[file_name] = url
+
+    missing = [file_name for file_name in dict.fromkeys(file_names) if file_name not in urls]
+    if missing:
+        s3_client = get_s3_client()
+        signed = {
+            file_name: s3_client.generate_presigned_url(
+                "get_object",
+                Params={"Bucket": settings.AWS_STORAGE_BUCKET_NAME, "Key": "media/images/" + file_name},
+                ExpiresIn=expiration  # 署名の有効期限（秒）
+            )
+            for file_name in missing
+        }
+        with _presigned_url_cache_lock:
+            for file_name, url in signed.items():
+                _presigned_url_cache[(file_name, expiration)] = url
+        urls.update(signed)
+    return urls
 
 
 def generate_token(length=6):
@@ -0,0 +1,78 @@
+import pytest
+from django.contrib.auth import get_user_model
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from meal.models import MealRecord
+from weight.models import WeightRecord
+from workout.models import WorkoutSession
+
+User = get_user_model()
+
+
+@pytest.fixture
+def api_client():
+    """ テスト用のAPIクライアント """
+    return APIClient()
+
+
+@pytest.fixture
+def user():
+    """ テスト用のユーザー（メール認証済み） """
+    user = User.objects.create_user(
+        username="test_user", email="test@example.com", name="テストユーザー", password="password123")
+    user.is_active = True
+    user.save()
+    return user
+
+
+# ✅ 正常系テスト
+@pytest.mark.django_db
+def test_daily_activity_counts(api_client, user, django_assert_max_num_queries):
+    """ ✅ 日ごとのトレーニング・食事・体重の記録件数を返す（種類ごとに1回の集計クエリ） """
+    WorkoutSession.objects.create(user_id=user, name="胸トレーニング", date="2025-01-15")
+    MealRecord.objects.create(user=user, date="2025-01-15", time_of_day="朝食")
+    MealRecord.objects.create(user=user, date="2025-01-15", time_of_day="昼食")
+    MealRecord.objects.create(user=user, date="2025-01-20", time_of_day="夕食")
+    # 日本時間では1月20日
+    WeightRecord.objects.create(user=user, weight=65, record_date="2025-01-19T16:00:00Z")
+    api_client.force_login(user)
+
+    with django_assert_max_num_queries(5):
+        response = api_client.get("/api/activity/daily/", {"date_from": "2025-01-01", "date_to": "2025-01-31"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["totals"] == {"workout": 1, "meal": 3, "weight": 1}
+    assert [(str(day["date"]), day["workout"], day["meal"], day["weight"]) for day in response.data["days"]] == [
+        ("2025-01-15", 1, 2, 0),
+        ("2025-01-20", 0, 1, 1),
+    ]
+
+
+@pytest.mark.django_db
+def test_daily_activity_etag(api_client, user):
+    """ ✅ 内容が変わっていない場合、If-None-Match のETagが一致すれば304を返す """
+    params = {"date_from": "2025-01-01", "date_to": "2025-12-31"}
+    MealRecord.objects.create(user=user, date="2025-01-15", time_of_day="朝食")
+    api_client.force_login(user)
+
+    etag = api_client.get("/api/activity/daily/", params)["ETag"]
+    response = api_client.get("/api/activity/daily/", params, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert not response.content
+
+    MealRecord.objects.create(user=user, date="2025-02-01", time_of_day="朝食")
+    response = api_client.get("/api/activity/daily/", params, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_200_OK
+    assert response["ETag"] != etag
+
+
+# ❌ 異常系テスト
+@pytest.mark.django_db
+def test_daily_activity_range_too_long(api_client, user):
+    """ ❌ 期間が1年を超える場合はエラー """
+    api_client.force_login(user)
+
+    response = api_client.get("/api/activity/daily/", {"date_from": "2024-01-01", "date_to": "2025-01-31"})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,19 @@
+from django.urls import path
+from .views import DailyActivityView
+
+# Activity API URLs
+#
+# 日ごとの活動（トレーニング・食事・体重の記録件数）のAPIエンドポイントを定義します。
+#
+# Endpoints:
+#   - /api/activity/daily/ (GET): 日ごとの活動件数取得（カレンダーのヒートマップ用、ETag対応）
+#
+# Authentication:
+#   - すべてのエンドポイントで認証が必要
+#   - ユーザーは自分のデータのみアクセス可能
+#
+# Tags: 活動
+
+urlpatterns = [
+    path('daily/', DailyActivityView.as_view(), name='activity-daily'),
+]
@@ -0,0 +1,52 @@
+""" 日ごとの活動件数の集計
+
+トレーニングセッション・食事記録・体重記録の件数を、それぞれ1回の GROUP BY 日付 のクエリで集計する。
+体重記録の日時は現在のタイムゾーン（Asia/Tokyo）の日付で集計する。
+"""
+
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+from meal.models import MealRecord
+from weight.models import WeightRecord
+from workout.models import WorkoutSession
+
+# 集計する活動の種類
+ACTIVITY_TYPES = ("workout", "meal", "weight")
+
+
+def _count_by_date(queryset, date_field) -> dict:
+    """ 日付ごとの件数 {日付: 件数} を1回のクエリで集計する """
+    return dict(
+        queryset.values(date_field).annotate(count=Count("pk")).values_list(date_field, "count").order_by()
+    )
+
+
+def compute_daily_activity(user, date_from, date_to) -> dict:
+    """
+    期間内の日ごとの活動件数を集計する
+
+    Returns:
+        dict: {
+            "totals": {"workout": 件数, "meal": 件数, "weight": 件数},
+            "days": [{"date", "workout", "meal", "weight"}, ...]（活動のある日のみ、日付の昇順）
+        }
+    """
+    counts = {
+        "workout": _count_by_date(
+            WorkoutSession.objects.filter(user_id=user, date__range=(date_from, date_to)), "date"),
+        "meal": _count_by_date(
+            MealRecord.objects.filter(user=user, date__range=(date_from, date_to)), "date"),
+        "weight": _count_by_date(
+            WeightRecord.objects.annotate(day=TruncDate("record_date")).filter(
+                user=user, day__range=(date_from, date_to)), "day"),
+    }
+
+    days = sorted(set().union(*counts.values()))
+    return {
+        "totals": {activity: sum(counts[activity].values()) for activity in ACTIVITY_TYPES},
+        "days": [
+            {"date": day, **{activity: counts[activity].get(day, 0) for activity in ACTIVITY_TYPES}}
+            for day in days
+        ],
+    }
@@ -0,0 +1,107 @@
+import hashlib
+import json
+from datetime import date, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.http import parse_etags, quote_etag
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiExample, OpenApiParameter, extend_schema
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .utils import compute_daily_activity
+
+# 一度に取得できる期間の最大日数（1年分、うるう年を含む）
+MAX_ACTIVITY_RANGE_DAYS = 366
+
+
+class DailyActivityView(APIView):
+    """
+    日ごとの活動件数API（カレンダーのヒートマップ用）
+
+    指定期間のトレーニングセッション・食事記録・体重記録の件数を日ごとに返します。
+    ETagに対応しており、If-None-Matchが一致する場合は304を返します。
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(
+        summary="日ごとの活動件数取得",
+        description=(
+            "カレンダーのヒートマップ用に、指定期間のトレーニングセッション・食事記録・体重記録の件数を日ごとに返します。"
+            f"期間は最大{MAX_ACTIVITY_RANGE_DAYS}日で、指定しない場合は本日までの1年間です。"
+            "days には活動のある日のみを日付の昇順で返します。"
+            "レスポンスの ETag を次回のリクエストの If-None-Match に指定すると、内容が変わっていない場合は本文なしの304を返します。"
+        ),
+        parameters=[
+            OpenApiParameter(
+                name='date_from',
+                type=OpenApiTypes.DATE,
+                location=OpenApiParameter.QUERY,
+                description='開始日（YYYY-MM-DD形式）。指定しない場合は終了日の1年前の翌日',
+            ),
+            OpenApiParameter(
+                name='date_to',
+                type=OpenApiTypes.DATE,
+                location=OpenApiParameter.QUERY,
+                description='終了日（YYYY-MM-DD形式）。指定しない場合は本日',
+            ),
+        ],
+        examples=[
+            OpenApiExample(
+                '日ごとの活動件数',
+                value={
+                    "date_from": "2024-01-01",
+                    "date_to": "2024-12-31",
+                    "totals": {"workout": 2, "meal": 4, "weight": 1},
+                    "days": [
+                        {"date": "2024-01-15", "workout": 1, "meal": 3, "weight": 1},
+                        {"date": "2024-01-16", "workout": 1, "meal": 1, "weight": 0},
+                    ],
+                },
+                response_only=True,
+            ),
+        ],
+        responses={
+            200: {"description": "日ごとの活動件数"},
+            304: {"description": "If-None-Match のETagと内容が一致する場合（本文なし）"},
+            400: {"description": "日付形式が正しくない、または期間が長すぎる場合"},
+        },
+        tags=["活動"]
+    )
+    def get(self, request):
+        """期間内の日ごとの活動件数を取得"""
+        try:
+            date_to = date.fromisoformat(request.query_params['date_to']) \
+                if request.query_params.get('date_to') else timezone.localdate()
+            date_from = date.fromisoformat(request.query_params['date_from']) \
+                if request.query_params.get('date_from') else date_to - timedelta(days=MAX_ACTIVITY_RANGE_DAYS - 1)
+        except ValueError:
+            return Response(
+                {"error": "日付形式が正しくありません。YYYY-MM-DD形式で入力してください。"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if date_from > date_to or (date_to - date_from).days >= MAX_ACTIVITY_RANGE_DAYS:
+            return Response(
+                {"error": f"期間は開始日から{MAX_ACTIVITY_RANGE_DAYS}日以内で指定してください。"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        data = {
+            "date_from": date_from.isoformat(),
+            "date_to": date_to.isoformat(),
+            **compute_daily_activity(request.user, date_from, date_to),
+        }
+
+        # 内容から計算したETagが一致する場合は本文を返さない
+        body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+        etag = quote_etag(hashlib.sha1(f"{request.user.pk}:{body}".encode()).hexdigest())
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        # ブラウザ・プロキシでもETagで再検証させる（ユーザーごとの内容のため共有キャッシュには保存しない）
+        response['Cache-Control'] = 'private, no-cache'
+        return response
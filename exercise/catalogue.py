@@ -0,0 +1,97 @@
+""" エクササイズの部位別カタログ
+
+公式エクササイズの部位別一覧はプロセス内にキャッシュし、ユーザーが作成したエクササイズのみリクエストごとに取得して合わせる。
+公式エクササイズの件数・最終更新日時（カテゴリの最終更新日時を含む）をバージョンとして持ち、
+管理画面などで公式エクササイズ・カテゴリが変更された場合も次回の取得時に作り直す。
+"""
+
+import threading
+
+from django.db.models import Count, Max
+
+from .models import Exercise
+
+
+def _exercise_entry(exercise) -> dict:
+    return {
+        'id': exercise.id,
+        'name': exercise.name,
+        'description': exercise.description,
+        'type': exercise.exercise_type,
+    }
+
+
+class OfficialCatalogue:
+    """ 公式エクササイズの部位別一覧のキャッシュ """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._categories = {}
+
+    def _current_version(self):
+        stamp = Exercise.objects.filter(is_official=True).aggregate(
+            count=Count('pk'), updated_at=Max('updated_at'), category_updated_at=Max('category__updated_at'))
+        return (stamp['count'], stamp['updated_at'], stamp['category_updated_at'])
+
+    def clear(self):
+        """ キャッシュを削除する（次回の取得時に作り直す） """
+        with self._lock:
+            self._version = None
+            self._categories = {}
+
+    def get(self) -> dict:
+        """
+        公式エクササイズの部位別一覧を返す
+
+        Returns:
+            dict: {カテゴリID: (カテゴリ名, [エクササイズ, ...])}（カテゴリIDの昇順、エクササイズは名前順）
+        """
+        version = self._current_version()
+        if version == self._version:
+            return self._categories
+
+        with self._lock:
+            if version != self._version:
+                categories = {}
+                exercises = Exercise.objects.filter(is_official=True).select_related('category').order_by(
+                    'category_id', 'name')
+                for exercise in exercises:
+                    categories.setdefault(exercise.category_id, (exercise.category.name, []))[1].append(
+                        _exercise_entry(exercise))
+                self._categories, self._version = categories, version
+            return self._categories
+
+
+_official_catalogue = OfficialCatalogue()
+
+
+def clear_official_catalogue():
+    """ 公式エクササイズの部位別一覧のキャッシュを削除する """
+    _official_catalogue.clear()
+
+
+def build_exercise_catalogue(user) -> dict:
+    """
+    ユーザーが使用できるエクササイズを部位別にまとめる
+
+    公式エクササイズはキャッシュから取得し、ユーザーが作成したエクササイズを1回のクエリで取得して
+    カテゴリごとに先頭に加える。
+
+    Returns:
+        dict: {カテゴリ名: [{"id", "name", "description", "type"}, ...]}（カテゴリIDの昇順、エクササイズのないカテゴリは含まない）
+    """
+    official = _official_catalogue.get()
+
+    custom = {}
+    for exercise in Exercise.objects.filter(is_official=False, created_by=user).select_related(
+            'category').order_by('category_id', 'name'):
+        custom.setdefault(exercise.category_id, (exercise.category.name, []))[1].append(_exercise_entry(exercise))
+
+    result = {}
+    for category_id in sorted(official.keys() | custom.keys()):
+        name, official_exercises = official.get(category_id, (None, []))
+        custom_name, custom_exercises = custom.get(category_id, (None, []))
+        # ユーザー作成分を上位に表示
+        result[name or custom_name] = custom_exercises + official_exercises
+    return result
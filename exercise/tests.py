@@ -1,3 +1,111 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+import pytest
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from exercise.catalogue import clear_official_catalogue
+from exercise.models import Exercise, ExerciseCategory
+from exercise.views import ExerciseViewSet
+from workout.models import WorkoutExercise, WorkoutSession
+
+User = get_user_model()
+
+
+@pytest.fixture(autouse=True)
+def clear_catalogue():
+    """ テスト間で公式エクササイズのキャッシュを共有しない """
+    clear_official_catalogue()
+
+
+@pytest.fixture
+def api_client():
+    """ テスト用のAPIクライアント """
+    return APIClient()
+
+
+@pytest.fixture
+def user():
+    """ テスト用のユーザー（メール認証済み） """
+    user = User.objects.create_user(
+        username="test_user", email="test@example.com", name="テストユーザー", password="password123")
+    user.is_active = True
+    user.save()
+    return user
+
+
+@pytest.fixture
+def category():
+    return ExerciseCategory.objects.create(name="胸")
+
+
+def log_exercises(user, exercises, days_ago):
+    """ 指定日数前のトレーニングセッションにエクササイズを記録するヘルパー関数 """
+    session = WorkoutSession.objects.create(
+        user_id=user, name="トレーニング", date=timezone.localdate() - timedelta(days=days_ago))
+    WorkoutExercise.objects.bulk_create([
+        WorkoutExercise(workout_session_id=session, exercise=exercise, order=order)
+        for order, exercise in enumerate(exercises, start=1)
+    ])
+
+
+# ✅ 正常系テスト
+@pytest.mark.django_db
+def test_exercise_catalogue_grouped_by_category(api_client, user, category, django_assert_num_queries):
+    """ ✅ 部位別にまとめ、ユーザー作成分を上位に表示する。公式エクササイズはキャッシュし、変更は次回に反映する """
+    back = ExerciseCategory.objects.create(name="背中")
+    for name, exercise_category in (("ベンチプレス", category), ("ダンベルフライ", category), ("デッドリフト", back)):
+        Exercise.objects.create(name=name, category=exercise_category, description="", is_official=True)
+    Exercise.objects.create(name="マイプレス", category=category, description="", created_by=user)
+    api_client.force_login(user)
+
+    response = api_client.get("/api/exercises/exercises/")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert list(response.data) == ["胸", "背中"]
+    assert [exercise["name"] for exercise in response.data["胸"]] == ["マイプレス", "ダンベルフライ", "ベンチプレス"]
+    assert response.data["胸"][0]["type"] == "user"
+
+    # 2回目は公式エクササイズを取得しない（セッション・ユーザー・バージョン・ユーザー作成分・使用頻度）
+    with django_assert_num_queries(5):
+        api_client.get("/api/exercises/exercises/")
+
+    Exercise.objects.create(name="懸垂", category=back, description="", is_official=True)
+    response = api_client.get("/api/exercises/exercises/")
+    assert [exercise["name"] for exercise in response.data["背中"]] == ["デッドリフト", "懸垂"]
+
+
+@pytest.mark.django_db
+def test_frequent_exercises_weighted_by_recency(api_client, user, category):
+    """ ✅ よく使うエクササイズは最近の記録ほど重く数える """
+    bench, fly, press = (
+        Exercise.objects.create(name=name, category=category, description="", is_official=True)
+        for name in ("ベンチプレス", "ダンベルフライ", "チェストプレス")
+    )
+    # ベンチプレスは半年前に5回、ダンベルフライは先週に2回、チェストプレスは今日1回
+    for _ in range(5):
+        log_exercises(user, [bench], days_ago=180)
+    for _ in range(2):
+        log_exercises(user, [fly], days_ago=7)
+    log_exercises(user, [press], days_ago=0)
+    api_client.force_login(user)
+
+    response = api_client.get("/api/exercises/exercises/")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [exercise["name"] for exercise in response.data["よく使う"]] == [
+        "ダンベルフライ", "チェストプレス", "ベンチプレス"]
+
+
+@pytest.mark.django_db
+def test_frequent_exercises_excludes_other_users_exercises(user, category):
+    """ ✅ 他のユーザーが作成したエクササイズは「よく使う」に含めない """
+    other = User.objects.create_user(
+        username="other_user", email="other@example.com", name="他のユーザー", password="password123")
+    official = Exercise.objects.create(name="ベンチプレス", category=category, description="", is_official=True)
+    custom = Exercise.objects.create(name="マイ種目", category=category, description="", created_by=other)
+    log_exercises(user, [official, custom], days_ago=0)
+
+    assert set(ExerciseViewSet()._get_user_exercise_usage(user)) == {official.id}
@@ -2,17 +2,26 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.db.models import Count, Q, Case, When, IntegerField
+from django.utils import timezone
 from collections import defaultdict
 from drf_spectacular.utils import extend_schema, extend_schema_view
 
+from .catalogue import build_exercise_catalogue
 from .models import ExerciseCategory, Exercise
 from .serializers import ExerciseCategorySerializer, ExerciseSerializer, ExerciseListSerializer
 
+# よく使うエクササイズの使用回数の重みが半分になる日数（古い記録ほど重みを小さくする）
+FREQUENT_EXERCISE_HALF_LIFE_DAYS = 28
+
 
 @extend_schema_view(
     list=extend_schema(
         summary="エクササイズ部位別一覧取得",
-        description="エクササイズを部位別にグループ化して取得します。よく使うエクササイズは履歴に基づいてソートされ、ユーザーが作成したエクササイズが上位に表示されます。",
+        description=(
+            "エクササイズを部位別にグループ化して取得します。ユーザーが作成したエクササイズが上位に表示されます。"
+            "「よく使う」にはトレーニング履歴で使用回数の多いエクササイズが入ります。"
+            f"使用回数は最近の記録ほど重く数えます（{FREQUENT_EXERCISE_HALF_LIFE_DAYS}日前の記録は重みが半分）。"
+        ),
         tags=["エクササイズ"]
     ),
     create=extend_schema(
@@ -71,11 +80,6 @@ class ExerciseViewSet(viewsets.ModelViewSet):
 
     def list(self, request, *args, **kwargs):
         """エクササイズを部位別にグループ化して返す"""
-        # カテゴリ別にエクササイズを取得
-        categories = ExerciseCategory.objects.prefetch_related(
-            'exercises'
-        ).all()
-
         # ユーザーのエクササイズ使用頻度を計算
         exercise_usage = self._get_user_exercise_usage(request.user)
 
@@ -83,40 +87,12 @@ class ExerciseViewSet(viewsets.ModelViewSet):
 
         # よく使うエクササイズを先に作成
         frequent_exercises = self._get_frequent_exercises(request.user, exercise_usage)
-        print(frequent_exercises)
         if frequent_exercises:
             result['よく使う'] = frequent_exercises
 
-        # 部位別エクササイズを作成
-        for category in categories:
-            exercises = []
-
-            # ユーザーがアクセス可能なエクササイズを取得（ユーザー作成分を上位に）
-            category_exercises = Exercise.objects.filter(
-                category=category
-            ).filter(
-                Q(is_official=True) | Q(created_by=request.user)
-            ).order_by(
-                Case(
-                    When(is_official=True, then=1),
-                    When(is_official=False, then=0),
-                    output_field=IntegerField()
-                ),
-                'name'
-            )
-
-            for exercise in category_exercises:
-                exercises.append({
-                    'id': exercise.id,
-                    'name': exercise.name,
-                    'description': exercise.description,
-                    'type': exercise.exercise_type
-                })
-
-            if exercises:
-                result[category.name] = exercises
+        # 部位別エクササイズを作成（公式エクササイズはキャッシュ、ユーザー作成分を上位に）
+        result.update(build_exercise_catalogue(request.user))
 
-        print(result)
         return Response(result)
 
     def create(self, request, *args, **kwargs):
@@ -204,47 +180,55 @@ class ExerciseViewSet(viewsets.ModelViewSet):
         return obj
 
     def _get_user_exercise_usage(self, user):
-        """ユーザーのエクササイズ使用頻度を取得"""
-        from workout.models import WorkoutExercise
+        """
+        ユーザーのエクササイズ使用頻度を取得
 
-        usage = defaultdict(int)
+        エクササイズ・トレーニング日ごとの使用回数を1回の集計クエリで取得し、
+        トレーニング日が古いほど重みを小さくして（半減期 FREQUENT_EXERCISE_HALF_LIFE_DAYS 日の指数減衰）合計する。
+        ユーザーが使用できない（他のユーザーが作成した）エクササイズは含めない。
 
-        # 統合されたExerciseモデルでの使用頻度を計算
-        workout_exercises = WorkoutExercise.objects.filter(
-            workout_session_id__user_id=user
-        ).select_related('exercise')
+        Returns:
+            dict: {エクササイズID: 重み付きの使用回数}
+        """
+        from workout.models import WorkoutExercise
 
-        for workout_exercise in workout_exercises:
-            usage[workout_exercise.exercise.id] += 1
+        rows = WorkoutExercise.objects.filter(
+            Q(exercise__is_official=True) | Q(exercise__created_by=user),
+            workout_session_id__user_id=user,
+        ).values('exercise_id', 'workout_session_id__date').annotate(count=Count('id')).values_list(
+            'exercise_id', 'workout_session_id__date', 'count'
+        ).order_by()
+
+        today = timezone.localdate()
+        usage = defaultdict(float)
+        for exercise_id, day, count in rows:
+            # 未来の日付のセッションは今日の記録として扱う
+            age = max((today - day).days, 0)
+            usage[exercise_id] += count * 0.5 ** (age / FREQUENT_EXERCISE_HALF_LIFE_DAYS)
 
         return usage
 
     def _get_frequent_exercises(self, user, exercise_usage, limit=4):
-        """よく使うエクササイズを取得"""
+        """よく使うエクササイズを取得（重み付きの使用回数の多い順、同じ場合はIDの昇順）"""
         if not exercise_usage:
             return []
 
         # 使用頻度順にソート
-        sorted_exercises = sorted(exercise_usage.items(), key=lambda x: x[1], reverse=True)[:limit]
-
-        frequent_exercises = []
-        for exercise_id, usage_count in sorted_exercises:
-            try:
-                exercise = Exercise.objects.get(
-                    id=exercise_id,
-                    **({'is_official': True} if Exercise.objects.get(id=exercise_id).is_official
-                       else {'created_by': user})
-                )
-                frequent_exercises.append({
-                    'id': exercise.id,
-                    'name': exercise.name,
-                    'description': exercise.description,
-                    'type': exercise.exercise_type
-                })
-            except Exercise.DoesNotExist:
-                continue
-
-        return frequent_exercises
+        top_ids = [
+            exercise_id
+            for exercise_id, _ in sorted(exercise_usage.items(), key=lambda x: (-x[1], x[0]))[:limit]
+        ]
+        exercises = Exercise.objects.in_bulk(top_ids)
+
+        return [
+            {
+                'id': exercise.id,
+                'name': exercise.name,
+                'description': exercise.description,
+                'type': exercise.exercise_type
+            }
+            for exercise in (exercises[exercise_id] for exercise_id in top_ids)
+        ]
 
 
 @extend_schema_view(
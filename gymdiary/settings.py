@@ -60,11 +60,14 @@ INSTALLED_APPS = [
     'myset',  # マイセット管理
     'workout',  # ワークアウト管理
     'exercise',  # エクササイズ管理
+    'activity',  # 日ごとの活動（カレンダーのヒートマップ）
 
 
     'drf_spectacular',
     'corsheaders',
     'storages',
+    'django_tasks',
+    'django_tasks.backends.database',  # バックグラウンドタスクのキュー（DatabaseBackend用）
 
     # Wagtail関連のアプリを追加
     'health_hub',
@@ -369,3 +372,20 @@ EMAIL_HOST_PASSWORD = env("EMAIL_HOST_PASSWORD", default="")
 DEFAULT_FROM_EMAIL = env("DEFAULT_FROM_EMAIL", default=EMAIL_HOST_USER)
 
 GOOGLE_CALENDAR_ID = env("GOOGLE_CALENDAR_ID", default="")
+
+
+# キャッシュの設定（推奨量・トレーニングの分析結果など）
+# 無効化をキャッシュ経由で全プロセスに伝えるため、本番ではプロセス間で共有するキャッシュを使う
+# （デフォルトはDBキャッシュ。`python manage.py createcachetable` でテーブルを作成する）
+CACHES = {
+    "default": env.cache("CACHE_URL", default="locmemcache://" if DEBUG else "dbcache://django_cache"),
+}
+
+
+# バックグラウンドタスクの設定（食事写真の変換など）
+# 本番では DatabaseBackend を指定し、`python manage.py db_worker` でワーカーを起動する
+TASKS = {
+    "default": {
+        "BACKEND": env("TASKS_BACKEND", default="django_tasks.backends.immediate.ImmediateBackend"),
+    }
+}
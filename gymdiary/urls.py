@@ -42,6 +42,7 @@ urlpatterns = [
     path('api/mysets/', include('myset.urls')),
     path('api/workouts/', include('workout.urls')),
     path('api/exercises/', include('exercise.urls')),
+    path('api/activity/', include('activity.urls')),
 
     # 管理画面
     path('admin/', admin.site.urls),
@@ -6,3 +6,5 @@ from .models import *
 admin.site.register(MealItem)
 admin.site.register(MealRecord)
 admin.site.register(MealRecordItem)
+admin.site.register(DailyNutritionSummary)
+admin.site.register(MealPhoto)
@@ -1,31 +1,167 @@
 """ 公式食品データをスプレッドシートからインポートするコマンド
 
-このスクリプトは、Googleスプレッドシートから公式食品データをインポートし、Djangoのデータベースに保存します。
+このスクリプトは、Googleスプレッドシート（またはローカルのCSV/XLSXファイル）から公式食品データをインポートし、
+Djangoのデータベースに保存します。
 スプレッドシートのデータは、食品ID、食品名、カロリー、たんぱく質、脂質、炭水化物、単位、基準量を含みます。
 
 1. Google Cloud APIの認証情報を取得し、`google_cloud_api_credentials.json`として保存する
+   （--file でCSV/XLSXファイルを指定する場合は不要）
 2. スプレッドシートのIDとシート名を指定する
-3. スプレッドシートからデータを取得し、`MealItem`モデルに保存する
-4. 既存のデータは更新し、新しいデータは作成する
-5. 結果を表示する
+3. データを一定件数ずつ読み込み、既存の食品（食品ID = official_id）をまとめて取得する
+4. 既存のデータは変更のあったもののみ一括更新し、新しいデータは一括作成する
+5. 更新した食品を記録した日の日次栄養サマリーを再計算する
+6. 作成・更新・変更なし・スキップの件数を表示する（--dry-run の場合は保存しない）
+
+使用例:
+    python manage.py import_official_mealitems
+    python manage.py import_official_mealitems --file 食品マスタ.xlsx --dry-run
 """
 
-import gspread
+import csv
 import os
-from google.oauth2 import service_account
-from django.conf import settings
-from django.core.management.base import BaseCommand
+from pathlib import Path
 
-import pprint
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
 from accounts.models import CustomUser
 from meal.models import MealItem
+from meal.utils.search import rebuild_search_index
+from meal.utils.summary import refresh_summaries_for_meal_items
+
+# --- スプレッドシートのIDとシート名 ---
+SPREADSHEET_ID = '1sy1rOzudorM_bkRVk7TZ-27VF3BMovj96kDQ0-h9YPk'
+SHEET_NAME = '食品マスタ'
+
+# --- 食品IDの列 ---
+OFFICIAL_ID_COLUMN = '食品ID'
+
+# --- MealItemのフィールド → 列名 ---
+TEXT_COLUMNS = {
+    "name": "食品名",
+    "unit": "単位",
+}
+NUMBER_COLUMNS = {
+    "calories": "カロリー",
+    "protein": "たんぱく質(g)",
+    "fat": "脂質(g)",
+    "carbs": "炭水化物(g)",
+    "base_quantity": "基準量",
+
+    # 拡張栄養素
+    "vitamin_a": "ビタミンA(μg)",
+    "vitamin_d": "ビタミンD(μg)",
+    "vitamin_e": "ビタミンE(mg)",
+    "vitamin_k": "ビタミンK(μg)",
+    "vitamin_b1": "ビタミンB1(mg)",
+    "vitamin_b2": "ビタミンB2(mg)",
+    "niacin": "ナイアシン(mg)",
+    "vitamin_b6": "ビタミンB6(mg)",
+    "vitamin_b12": "ビタミンB12(μg)",
+    "folic_acid": "葉酸(μg)",
+    "pantothenic_acid": "パントテン酸(mg)",
+    "biotin": "ビオチン(μg)",
+    "vitamin_c": "ビタミンC(mg)",
+    "sodium": "ナトリウム(g)",
+    "potassium": "カリウム(mg)",
+    "calcium": "カルシウム(mg)",
+    "magnesium": "マグネシウム(mg)",
+    "phosphorus": "リン(mg)",
+    "iron": "鉄(mg)",
+    "zinc": "亜鉛(mg)",
+    "copper": "銅(mg)",
+    "manganese": "マンガン(mg)",
+    "iodine": "ヨウ素(μg)",
+    "selenium": "セレン(μg)",
+    "chromium": "クロム(μg)",
+    "molybdenum": "モリブデン(μg)",
+    "cholesterol": "コレステロール(mg)",
+    "dietary_fiber": "食物繊維(g)",
+    "salt_equivalent": "食塩相当量(g)",
+}
+
+# --- 空欄にできないフィールド ---
+REQUIRED_FIELDS = ("name", "unit", "calories", "protein", "fat", "carbs", "base_quantity")
+
+# --- インポートで更新するフィールド ---
+IMPORT_FIELDS = tuple(TEXT_COLUMNS) + tuple(NUMBER_COLUMNS) + ("is_official",)
+
+
+def parse_float(value):
+    try:
+        return float(value) if value not in ["", None] else None
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_official_id(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def iter_chunks(rows, size):
+    """ 行を size 件ずつのリストにまとめて返す """
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
 
 class Command(BaseCommand):
-    help = 'スプレッドシートから公式MealItemをインポート（更新 or 作成）'
+    help = 'スプレッドシート（またはCSV/XLSXファイル）から公式MealItemをインポート（更新 or 作成）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help='読み込むCSV/XLSXファイル（指定しない場合はGoogleスプレッドシート）')
+        parser.add_argument('--dry-run', action='store_true', help='保存せず、作成・更新される件数のみ表示')
+        parser.add_argument('--batch-size', type=int, default=500, help='一度に保存する件数（デフォルト: 500）')
+        parser.add_argument('--owner', type=int, default=1, help='公式食品の作成者とするユーザーID（デフォルト: 1）')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        try:
+            owner = CustomUser.objects.get(pk=options['owner'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"ユーザー（ID: {options['owner']}）が存在しません。")
+
+        rows = self._read_file(options['file']) if options['file'] else self._read_spreadsheet()
+        dry_run = options['dry_run']
+
+        counts = {"created": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+        created_ids, updated_ids = [], []
+        for chunk in iter_chunks(rows, options['batch_size']):
+            created, updated = self._import_chunk(chunk, owner, counts, dry_run)
+            created_ids += created
+            updated_ids += updated
+
+        if created_ids or updated_ids:
+            rebuild_search_index(MealItem.objects.filter(id__in=created_ids + updated_ids))
+        # 更新した食品の栄養素は過去の食事記録にも反映されるため、日次栄養サマリーを再計算する
+        refreshed = refresh_summaries_for_meal_items(updated_ids) if updated_ids else 0
+
+        # --- 結果を表示 ---
+        summary = (
+            f"Created {counts['created']} items, updated {counts['updated']} items, "
+            f"{counts['unchanged']} unchanged, {counts['skipped']} skipped."
+        )
+        if refreshed:
+            summary += f" Refreshed daily summaries for {refreshed} user-days."
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f"[dry-run] {summary}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
+
+    def _read_spreadsheet(self):
+        """ Googleスプレッドシートから行（列名 → 値の辞書）を読み込む """
+        import gspread
+        from google.oauth2 import service_account
 
-    def handle(self, *args, **kwargs):
         # --- Google認証設定 ---
         SERVICE_ACCOUNT_FILE = os.path.join(settings.BASE_DIR, 'accounts', 'auth', 'google_cloud_api_credentials.json')
         SCOPES = ['https://www.googleapis.com/auth/spreadsheets.readonly', 'https://www.googleapis.com/auth/drive.readonly']
@@ -35,91 +171,95 @@ class Command(BaseCommand):
         )
 
         client = gspread.authorize(credentials)
-        # --- スプレッドシートのIDとシート名を指定 ---
-        SPREADSHEET_ID = '1sy1rOzudorM_bkRVk7TZ-27VF3BMovj96kDQ0-h9YPk'
-        SHEET_NAME = '食品マスタ'  # シート名を指定
-        # --- スプレッドシートを開く ---
         sheet = client.open_by_key(SPREADSHEET_ID).worksheet(SHEET_NAME)
-        # --- データを取得 ---
         data = sheet.get_all_values()
-        # --- ヘッダーを取得 ---
         headers = data[0]
-        # --- データを辞書形式に変換 ---
-        items = []
         for row in data[1:]:
-            item = {headers[i]: row[i] for i in range(len(headers))}
-            items.append(item)
-
-        updated = 0
-        created = 0
-
-        for item in items:
-            # --- 公式MealItemを作成 or 更新 ---
-            try:
-                mealItem = MealItem.objects.get(official_id=item['食品ID'])
-            except MealItem.DoesNotExist:
-                mealItem = None
-
-            def parse_float(value):
-                try:
-                    return float(value) if value not in ["", None] else None
-                except ValueError:
-                    return None
-
-            data = {
-                "name": item["食品名"],
-                "calories": parse_float(item["カロリー"]),
-                "protein": parse_float(item["たんぱく質(g)"]),
-                "fat": parse_float(item["脂質(g)"]),
-                "carbs": parse_float(item["炭水化物(g)"]),
-                "unit": item["単位"],
-                "base_quantity": item["基準量"],
-                "created_by": CustomUser.objects.get(pk=1),
-                "is_official": True,
-
-                # 拡張栄養素
-                "vitamin_a": parse_float(item["ビタミンA(μg)"]),
-                "vitamin_d": parse_float(item["ビタミンD(μg)"]),
-                "vitamin_e": parse_float(item["ビタミンE(mg)"]),
-                "vitamin_k": parse_float(item["ビタミンK(μg)"]),
-                "vitamin_b1": parse_float(item["ビタミンB1(mg)"]),
-                "vitamin_b2": parse_float(item["ビタミンB2(mg)"]),
-                "niacin": parse_float(item["ナイアシン(mg)"]),
-                "vitamin_b6": parse_float(item["ビタミンB6(mg)"]),
-                "vitamin_b12": parse_float(item["ビタミンB12(μg)"]),
-                "folic_acid": parse_float(item["葉酸(μg)"]),
-                "pantothenic_acid": parse_float(item["パントテン酸(mg)"]),
-                "biotin": parse_float(item["ビオチン(μg)"]),
-                "vitamin_c": parse_float(item["ビタミンC(mg)"]),
-                "sodium": parse_float(item["ナトリウム(g)"]),
-                "potassium": parse_float(item["カリウム(mg)"]),
-                "calcium": parse_float(item["カルシウム(mg)"]),
-                "magnesium": parse_float(item["マグネシウム(mg)"]),
-                "phosphorus": parse_float(item["リン(mg)"]),
-                "iron": parse_float(item["鉄(mg)"]),
-                "zinc": parse_float(item["亜鉛(mg)"]),
-                "copper": parse_float(item["銅(mg)"]),
-                "manganese": parse_float(item["マンガン(mg)"]),
-                "iodine": parse_float(item["ヨウ素(μg)"]),
-                "selenium": parse_float(item["セレン(μg)"]),
-                "chromium": parse_float(item["クロム(μg)"]),
-                "molybdenum": parse_float(item["モリブデン(μg)"]),
-                "cholesterol": parse_float(item["コレステロール(mg)"]),
-                "dietary_fiber": parse_float(item["食物繊維(g)"]),
-                "salt_equivalent": parse_float(item["食塩相当量(g)"]),
-            }
-
-            if mealItem:
-                # 更新
-                for key, value in data.items():
-                    setattr(mealItem, key, value)
-                mealItem.save()
-                updated += 1
-            else:
-                data["official_id"] = item["食品ID"]
-                print(f"Creating new item: {data}")
-                # 作成
-                MealItem.objects.create(**data)
-                created += 1
-        print(f"Created {created} items and updated {updated} items.")
-        # --- 結果を表示 ---
+            yield dict(zip(headers, row))
+
+    def _read_file(self, file_path):
+        """ CSV/XLSXファイルから行（列名 → 値の辞書）を1行ずつ読み込む """
+        path = Path(file_path)
+        if not path.exists():
+            raise CommandError(f"ファイルが見つかりません: {file_path}")
+
+        suffix = path.suffix.lower()
+        if suffix == '.csv':
+            return self._read_csv(path)
+        if suffix in ('.xlsx', '.xlsm'):
+            return self._read_xlsx(path)
+        raise CommandError('CSVまたはXLSXファイルを指定してください。')
+
+    def _read_csv(self, path):
+        # Excelで保存したCSVのBOMを除去する
+        with path.open(newline='', encoding='utf-8-sig') as f:
+            yield from csv.DictReader(f)
+
+    def _read_xlsx(self, path):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            sheet = workbook[SHEET_NAME] if SHEET_NAME in workbook.sheetnames else workbook.active
+            rows = sheet.iter_rows(values_only=True)
+            headers = [str(header) if header is not None else '' for header in next(rows, ())]
+            for row in rows:
+                yield dict(zip(headers, row))
+        finally:
+            workbook.close()
+
+    def _build_values(self, item):
+        """ 1行分のデータをMealItemのフィールドの値に変換する """
+        values = {field: str(item.get(column) or '').strip() for field, column in TEXT_COLUMNS.items()}
+        values.update({field: parse_float(item.get(column)) for field, column in NUMBER_COLUMNS.items()})
+        values["is_official"] = True
+        return values
+
+    def _import_chunk(self, chunk, owner, counts, dry_run) -> tuple:
+        """
+        1チャンク分の行を保存する
+
+        Returns:
+            tuple: (作成した食品のID, 更新した食品のID)（dry-runの場合はどちらも空）
+        """
+        parsed = {}
+        for item in chunk:
+            official_id = parse_official_id(item.get(OFFICIAL_ID_COLUMN))
+            values = self._build_values(item)
+            missing = [field for field in REQUIRED_FIELDS if values[field] in ('', None)]
+            if official_id is None or missing:
+                counts["skipped"] += 1
+                self.stdout.write(self.style.WARNING(
+                    f"Skipped row: 食品ID={item.get(OFFICIAL_ID_COLUMN)!r} missing={missing or ['食品ID']}"))
+                continue
+            # 同じ食品IDが複数ある場合は後の行を優先する
+            parsed[official_id] = values
+
+        existing = MealItem.objects.in_bulk(parsed.keys(), field_name='official_id')
+
+        to_create, to_update = [], []
+        for official_id, values in parsed.items():
+            meal_item = existing.get(official_id)
+            if meal_item is None:
+                to_create.append(MealItem(official_id=official_id, created_by=owner, **values))
+                continue
+
+            changed = [field for field in IMPORT_FIELDS if getattr(meal_item, field) != values[field]]
+            if not changed:
+                counts["unchanged"] += 1
+                continue
+            for field in changed:
+                setattr(meal_item, field, values[field])
+            to_update.append(meal_item)
+            if self.verbosity >= 2:
+                self.stdout.write(f"Update {official_id} ({meal_item.name}): {', '.join(changed)}")
+
+        counts["created"] += len(to_create)
+        counts["updated"] += len(to_update)
+        if dry_run:
+            return [], []
+
+        with transaction.atomic():
+            MealItem.objects.bulk_create(to_create)
+            MealItem.objects.bulk_update(to_update, IMPORT_FIELDS)
+        return [meal_item.id for meal_item in to_create], [meal_item.id for meal_item in to_update]
@@ -0,0 +1,23 @@
+""" 食品検索インデックスを再構築するコマンド
+
+食品名と検索キーワードを正規化して MealItemSearchIndex に保存します。
+管理画面やデータ移行で MealItem を直接更新した場合に実行してください。
+
+使用例:
+    python manage.py rebuild_meal_item_search_index
+"""
+
+from django.core.management.base import BaseCommand
+
+from meal.models import MealItemSearchIndex
+from meal.utils.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = '食品検索インデックス（MealItemSearchIndex）を再構築'
+
+    def handle(self, *args, **options):
+        # 削除済みの食品はCASCADEで消えるため、全件を作成 or 更新すればよい
+        count = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt search index for {count} items ({MealItemSearchIndex.objects.count()} indexed)."))
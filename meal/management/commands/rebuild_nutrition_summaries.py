@@ -0,0 +1,82 @@
+""" 日次栄養サマリーを再構築するコマンド
+
+食事記録から日次栄養サマリー（DailyNutritionSummary）を再計算します。
+既存データのバックフィルや、サマリーとライブ集計との整合性確認に使用します。
+
+使用例:
+    python manage.py rebuild_nutrition_summaries --date-from 2025-01-01 --date-to 2025-01-31
+    python manage.py rebuild_nutrition_summaries --date-from 2025-01-01 --date-to 2025-01-31 --verify
+"""
+
+import math
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import CustomUser
+from meal.models import DailyNutritionSummary, MealRecord
+from meal.utils.summary import SUMMARY_FIELDS, compute_daily_nutrition, refresh_daily_summary
+
+
+class Command(BaseCommand):
+    help = '食事記録から日次栄養サマリーを再構築（--verifyで差分確認のみ）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', required=True, help='開始日（YYYY-MM-DD形式）')
+        parser.add_argument('--date-to', required=True, help='終了日（YYYY-MM-DD形式）')
+        parser.add_argument('--user', type=int, help='対象ユーザーID（指定しない場合は全ユーザー）')
+        parser.add_argument('--verify', action='store_true', help='再構築せず、サマリーとライブ集計の差分のみ表示')
+
+    def handle(self, *args, **options):
+        try:
+            date_from = date.fromisoformat(options['date_from'])
+            date_to = date.fromisoformat(options['date_to'])
+        except ValueError:
+            raise CommandError('日付形式が正しくありません。YYYY-MM-DD形式で入力してください。')
+        if date_from > date_to:
+            raise CommandError('開始日は終了日以前の日付を指定してください。')
+
+        records = MealRecord.objects.filter(date__range=(date_from, date_to))
+        summaries = DailyNutritionSummary.objects.filter(date__range=(date_from, date_to))
+        if options['user']:
+            records = records.filter(user_id=options['user'])
+            summaries = summaries.filter(user_id=options['user'])
+
+        # 食事記録 or 既存サマリーのある (ユーザー, 日付) を対象にする（削除済み記録のサマリーも掃除するため）
+        targets = set(records.values_list('user_id', 'date').distinct())
+        targets |= set(summaries.values_list('user_id', 'date').distinct())
+        users = CustomUser.objects.in_bulk({user_id for user_id, _ in targets})
+
+        mismatched = 0
+        for user_id, target_date in sorted(targets):
+            user = users[user_id]
+            if options['verify']:
+                if not self._matches(user, target_date):
+                    mismatched += 1
+                    self.stdout.write(self.style.WARNING(f"Mismatch: user={user_id} date={target_date}"))
+            else:
+                refresh_daily_summary(user, target_date)
+
+        if options['verify']:
+            self.stdout.write(f"Verified {len(targets)} days, {mismatched} mismatched.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(targets)} daily summaries."))
+
+    def _matches(self, user, target_date) -> bool:
+        """ 保存済みサマリーとライブ集計が一致するか確認する """
+        live = compute_daily_nutrition(user, target_date)
+        stored = {
+            summary.time_of_day: summary
+            for summary in DailyNutritionSummary.objects.filter(user=user, date=target_date)
+        }
+        if live.keys() != stored.keys():
+            return False
+
+        for time_of_day, values in live.items():
+            summary = stored[time_of_day]
+            if values['record_count'] != summary.record_count:
+                return False
+            for field in SUMMARY_FIELDS:
+                if not math.isclose(values[field], getattr(summary, field), abs_tol=1e-6):
+                    return False
+        return True
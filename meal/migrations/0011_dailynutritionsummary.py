@@ -0,0 +1,36 @@
+# Generated by Django 5.1.6 on 2026-10-18 14:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meal', '0010_mealitem_jan_ean_code'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyNutritionSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('time_of_day', models.CharField(choices=[('朝食', '朝食'), ('昼食', '昼食'), ('夕食', '夕食'), ('間食', '間食')], max_length=10)),
+                ('calories', models.FloatField(default=0, verbose_name='カロリー（kcal）')),
+                ('protein', models.FloatField(default=0, verbose_name='たんぱく質（g）')),
+                ('fat', models.FloatField(default=0, verbose_name='脂質（g）')),
+                ('carbs', models.FloatField(default=0, verbose_name='炭水化物（g）')),
+                ('record_count', models.IntegerField(default=0, verbose_name='食事記録数')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_nutrition_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': '日次栄養サマリー',
+                'verbose_name_plural': '日次栄養サマリー',
+                'constraints': [models.UniqueConstraint(fields=('user', 'date', 'time_of_day'), name='unique_daily_nutrition_summary')],
+            },
+        ),
+    ]
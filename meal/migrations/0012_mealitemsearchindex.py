@@ -0,0 +1,81 @@
+# Generated by Django 5.1.6 on 2026-10-18 15:04
+
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# マイグレーション作成時点の正規化処理（meal.utils.search の変更の影響を受けないよう固定する）
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(ord("ァ"), ord("ヶ") + 1)}
+
+
+def _normalize_text(text):
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", text).lower().translate(_KATAKANA_TO_HIRAGANA)
+    return "".join(text.split())
+
+
+def _build_index_values(name, search_keywords):
+    normalized_name = _normalize_text(name)
+    keywords = unicodedata.normalize("NFKC", search_keywords or "").replace("、", ",").split(",")
+    parts = [normalized_name] + [keyword for keyword in map(_normalize_text, keywords) if keyword]
+    return {
+        "normalized_name": normalized_name[:100],
+        "search_text": " ".join(parts),
+    }
+
+
+def create_trigram_index(apps, schema_editor):
+    """ PostgreSQLの場合のみ pg_trgm の GIN インデックスを作成する """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS meal_mealitemsearchindex_search_text_trgm '
+        'ON meal_mealitemsearchindex USING gin (search_text gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS meal_mealitemsearchindex_search_text_trgm')
+
+
+def build_search_index(apps, schema_editor):
+    """ 既存の食品の検索インデックスを作成する """
+    MealItem = apps.get_model('meal', 'MealItem')
+    MealItemSearchIndex = apps.get_model('meal', 'MealItemSearchIndex')
+    MealItemSearchIndex.objects.bulk_create(
+        [
+            MealItemSearchIndex(meal_item_id=meal_item_id, **_build_index_values(name, search_keywords))
+            for meal_item_id, name, search_keywords in MealItem.objects.values_list('id', 'name', 'search_keywords')
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meal', '0011_dailynutritionsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MealItemSearchIndex',
+            fields=[
+                ('meal_item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_index', serialize=False, to='meal.mealitem')),
+                ('normalized_name', models.CharField(db_index=True, max_length=100, verbose_name='正規化済み食品名')),
+                ('search_text', models.TextField(help_text='正規化済みの食品名と検索キーワードを空白区切りで連結したもの', verbose_name='検索用テキスト')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': '食品検索インデックス',
+                'verbose_name_plural': '食品検索インデックス',
+            },
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
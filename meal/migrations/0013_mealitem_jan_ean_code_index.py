@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 15:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meal', '0012_mealitemsearchindex'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mealitem',
+            name='jan_ean_code',
+            field=models.CharField(blank=True, db_index=True, help_text='商品のバーコード番号', max_length=20, null=True, verbose_name='JAN/EANコード'),
+        ),
+    ]
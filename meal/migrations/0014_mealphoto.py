@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-18 15:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meal', '0013_mealitem_jan_ean_code_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MealPhoto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('photo_key', models.CharField(help_text='変換後の本体のキー（MealRecord.photo_key）', max_length=256, unique=True, verbose_name='写真のキー')),
+                ('staging_key', models.CharField(blank=True, max_length=256, verbose_name='変換前のファイルのキー')),
+                ('status', models.CharField(choices=[('processing', '変換中'), ('ready', '完了'), ('failed', '失敗')], default='processing', max_length=10, verbose_name='変換状況')),
+                ('error', models.TextField(blank=True, verbose_name='エラー内容')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='meal_photos', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': '食事写真',
+                'verbose_name_plural': '食事写真',
+            },
+        ),
+    ]
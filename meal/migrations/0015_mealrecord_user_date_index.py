@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-18 15:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meal', '0014_mealphoto'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mealrecord',
+            index=models.Index(fields=['user', '-date', '-id'], name='meal_record_user_date_idx'),
+        ),
+    ]
@@ -20,7 +20,7 @@ class MealItem(models.Model):
     official_id = models.IntegerField(null=True, blank=True, unique=True, verbose_name="公式食品ID")
     is_official = models.BooleanField(verbose_name="公式フラグ", default=True)
     search_keywords = models.TextField(blank=True, null=True, help_text='カンマ区切りの検索用キーワード')
-    jan_ean_code = models.CharField(max_length=20, null=True, blank=True, verbose_name="JAN/EANコード", help_text="商品のバーコード番号")
+    jan_ean_code = models.CharField(max_length=20, null=True, blank=True, db_index=True, verbose_name="JAN/EANコード", help_text="商品のバーコード番号")
 
     # --- 栄養素の拡張 ---
     vitamin_a = models.FloatField("ビタミンA（μgRAE）", null=True, blank=True)
@@ -66,6 +66,22 @@ class MealItem(models.Model):
         return self.name + self.search_keywords if self.search_keywords else self.name
 
 
+class MealItemSearchIndex(models.Model):
+    """ 食品検索用インデックス（正規化済みの食品名・キーワード） """
+    meal_item = models.OneToOneField(MealItem, on_delete=models.CASCADE, primary_key=True, related_name="search_index")
+    normalized_name = models.CharField("正規化済み食品名", max_length=100, db_index=True)
+    search_text = models.TextField("検索用テキスト", help_text="正規化済みの食品名と検索キーワードを空白区切りで連結したもの")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        """ メタ情報 """
+        verbose_name = '食品検索インデックス'
+        verbose_name_plural = '食品検索インデックス'
+
+    def __str__(self):
+        return str(self.normalized_name)
+
+
 class MealRecord(models.Model):
     """ ユーザーの食事記録 """
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="meals")
@@ -80,6 +96,10 @@ class MealRecord(models.Model):
         """ メタ情報 """
         verbose_name = '食事記録'
         verbose_name_plural = '食事記録'
+        indexes = [
+            # ユーザーごとの期間指定・日付順の一覧取得用
+            models.Index(fields=['user', '-date', '-id'], name='meal_record_user_date_idx'),
+        ]
 
     def __str__(self):
         return str(f"{self.user.username} - {self.date} {self.time_of_day}")
@@ -99,3 +119,58 @@ class MealRecordItem(models.Model):
 
     def __str__(self):
         return str(f"{self.meal_record} - {self.meal_item.name} {self.quantity}{self.unit}")
+
+
+class DailyNutritionSummary(models.Model):
+    """ 日次栄養サマリー（ユーザー・日付・食事タイプごとの集計値） """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="daily_nutrition_summaries")
+    date = models.DateField()
+    time_of_day = models.CharField(max_length=10, choices=MealRecord._meta.get_field("time_of_day").choices)
+    calories = models.FloatField("カロリー（kcal）", default=0)
+    protein = models.FloatField("たんぱく質（g）", default=0)
+    fat = models.FloatField("脂質（g）", default=0)
+    carbs = models.FloatField("炭水化物（g）", default=0)
+    record_count = models.IntegerField("食事記録数", default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        """ メタ情報 """
+        verbose_name = '日次栄養サマリー'
+        verbose_name_plural = '日次栄養サマリー'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'date', 'time_of_day'],
+                name='unique_daily_nutrition_summary'
+            )
+        ]
+
+    def __str__(self):
+        return str(f"{self.user_id} - {self.date} {self.time_of_day}")
+
+
+class MealPhoto(models.Model):
+    """ アップロードされた食事写真の変換状況（変換はバックグラウンドのタスクで行う） """
+    STATUS_PROCESSING = "processing"
+    STATUS_READY = "ready"
+    STATUS_FAILED = "failed"
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="meal_photos")
+    photo_key = models.CharField("写真のキー", max_length=256, unique=True, help_text="変換後の本体のキー（MealRecord.photo_key）")
+    staging_key = models.CharField("変換前のファイルのキー", max_length=256, blank=True)
+    status = models.CharField(
+        "変換状況",
+        max_length=10,
+        choices=[(STATUS_PROCESSING, "変換中"), (STATUS_READY, "完了"), (STATUS_FAILED, "失敗")],
+        default=STATUS_PROCESSING,
+    )
+    error = models.TextField("エラー内容", blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        """ メタ情報 """
+        verbose_name = '食事写真'
+        verbose_name_plural = '食事写真'
+
+    def __str__(self):
+        return str(f"{self.photo_key} ({self.status})")
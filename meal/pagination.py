@@ -0,0 +1,28 @@
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+
+class MealItemCursorPagination(CursorPagination):
+    """ 食品データ一覧のカーソルページネーション（IDの昇順） """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('id',)
+
+
+class MealItemSearchPagination(LimitOffsetPagination):
+    """ 食品データ検索結果のページネーション
+
+    検索順位（search_rank）は数種類の値しかとらずカーソルの位置にできないため、オフセットでページングする。
+    1ページの件数はカーソルページネーションと同じく page_size で指定する。
+    """
+    default_limit = MealItemCursorPagination.page_size
+    limit_query_param = 'page_size'
+    max_limit = MealItemCursorPagination.max_page_size
+
+
+class MealRecordCursorPagination(CursorPagination):
+    """ 食事記録一覧のカーソルページネーション（日付の新しい順） """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-date', '-id')
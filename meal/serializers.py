@@ -1,8 +1,18 @@
 import json
+from collections import defaultdict
 
+from django.db import models, transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
-from accounts.utils import generate_presigned_url  # S3の署名付きURLを生成
-from .models import MealItem, MealRecord, MealRecordItem
+from accounts.utils import generate_presigned_url, generate_presigned_urls  # S3の署名付きURLを生成
+from .models import MealItem, MealPhoto, MealRecord, MealRecordItem
+from .utils.barcode import forget_barcode, normalize_barcode
+from .utils.photo import thumbnail_key
+from .utils.records import MAX_COPY_RECORDS, MAX_COPY_TARGET_DAYS, date_range
+from .utils.search import update_search_index
+from .utils.summary import refresh_daily_summary
+from recipe.models import Recipe
+from recipe.utils import SERVING_UNIT, recompute_recipe_nutrition
 
 
 class MealItemSerializer(serializers.ModelSerializer):
@@ -66,6 +76,13 @@ class MealItemSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('created_by', "is_official")
 
+    def __init__(self, *args, fields=None, **kwargs):
+        """ fields を指定した場合は、その項目のみを出力する（スパースフィールドセット） """
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
     def validate_calories(self, value):
         if value < 0:
             raise serializers.ValidationError("カロリーは0以上にしてください。")
@@ -86,37 +103,72 @@ class MealItemSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("炭水化物は0以上にしてください。")
         return value
 
+    def validate_jan_ean_code(self, value):
+        """ バーコードのチェックデジットを検証し、正規化した形式で保存する """
+        if not value:
+            return None
+        normalized = normalize_barcode(value)
+        if normalized is None:
+            raise serializers.ValidationError("JAN/EANコードが正しくありません。")
+        return normalized
+
     def create(self, validated_data):
         """ 食品データを登録（作成者を記録） """
         user = self.context["request"].user
-        return MealItem.objects.create(created_by=user, **validated_data)
+        meal_item = MealItem.objects.create(created_by=user, **validated_data)
+        update_search_index(meal_item)
+        if meal_item.jan_ean_code:
+            forget_barcode(meal_item.jan_ean_code)
+        return meal_item
 
 
 class MealRecordItemSerializer(serializers.ModelSerializer):
     """ 食事記録アイテム（摂取量を管理） """
     meal_item = MealItemSerializer(read_only=True)
-    meal_item_id = serializers.PrimaryKeyRelatedField(
-        queryset=MealItem.objects.all(), source="meal_item", write_only=True
-    )
+    # 食品の存在確認は MealRecordSerializer.validate_meal_items でまとめて行う
+    meal_item_id = serializers.IntegerField(write_only=True)
 
     class Meta:
         model = MealRecordItem
         fields = ("meal_item", "meal_item_id", "quantity", "unit")
 
 
+class MealRecordListSerializer(serializers.ListSerializer):
+    """ 食事記録の一覧（写真の署名付きURLをページ単位でまとめて発行する） """
+
+    def to_representation(self, data):
+        records = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        photo_keys = [record.photo_key for record in records if record.photo_key]
+        self._context["photo_statuses"] = {key: None for key in photo_keys} | dict(
+            MealPhoto.objects.filter(photo_key__in=photo_keys).values_list("photo_key", "status"))
+
+        # 変換が終わった写真のみ署名する
+        ready_keys = [
+            key for key in photo_keys
+            if self._context["photo_statuses"][key] in (None, MealPhoto.STATUS_READY)
+        ]
+        ready_keys += [key for key in map(thumbnail_key, ready_keys) if key]
+        self._context["photo_urls"] = generate_presigned_urls(ready_keys)
+        return super().to_representation(records)
+
+
 class MealRecordSerializer(serializers.ModelSerializer):
     """ 食事記録（ユーザーが登録） """
     meal_items = MealRecordItemSerializer(many=True)
     photo_url = serializers.SerializerMethodField()
-    # meal_items = serializers.ListSerializer(child=MealRecordItemSerializer(), write_only=True)
+    photo_thumbnail_url = serializers.SerializerMethodField()
+    photo_status = serializers.SerializerMethodField()
 
     class Meta:
         model = MealRecord
-        fields = ("id", "date", "time_of_day", "meal_items", "photo_key", "photo_url")
+        fields = (
+            "id", "date", "time_of_day", "meal_items", "photo_key", "photo_url", "photo_thumbnail_url", "photo_status")
+        list_serializer_class = MealRecordListSerializer
 
     def to_internal_value(self, data):
         """ meal_itemsをJSONパースして適切なフォーマットに変換 """
-        mutable_data = data.copy()
+        # multipart/form-data の場合は QueryDict を通常の dict にしてからリストを渡す
+        mutable_data = data.dict() if hasattr(data, "dict") else data.copy()
 
         if "meal_items" in mutable_data and isinstance(mutable_data["meal_items"], str):
             try:
@@ -125,21 +177,60 @@ class MealRecordSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError({"meal_items": "不正なJSON形式です。"})
         return super().to_internal_value(mutable_data)
 
+    def validate_meal_items(self, value):
+        """ 指定された食品が存在するかを1回のクエリで確認する """
+        meal_item_ids = {item["meal_item_id"] for item in value}
+        existing_ids = set(MealItem.objects.filter(id__in=meal_item_ids).values_list("id", flat=True))
+        missing_ids = sorted(meal_item_ids - existing_ids)
+        if missing_ids:
+            raise serializers.ValidationError(
+                f"存在しない食品IDが含まれています: {', '.join(map(str, missing_ids))}")
+        return value
+
+    def get_photo_status(self, obj):
+        """
+        写真の変換状況を返す（processing: 変換中, ready: 完了, failed: 失敗）
+
+        変換の仕組みを導入する前にアップロードされた写真は ready とする。
+        一覧の場合は MealRecordListSerializer で取得済みの状況を使う。
+        """
+        if not obj.photo_key:
+            return None
+        photo_statuses = self.context.setdefault("photo_statuses", {})
+        if obj.photo_key not in photo_statuses:
+            photo_statuses[obj.photo_key] = MealPhoto.objects.filter(
+                photo_key=obj.photo_key).values_list("status", flat=True).first()
+        return photo_statuses[obj.photo_key] or MealPhoto.STATUS_READY
+
+    def _signed_url(self, obj, key):
+        """ 署名付きURLを返す（変換が終わっていない場合はNone。一覧の場合は発行済みのURLを使う） """
+        if not key or self.get_photo_status(obj) != MealPhoto.STATUS_READY:
+            return None
+        photo_urls = self.context.get("photo_urls", {})
+        if key in photo_urls:
+            return photo_urls[key]
+        return generate_presigned_url(key)
+
     def get_photo_url(self, obj):
         """ S3 の署名付きURLを返す(写真がある場合のみ) """
-        if obj.photo_key:
-            return generate_presigned_url(obj.photo_key)
-        return None
+        return self._signed_url(obj, obj.photo_key)
 
+    def get_photo_thumbnail_url(self, obj):
+        """ 一覧表示用サムネイルの署名付きURLを返す（サムネイルがない古い写真の場合は本体のURL） """
+        return self._signed_url(obj, thumbnail_key(obj.photo_key) or obj.photo_key)
+
+    def to_representation(self, instance):
+        """ meal_itemsと食品を1回のクエリで取得してから出力する（取得済みの場合はそのまま） """
+        if "meal_items" not in getattr(instance, "_prefetched_objects_cache", {}):
+            prefetch_related_objects([instance], Prefetch(
+                "meal_items", queryset=MealRecordItem.objects.select_related("meal_item")))
+        return super().to_representation(instance)
+
+    @transaction.atomic
     def create(self, validated_data):
-        """ 食事記録を作成（ネストされた `meal_items` も保存） """
+        """ 食事記録を作成（ネストされた `meal_items` もまとめて保存） """
         request = self.context.get("request")
 
-        # `request.data` から `meal_items` を取得し、手動でパース
-        meal_items_data = request.data.get("meal_items")
-        if isinstance(meal_items_data, str):  # JSON 文字列の場合はデコード
-            meal_items_data = json.loads(meal_items_data)
-
         meal_record = MealRecord.objects.create(
             user=request.user,
             date=validated_data["date"],
@@ -147,34 +238,167 @@ class MealRecordSerializer(serializers.ModelSerializer):
             photo_key=validated_data.get("photo_key"),
         )
 
-        self._update_meal_items(meal_record, meal_items_data)
+        MealRecordItem.objects.bulk_create(
+            MealRecordItem(meal_record=meal_record, **item_data)
+            for item_data in validated_data["meal_items"]
+        )
+        refresh_daily_summary(meal_record.user, meal_record.date)
         return meal_record
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        """食事記録を更新(ネストされたmeal_itemsも更新)"""
-        # `request.data` から `meal_items` を取得し、手動でパース
-        request = self.context.get("request")
-        meal_items_data = request.data.get("meal_items")
-        if isinstance(meal_items_data, str):  # JSON 文字列の場合はデコード
-            meal_items_data = json.loads(meal_items_data)
-
+        """食事記録を更新(ネストされたmeal_itemsは変更のあった行のみ更新)"""
         # MealRecordの基本情報を更新
-        instance.data = validated_data.get("date", instance.date)
+        previous_date = instance.date
+        instance.date = validated_data.get("date", instance.date)
         instance.time_of_day = validated_data.get("time_of_day", instance.time_of_day)
         instance.photo_key = validated_data.get("photo_key", instance.photo_key)
         instance.save()
 
-        # meal_itemsを更新(デリートインサート)
-        instance.meal_items.all().delete()
-        self._update_meal_items(instance, meal_items_data)
+        # meal_itemsが指定されていない部分更新の場合はそのまま
+        if "meal_items" in validated_data:
+            self._update_meal_items(instance, validated_data["meal_items"])
+
+        # 日付が変更された場合は変更前の日付のサマリーも再計算する
+        refresh_daily_summary(instance.user, instance.date)
+        if previous_date != instance.date:
+            refresh_daily_summary(instance.user, previous_date)
         return instance
 
     def _update_meal_items(self, meal_record, meal_items_data):
-        """meal_itemsを作成"""
+        """
+        meal_itemsを既存の行と比較して更新
+
+        同じ食品の既存の行と指定順に対応付け、摂取量・単位が変わった行は更新、
+        対応する行がない場合は追加、指定されなかった既存の行は削除する。
+        """
+        existing = defaultdict(list)
+        for item in meal_record.meal_items.order_by("id"):
+            existing[item.meal_item_id].append(item)
+
+        to_create, to_update = [], []
         for item_data in meal_items_data:
-            MealRecordItem.objects.create(
-                meal_record=meal_record,
-                meal_item_id=item_data["meal_item_id"],
-                quantity=item_data["quantity"],
-                unit=item_data["unit"]
-            )
+            matches = existing.get(item_data["meal_item_id"])
+            if not matches:
+                to_create.append(MealRecordItem(meal_record=meal_record, **item_data))
+                continue
+            item = matches.pop(0)
+            if item.quantity != item_data["quantity"] or item.unit != item_data["unit"]:
+                item.quantity, item.unit = item_data["quantity"], item_data["unit"]
+                to_update.append(item)
+
+        to_delete = [item.id for items in existing.values() for item in items]
+        if to_delete:
+            MealRecordItem.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            MealRecordItem.objects.bulk_update(to_update, ["quantity", "unit"])
+        if to_create:
+            MealRecordItem.objects.bulk_create(to_create)
+
+
+class MealRecordCopySerializer(serializers.Serializer):
+    """
+    食事記録のコピー条件
+
+    コピー元は record_ids（食事記録のID）か source_date（その日の全記録。time_of_dayで絞り込み可能）、
+    コピー先は target_dates（日付のリスト）か date_from〜date_to（期間）のどちらかで指定する。
+    """
+    record_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    source_date = serializers.DateField(required=False)
+    time_of_day = serializers.ChoiceField(choices=MealRecord._meta.get_field("time_of_day").choices, required=False)
+    target_dates = serializers.ListField(child=serializers.DateField(), required=False, allow_empty=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        """ コピー元の食事記録（食品を含む）とコピー先の日付を確定する """
+        if ("record_ids" in attrs) == ("source_date" in attrs):
+            raise serializers.ValidationError("record_ids か source_date のどちらか一方を指定してください。")
+        if "target_dates" in attrs and ("date_from" in attrs or "date_to" in attrs):
+            raise serializers.ValidationError("target_dates と date_from/date_to は同時に指定できません。")
+
+        if "target_dates" in attrs:
+            target_dates = sorted(set(attrs["target_dates"]))
+        elif "date_from" in attrs and "date_to" in attrs:
+            if attrs["date_from"] > attrs["date_to"]:
+                raise serializers.ValidationError({"date_to": "終了日は開始日以降の日付を指定してください。"})
+            target_dates = date_range(attrs["date_from"], attrs["date_to"])
+        else:
+            raise serializers.ValidationError("target_dates か date_from と date_to を指定してください。")
+        if len(target_dates) > MAX_COPY_TARGET_DAYS:
+            raise serializers.ValidationError(f"コピー先は{MAX_COPY_TARGET_DAYS}日以内で指定してください。")
+
+        records = MealRecord.objects.filter(user=self.context["request"].user).prefetch_related("meal_items")
+        if "record_ids" in attrs:
+            record_ids = list(dict.fromkeys(attrs["record_ids"]))
+            found = records.in_bulk(record_ids)
+            missing_ids = [record_id for record_id in record_ids if record_id not in found]
+            if missing_ids:
+                raise serializers.ValidationError(
+                    {"record_ids": f"存在しない食事記録IDが含まれています: {', '.join(map(str, missing_ids))}"})
+            records = [found[record_id] for record_id in record_ids]
+        else:
+            records = records.filter(date=attrs["source_date"])
+            if "time_of_day" in attrs:
+                records = records.filter(time_of_day=attrs["time_of_day"])
+            records = list(records.order_by("id"))
+            if not records:
+                raise serializers.ValidationError({"source_date": "コピー元の食事記録がありません。"})
+
+        if len(records) * len(target_dates) > MAX_COPY_RECORDS:
+            raise serializers.ValidationError(f"一度にコピーできる食事記録は{MAX_COPY_RECORDS}件までです。")
+
+        return {"records": records, "target_dates": target_dates}
+
+
+class MealRecordFromRecipeSerializer(serializers.Serializer):
+    """
+    レシピを食事記録に追加する条件
+
+    record_id を指定した場合はその食事記録に追加し、指定しない場合は date・time_of_day で新しく作成する。
+    """
+    recipe_id = serializers.IntegerField()
+    servings = serializers.FloatField(default=1, min_value=0, help_text="食べた量（人前）")
+    record_id = serializers.IntegerField(required=False)
+    date = serializers.DateField(required=False)
+    time_of_day = serializers.ChoiceField(choices=MealRecord._meta.get_field("time_of_day").choices, required=False)
+
+    def validate_servings(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("食べた量は0より大きい値にしてください。")
+        return value
+
+    def validate(self, attrs):
+        """ レシピと追加先の食事記録を確定する """
+        recipe = Recipe.objects.select_related("meal_item", "created_by").filter(id=attrs["recipe_id"]).first()
+        if recipe is None:
+            raise serializers.ValidationError({"recipe_id": "レシピが存在しません。"})
+        attrs["recipe"] = recipe
+
+        if "record_id" in attrs:
+            record = MealRecord.objects.filter(id=attrs["record_id"], user=self.context["request"].user).first()
+            if record is None:
+                raise serializers.ValidationError({"record_id": "食事記録が存在しません。"})
+            attrs["record"] = record
+        elif "date" not in attrs or "time_of_day" not in attrs:
+            raise serializers.ValidationError("record_id か date と time_of_day を指定してください。")
+        return attrs
+
+    @transaction.atomic
+    def create(self, validated_data):
+        """ レシピの1人前の食品データを指定した量だけ食事記録に追加する """
+        user = self.context["request"].user
+        recipe = validated_data["recipe"]
+        if recipe.meal_item is None:
+            # 栄養素が未計算のレシピはここで計算する
+            recompute_recipe_nutrition(recipe, owner=user)
+
+        record = validated_data.get("record")
+        if record is None:
+            record = MealRecord.objects.create(
+                user=user, date=validated_data["date"], time_of_day=validated_data["time_of_day"])
+        MealRecordItem.objects.create(
+            meal_record=record, meal_item=recipe.meal_item, quantity=validated_data["servings"], unit=SERVING_UNIT)
+
+        refresh_daily_summary(user, record.date)
+        return record
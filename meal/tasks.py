@@ -0,0 +1,42 @@
+""" 食事管理のバックグラウンドタスク """
+
+import logging
+
+from django.core.files.storage import default_storage
+from django_tasks import task
+
+from .models import MealPhoto
+from .utils.photo import process_meal_photo
+
+logger = logging.getLogger(__name__)
+
+
+@task()
+def process_meal_photo_task(meal_photo_id):
+    """ アップロードされた食事写真を変換し、変換状況を更新する """
+    meal_photo = MealPhoto.objects.filter(id=meal_photo_id).first()
+    if meal_photo is None or meal_photo.status != MealPhoto.STATUS_PROCESSING:
+        return
+
+    try:
+        process_meal_photo(meal_photo)
+    except ValueError as e:
+        logger.warning("Failed to process meal photo %s: %s", meal_photo.photo_key, e)
+        meal_photo.status = MealPhoto.STATUS_FAILED
+        meal_photo.error = str(e)
+    except Exception:
+        # ストレージの障害など。変換中のまま残らないよう失敗として記録する
+        logger.exception("Unexpected error while processing meal photo %s", meal_photo.photo_key)
+        meal_photo.status = MealPhoto.STATUS_FAILED
+        meal_photo.error = "写真の変換中にエラーが発生しました。"
+    else:
+        meal_photo.status = MealPhoto.STATUS_READY
+    finally:
+        # 変換前のファイルは成功・失敗にかかわらず削除する（削除に失敗した場合はキーを残す）
+        try:
+            default_storage.delete(meal_photo.staging_key)
+        except Exception:
+            logger.exception("Failed to delete staged meal photo %s", meal_photo.staging_key)
+        else:
+            meal_photo.staging_key = ""
+        meal_photo.save(update_fields=["status", "error", "staging_key", "updated_at"])
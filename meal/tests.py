@@ -0,0 +1,835 @@
+import csv
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from accounts.utils import get_s3_client
+from meal.management.commands.import_official_mealitems import NUMBER_COLUMNS, OFFICIAL_ID_COLUMN, TEXT_COLUMNS
+from meal.models import DailyNutritionSummary, MealItem, MealItemSearchIndex, MealPhoto, MealRecord, MealRecordItem
+from meal.utils.barcode import clear_barcode_cache
+from meal.utils.nutrition import get_nutrient_targets
+from meal.utils.photo import STAGING_DIRECTORY, thumbnail_key
+from meal.utils.search import (
+    AUTOCOMPLETE_VERSION_KEY, build_index_values, clear_autocomplete_cache, rebuild_search_index)
+from meal.utils.summary import compute_daily_nutrition, refresh_daily_summary
+from recipe.models import Recipe, RecipeIngredient
+from weight.models import WeightRecord
+
+User = get_user_model()
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """ テスト間でキャッシュを共有しない """
+    cache.clear()
+    clear_autocomplete_cache()
+    clear_barcode_cache()
+
+
+@pytest.fixture
+def api_client():
+    """ テスト用のAPIクライアント """
+    return APIClient()
+
+
+@pytest.fixture
+def user():
+    """ テスト用のユーザー（メール認証済み） """
+    user = User.objects.create_user(
+        username="test_user", email="test@example.com", name="テストユーザー", password="password123")
+    user.is_active = True
+    user.save()
+    return user
+
+
+@pytest.fixture
+def profile_user(user):
+    """ 推奨量の計算に必要なプロフィールを登録したユーザー """
+    user.birth_date = date(1990, 4, 1)
+    user.height = 170
+    user.activity_level = 1.5
+    user.save()
+    WeightRecord.objects.create(user=user, weight=65, record_date="2025-01-10T08:00:00+09:00")
+    return user
+
+
+@pytest.fixture
+def meal_item(user):
+    """ 100gあたり200kcalの食品 """
+    return MealItem.objects.create(
+        name="鶏むね肉", calories=200, protein=20, fat=10, carbs=5,
+        unit="g", base_quantity=100, created_by=user)
+
+
+def post_meal_record(api_client, meal_item, date="2025-01-15", time_of_day="朝食", quantity=150):
+    """ 食事記録作成APIを呼び出すヘルパー関数 """
+    data = {
+        "date": date,
+        "time_of_day": time_of_day,
+        "meal_items": [{"meal_item_id": meal_item.id, "quantity": quantity, "unit": "g"}],
+    }
+    return api_client.post("/api/meal/", data, format="json")
+
+
+# ✅ 正常系テスト
+@pytest.mark.django_db
+def test_summary_reads_rollup(api_client, user, meal_item):
+    """ ✅ 食事記録の作成で日次サマリーが更新される """
+    api_client.force_login(user)
+    post_meal_record(api_client, meal_item, time_of_day="朝食", quantity=150)
+    post_meal_record(api_client, meal_item, time_of_day="夕食", quantity=50)
+
+    response = api_client.get("/api/meal/summary/", {"date": "2025-01-15"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["total_calories"] == pytest.approx(400)
+    assert response.data["total_protein"] == pytest.approx(40)
+    assert response.data["record_count"] == 2
+    assert response.data["meal_type_calories"]["朝食"] == pytest.approx(300)
+    assert response.data["meal_type_calories"]["夕食"] == pytest.approx(100)
+    assert DailyNutritionSummary.objects.filter(user=user).count() == 2
+
+
+@pytest.mark.django_db
+def test_summary_follows_update_and_delete(api_client, user, meal_item):
+    """ ✅ 日付変更・削除でサマリーが再計算される """
+    api_client.force_login(user)
+    record_id = post_meal_record(api_client, meal_item).data["id"]
+
+    data = {
+        "date": "2025-01-16",
+        "time_of_day": "朝食",
+        "meal_items": [{"meal_item_id": meal_item.id, "quantity": 100, "unit": "g"}],
+    }
+    api_client.put(f"/api/meal/{record_id}/", data, format="json")
+
+    assert api_client.get("/api/meal/summary/", {"date": "2025-01-15"}).data["record_count"] == 0
+    assert api_client.get("/api/meal/summary/", {"date": "2025-01-16"}).data["total_calories"] == pytest.approx(200)
+
+    api_client.delete(f"/api/meal/{record_id}/")
+
+    assert not DailyNutritionSummary.objects.filter(user=user).exists()
+
+
+@pytest.mark.django_db
+def test_summary_consistent_with_interleaved_writes(api_client, user, meal_item):
+    """ ✅ 同じ日の記録が並行して保存されても、サマリーは全記録の集計と一致する """
+    api_client.force_login(user)
+    # 並行する書き込み: 記録は保存済みで、サマリーはまだ再計算していない
+    other = MealRecord.objects.create(user=user, date="2025-01-15", time_of_day="昼食")
+    MealRecordItem.objects.create(meal_record=other, meal_item=meal_item, quantity=100, unit="g")
+
+    with CaptureQueriesContext(connection) as context:
+        post_meal_record(api_client, meal_item, quantity=150)
+    refresh_daily_summary(user, date(2025, 1, 15))
+
+    # 集計の前にユーザーの行をロックして、同じユーザーの再計算を直列化する
+    sqls = [query["sql"] for query in context.captured_queries]
+    lock = next(i for i, sql in enumerate(sqls) if sql.startswith("SELECT") and User._meta.db_table in sql
+                and (not connection.features.has_select_for_update or "FOR UPDATE" in sql))
+    aggregate = next(i for i, sql in enumerate(sqls) if "SUM(" in sql)
+    assert lock < aggregate
+
+    live = compute_daily_nutrition(user, date(2025, 1, 15))
+    stored = {summary.time_of_day: summary for summary in DailyNutritionSummary.objects.filter(user=user)}
+    assert stored.keys() == live.keys() == {"朝食", "昼食"}
+    for time_of_day, values in live.items():
+        assert stored[time_of_day].calories == pytest.approx(values["calories"])
+        assert stored[time_of_day].record_count == values["record_count"]
+
+
+@pytest.mark.django_db
+def test_rebuild_nutrition_summaries(user, meal_item):
+    """ ✅ コマンドで既存の食事記録からサマリーをバックフィルできる """
+    record = MealRecord.objects.create(user=user, date="2025-01-15", time_of_day="昼食")
+    MealRecordItem.objects.create(meal_record=record, meal_item=meal_item, quantity=200, unit="g")
+
+    call_command("rebuild_nutrition_summaries", date_from="2025-01-01", date_to="2025-01-31")
+
+    summary = DailyNutritionSummary.objects.get(user=user, date="2025-01-15", time_of_day="昼食")
+    assert summary.calories == pytest.approx(400)
+    assert summary.record_count == 1
+
+
+@pytest.mark.django_db
+def test_summary_range_grouped_by_week(api_client, user, meal_item):
+    """ ✅ 期間サマリーを週単位で1回のリクエストで取得できる """
+    api_client.force_login(user)
+    meal_item.vitamin_c = 10
+    meal_item.save()
+    post_meal_record(api_client, meal_item, date="2025-01-13", quantity=100)  # 月曜
+    post_meal_record(api_client, meal_item, date="2025-01-19", quantity=50)   # 日曜
+    post_meal_record(api_client, meal_item, date="2025-01-20", quantity=200)  # 翌週月曜
+
+    response = api_client.get("/api/meal/summary/range/", {
+        "date_from": "2025-01-13", "date_to": "2025-01-26",
+        "group_by": "week", "include_micronutrients": "true",
+    })
+
+    assert response.status_code == status.HTTP_200_OK
+    results = response.data["results"]
+    assert [result["period"] for result in results] == ["2025-01-13", "2025-01-20"]
+    assert results[0]["total_calories"] == pytest.approx(300)
+    assert results[0]["record_count"] == 2
+    assert results[0]["micronutrients"]["vitamin_c"] == pytest.approx(15)
+    assert results[1]["total_calories"] == pytest.approx(400)
+
+
+@pytest.mark.django_db
+def test_summary_range_counts_empty_records(api_client, user, meal_item):
+    """ ✅ 期間サマリーの記録件数は食品のない食事記録も含み、日次サマリーと一致する """
+    api_client.force_login(user)
+    post_meal_record(api_client, meal_item, date="2025-01-15")
+    MealRecord.objects.create(user=user, date="2025-01-15", time_of_day="間食")
+    MealRecord.objects.create(user=user, date="2025-01-16", time_of_day="間食")
+    refresh_daily_summary(user, date(2025, 1, 15))
+
+    response = api_client.get("/api/meal/summary/range/", {"date_from": "2025-01-15", "date_to": "2025-01-16"})
+
+    results = response.data["results"]
+    assert [result["record_count"] for result in results] == [2, 1]
+    assert results[1]["total_calories"] == 0
+    daily = api_client.get("/api/meal/summary/", {"date": "2025-01-15"}).data
+    assert daily["record_count"] == results[0]["record_count"]
+
+
+@pytest.mark.django_db
+def test_nutrients_against_targets(api_client, profile_user, meal_item):
+    """ ✅ 全栄養素の摂取量と推奨量に対する達成率を取得できる """
+    meal_item.vitamin_c = 40
+    meal_item.save()
+    api_client.force_login(profile_user)
+    post_meal_record(api_client, meal_item, quantity=150)
+
+    response = api_client.get("/api/meal/summary/nutrients/", {"date": "2025-01-15"})
+
+    assert response.status_code == status.HTTP_200_OK
+    nutrients = {nutrient["key"]: nutrient for nutrient in response.data["nutrients"]}
+    assert nutrients["protein"]["intake"] == pytest.approx(30)
+    assert nutrients["protein"]["target"] == pytest.approx(65)
+    assert nutrients["vitamin_c"]["percent"] == pytest.approx(60)
+    assert nutrients["iron"]["has_data"] is False
+
+
+@pytest.mark.django_db
+def test_nutrient_targets_cache(
+        api_client, profile_user, django_assert_num_queries, django_capture_on_commit_callbacks):
+    """ ✅ 推奨量はキャッシュされ、体重・プロフィールの変更で再計算される """
+    assert get_nutrient_targets(profile_user)["protein"] == pytest.approx(65)
+    with django_assert_num_queries(0):
+        get_nutrient_targets(profile_user)
+
+    api_client.force_login(profile_user)
+    with django_capture_on_commit_callbacks(execute=True):
+        api_client.post("/api/weight/", {"weight": 70, "record_date": "2025-01-20T08:00:00+09:00"}, format="json")
+    assert get_nutrient_targets(profile_user)["protein"] == pytest.approx(70)
+
+    energy = get_nutrient_targets(profile_user)["energy"]
+    profile_user.activity_level = 2.0
+    assert get_nutrient_targets(profile_user)["energy"] > energy
+
+
+@pytest.mark.django_db
+def test_search_meal_items_normalized_and_ranked(api_client, user):
+    """ ✅ カタカナ/ひらがな・全角/半角を区別せず、前方一致を優先して検索できる """
+    api_client.force_login(user)
+    for name in ["鶏ササミ", "ササミ", "ＣＨＩＣＫＥＮササミ", "鶏むね肉"]:
+        api_client.post("/api/meal/items/", {
+            "name": name, "calories": 100, "protein": 20, "fat": 1, "carbs": 0, "unit": "g", "base_quantity": 100,
+        }, format="json")
+    # 検索キーワードは食品マスタの取り込みで登録されるため、直接更新してインデックスを再構築する
+    MealItem.objects.filter(name="鶏むね肉").update(search_keywords="とりにく、ササミ")
+    call_command("rebuild_meal_item_search_index")
+
+    response = api_client.get("/api/meal/items/", {"search": "ささみ"})
+    assert [item["name"] for item in response.data["results"]] == ["ササミ", "鶏ササミ", "ＣＨＩＣＫＥＮササミ", "鶏むね肉"]
+
+    response = api_client.get("/api/meal/items/", {"search": "chicken"})
+    assert [item["name"] for item in response.data["results"]] == ["ＣＨＩＣＫＥＮササミ"]
+
+
+@pytest.mark.django_db
+def test_search_meal_items_paginated_by_offset(api_client, user):
+    """ ✅ 検索結果は順位が同じ食品が多くても重複・欠落なくページングできる """
+    api_client.force_login(user)
+    MealItem.objects.bulk_create([
+        MealItem(
+            name=f"鶏肉{i}", calories=100, protein=20, fat=1, carbs=0, unit="g", base_quantity=100, created_by=user)
+        for i in range(5)
+    ])
+    rebuild_search_index()
+
+    response = api_client.get("/api/meal/items/", {"search": "鶏肉", "page_size": 2})
+    assert response.data["count"] == 5
+    names = [item["name"] for item in response.data["results"]]
+    while response.data["next"]:
+        response = api_client.get(response.data["next"])
+        names += [item["name"] for item in response.data["results"]]
+
+    assert names == [f"鶏肉{i}" for i in range(5)]
+
+
+@pytest.mark.django_db
+def test_search_meal_items_without_index(api_client, user):
+    """ ✅ 管理画面などで作成され検索インデックスのない食品も部分一致で検索できる """
+    api_client.force_login(user)
+    MealItem.objects.create(
+        name="鶏ササミ", calories=100, protein=20, fat=1, carbs=0, unit="g", base_quantity=100, created_by=user)
+
+    response = api_client.get("/api/meal/items/", {"search": "ササミ"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [item["name"] for item in response.data["results"]] == ["鶏ササミ"]
+
+
+@pytest.mark.django_db
+def test_autocomplete_boosts_frequently_logged_items(api_client, user, meal_item):
+    """ ✅ オートコンプリートは軽量な項目のみ返し、よく記録する食品を上位にする """
+    api_client.force_login(user)
+    exact = MealItem.objects.create(
+        name="鶏", calories=150, protein=20, fat=5, carbs=0, unit="g", base_quantity=100, created_by=user)
+    rebuild_search_index()
+    for _ in range(5):
+        post_meal_record(api_client, meal_item)
+
+    response = api_client.get("/api/meal/items/autocomplete/", {"q": "とり", "limit": 5})
+    assert response.data == []
+
+    response = api_client.get("/api/meal/items/autocomplete/", {"q": "鶏", "limit": 5})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [item["id"] for item in response.data] == [meal_item.id, exact.id]
+    assert set(response.data[0]) == {"id", "name", "unit", "base_quantity", "calories"}
+
+
+@pytest.mark.django_db
+def test_autocomplete_includes_new_items(api_client, user):
+    """ ✅ 作成した食品はすぐにオートコンプリートの候補になる（他のプロセスの候補キャッシュも無効にする） """
+    api_client.force_login(user)
+    assert api_client.get("/api/meal/items/autocomplete/", {"q": "ささ"}).data == []
+
+    item_id = api_client.post("/api/meal/items/", {
+        "name": "ササミ", "calories": 100, "protein": 20, "fat": 1, "carbs": 0, "unit": "g", "base_quantity": 100,
+    }, format="json").data["id"]
+    assert [item["id"] for item in api_client.get("/api/meal/items/autocomplete/", {"q": "ささ"}).data] == [item_id]
+
+    # 他のプロセスで食品が追加された場合（共有キャッシュのバージョンのみ変わる）
+    other = MealItem.objects.create(
+        name="ささみフライ", calories=250, protein=18, fat=15, carbs=10, unit="g", base_quantity=100, created_by=user)
+    MealItemSearchIndex.objects.create(meal_item=other, **build_index_values(other.name, ""))
+    cache.delete(AUTOCOMPLETE_VERSION_KEY)
+
+    response = api_client.get("/api/meal/items/autocomplete/", {"q": "ささ"})
+    assert [item["id"] for item in response.data] == [item_id, other.id]
+
+
+@pytest.mark.django_db
+def test_meal_item_list_paginated_with_sparse_fields(api_client, user, django_assert_num_queries):
+    """ ✅ 食品一覧はカーソルでページングされ、fieldsで指定した項目のみ取得できる """
+    api_client.force_login(user)
+    MealItem.objects.bulk_create([
+        MealItem(
+            name=f"食品{i}", calories=100, protein=10, fat=5, carbs=10, unit="g", base_quantity=100, created_by=user)
+        for i in range(5)
+    ])
+
+    # セッション・ユーザーの取得 + 食品一覧の取得
+    with django_assert_num_queries(3):
+        response = api_client.get("/api/meal/items/", {"page_size": 3, "fields": "name,calories"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [item["name"] for item in response.data["results"]] == ["食品0", "食品1", "食品2"]
+    assert set(response.data["results"][0]) == {"id", "name", "calories"}
+
+    response = api_client.get(response.data["next"])
+    assert [item["name"] for item in response.data["results"]] == ["食品3", "食品4"]
+    assert response.data["next"] is None
+
+
+@pytest.mark.django_db
+def test_barcode_lookup_normalizes_codes(api_client, user, meal_item, django_assert_num_queries):
+    """ ✅ バーコードは先頭の0の有無・全角数字を区別せず検索でき、ヒットした結果はキャッシュされる """
+    api_client.force_login(user)
+    meal_item.jan_ean_code = "049012345679"  # 正規化されていない形式（12桁）で保存されたデータ
+    meal_item.save()
+    short = MealItem.objects.create(
+        name="ガム", calories=10, protein=0, fat=0, carbs=2, unit="枚", base_quantity=1,
+        jan_ean_code="49123456", created_by=user)
+
+    response = api_client.get("/api/meal/items/barcode/", {"code": "０４９０１２３４５６７９"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["id"] == meal_item.id
+
+    response = api_client.post("/api/meal/items/barcode/batch/", {
+        "codes": ["0049012345679", "49123456", "4901234567890", "4901234567894"],
+    }, format="json")
+
+    assert response.status_code == status.HTTP_200_OK
+    results = response.data["results"]
+    assert results[0]["normalized_code"] == "0049012345679"
+    assert results[0]["meal_item"]["id"] == meal_item.id
+    assert results[1]["meal_item"]["id"] == short.id
+    assert results[2]["normalized_code"] is None  # チェックデジットが不正
+    assert results[3]["meal_item"] is None
+
+    # ヒットしたコードはキャッシュから返す（セッション・ユーザーの取得のみ）
+    with django_assert_num_queries(2):
+        api_client.get("/api/meal/items/barcode/", {"code": "49123456"})
+
+
+def count_queries(func) -> int:
+    """ 関数の実行中に発行されたクエリ数を返す """
+    with CaptureQueriesContext(connection) as context:
+        func()
+    return len(context.captured_queries)
+
+
+@pytest.mark.django_db
+def test_meal_record_write_queries_independent_of_item_count(api_client, user):
+    """ ✅ 食事記録の作成・更新のクエリ数は食品の件数によらず一定 """
+    api_client.force_login(user)
+    meal_items = MealItem.objects.bulk_create([
+        MealItem(
+            name=f"食品{i}", calories=100, protein=10, fat=5, carbs=10, unit="g", base_quantity=100, created_by=user)
+        for i in range(20)
+    ])
+    records = {}
+
+    def create(count):
+        records[count] = api_client.post("/api/meal/", {
+            "date": f"2025-01-{count:02d}", "time_of_day": "昼食",
+            "meal_items": [{"meal_item_id": item.id, "quantity": 100, "unit": "g"} for item in meal_items[:count]],
+        }, format="json").data
+
+    def update(count):
+        # 前半は摂取量を変更、後半は削除し、別の食品を同じ件数追加する
+        half = count // 2
+        changed = [{"meal_item_id": item.id, "quantity": 200, "unit": "g"} for item in meal_items[:half]]
+        added = [{"meal_item_id": item.id, "quantity": 50, "unit": "g"} for item in meal_items[10:10 + half]]
+        api_client.put(f"/api/meal/{records[count]['id']}/", {
+            "date": f"2025-01-{count:02d}", "time_of_day": "昼食", "meal_items": changed + added,
+        }, format="json")
+
+    assert count_queries(lambda: create(2)) == count_queries(lambda: create(10))
+    assert len(records[10]["meal_items"]) == 10
+
+    assert count_queries(lambda: update(2)) == count_queries(lambda: update(10))
+    quantities = MealRecordItem.objects.filter(meal_record_id=records[10]["id"]).values_list("quantity", flat=True)
+    assert sorted(quantities) == [50] * 5 + [200] * 5
+
+
+@pytest.mark.django_db
+def test_meal_record_update_keeps_unchanged_items(api_client, user, meal_item):
+    """ ✅ 更新時は変更のない食品の行を削除・再作成しない """
+    api_client.force_login(user)
+    record_id = post_meal_record(api_client, meal_item, quantity=150).data["id"]
+    item_id = MealRecordItem.objects.get(meal_record_id=record_id).id
+
+    data = {
+        "date": "2025-01-15", "time_of_day": "朝食",
+        "meal_items": [{"meal_item_id": meal_item.id, "quantity": 300, "unit": "g"}],
+    }
+    response = api_client.put(f"/api/meal/{record_id}/", data, format="json")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert list(MealRecordItem.objects.filter(meal_record_id=record_id).values_list("id", "quantity")) == [
+        (item_id, 300)]
+    assert response.data["meal_items"][0]["meal_item"]["name"] == "鶏むね肉"
+
+
+@pytest.mark.django_db
+def test_import_official_mealitems_from_csv(tmp_path, api_client, user, meal_item):
+    """ ✅ CSVから公式食品を一括で作成・更新でき、dry-runでは保存しない """
+    meal_item.official_id = 1
+    meal_item.save()
+    api_client.force_login(user)
+    post_meal_record(api_client, meal_item, quantity=150)
+    headers = [OFFICIAL_ID_COLUMN, *TEXT_COLUMNS.values(), *NUMBER_COLUMNS.values()]
+    rows = [
+        {"食品ID": "1", "食品名": "鶏むね肉（皮なし）", "単位": "g", "カロリー": "105", "たんぱく質(g)": "23",
+         "脂質(g)": "1.5", "炭水化物(g)": "0", "基準量": "100"},
+        {"食品ID": "2", "食品名": "白米", "単位": "g", "カロリー": "156", "たんぱく質(g)": "2.5",
+         "脂質(g)": "0.3", "炭水化物(g)": "37.1", "基準量": "100", "食物繊維(g)": "1.5"},
+        {"食品ID": "3", "食品名": "", "単位": "g"},
+    ]
+    csv_path = tmp_path / "食品マスタ.csv"
+    with csv_path.open("w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=headers)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    out = StringIO()
+    call_command("import_official_mealitems", file=str(csv_path), owner=user.id, dry_run=True, stdout=out)
+    assert "Created 1 items, updated 1 items, 0 unchanged, 1 skipped." in out.getvalue()
+    assert not MealItem.objects.filter(official_id=2).exists()
+
+    out = StringIO()
+    call_command("import_official_mealitems", file=str(csv_path), owner=user.id, stdout=out)
+    assert "Refreshed daily summaries for 1 user-days." in out.getvalue()
+    meal_item.refresh_from_db()
+    assert meal_item.name == "鶏むね肉（皮なし）"
+    # 更新した食品を記録した日のサマリーも再計算される
+    assert DailyNutritionSummary.objects.get(user=user, date="2025-01-15").calories == pytest.approx(157.5)
+    assert MealItem.objects.get(official_id=2).dietary_fiber == pytest.approx(1.5)
+
+    out = StringIO()
+    call_command("import_official_mealitems", file=str(csv_path), owner=user.id, stdout=out)
+    assert "Created 0 items, updated 0 items, 2 unchanged, 1 skipped." in out.getvalue()
+
+    # 作成・更新した食品は検索インデックスにも反映される
+    response_ids = MealItem.objects.filter(search_index__normalized_name="白米").values_list("official_id", flat=True)
+    assert list(response_ids) == [2]
+
+
+@pytest.mark.django_db
+def test_meal_record_list_signs_photo_urls_once(api_client, user, settings, monkeypatch):
+    """ ✅ 一覧の写真URLはまとめて署名し、有効期限に余裕があるうちはキャッシュを使う """
+    settings.DEBUG = False
+    api_client.force_login(user)
+    for i in range(3):
+        MealRecord.objects.create(
+            user=user, date="2025-01-15", time_of_day="朝食", photo_key=f"meals/list-test-{i}.jpg")
+
+    s3_client = get_s3_client()
+    signed_keys = []
+    sign = s3_client.generate_presigned_url
+
+    def spy(*args, **kwargs):
+        signed_keys.append(kwargs["Params"]["Key"])
+        return sign(*args, **kwargs)
+
+    monkeypatch.setattr(s3_client, "generate_presigned_url", spy)
+
+    first = api_client.get("/api/meal/").data["results"]
+    second = api_client.get("/api/meal/").data["results"]
+
+    assert len(signed_keys) == 3
+    assert get_s3_client() is s3_client
+    assert [record["photo_url"] for record in first] == [record["photo_url"] for record in second]
+    assert "Signature" in first[0]["photo_url"]
+
+
+def make_jpeg(width, height, orientation=1) -> SimpleUploadedFile:
+    """ EXIF（向き・撮影機種）付きのJPEGを作成する """
+    exif = Image.Exif()
+    exif[0x0112] = orientation  # Orientation
+    exif[0x0110] = "TestPhone"  # Model
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), "orange").save(buffer, format="JPEG", exif=exif)
+    return SimpleUploadedFile("夕食.jpg", buffer.getvalue(), content_type="image/jpeg")
+
+
+@pytest.mark.django_db
+def test_upload_photo_processed_in_background(
+        api_client, user, settings, tmp_path, django_capture_on_commit_callbacks):
+    """ ✅ 写真は一時保存してすぐに返し、バックグラウンドで向きの補正・EXIFの除去・WebPへの変換を行う """
+    settings.MEDIA_ROOT = str(tmp_path)
+    api_client.force_login(user)
+
+    # 横長で撮影し、EXIFで90度回転を指定した写真
+    with django_capture_on_commit_callbacks() as callbacks:
+        response = api_client.post(
+            "/api/meal/photo/", {"photo": make_jpeg(3000, 1000, orientation=6)}, format="multipart")
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.data["status"] == "processing"
+    photo_key = response.data["photo_url"]
+    assert photo_key.startswith(f"meals/{user.id}/") and photo_key.endswith("/original.webp")
+    assert response.data["thumbnails"]["small"] == thumbnail_key(photo_key)
+
+    # 変換が終わるまでは変換状況のみ返す
+    record = MealRecord.objects.create(user=user, date="2025-01-15", time_of_day="夕食", photo_key=photo_key)
+    response = api_client.get(f"/api/meal/{record.id}/")
+    assert response.data["photo_status"] == "processing"
+    assert response.data["photo_url"] is None
+
+    # コミット後にタスクを登録し、タスクを実行する
+    with django_capture_on_commit_callbacks(execute=True):
+        for callback in callbacks:
+            callback()
+
+    meal_photo = MealPhoto.objects.get(photo_key=photo_key)
+    assert meal_photo.status == MealPhoto.STATUS_READY
+    assert not list((tmp_path / STAGING_DIRECTORY).rglob("*.jpg"))
+    with Image.open(tmp_path / photo_key) as original:
+        assert original.format == "WEBP"
+        assert original.size == (683, 2048)
+        assert not original.getexif()
+    with Image.open(tmp_path / thumbnail_key(photo_key)) as thumbnail:
+        assert thumbnail.size == (200, 200)
+
+    response = api_client.get("/api/meal/")
+    assert response.data["results"][0]["photo_status"] == "ready"
+    assert thumbnail_key(photo_key) in response.data["results"][0]["photo_thumbnail_url"]
+
+
+@pytest.mark.django_db
+def test_meal_record_list_range_queries_constant(api_client, user, meal_item, django_assert_num_queries):
+    """ ✅ 90日分の食事記録を期間指定で取得しても、クエリ数は記録・食品の件数によらず一定 """
+    api_client.force_login(user)
+    other_item = MealItem.objects.create(
+        name="白米", calories=156, protein=2.5, fat=0.3, carbs=37.1, unit="g", base_quantity=100, created_by=user)
+    start = date(2025, 1, 1)
+    records = MealRecord.objects.bulk_create([
+        MealRecord(user=user, date=start + timedelta(days=day), time_of_day=time_of_day)
+        for day in range(90) for time_of_day in ("朝食", "昼食", "夕食")
+    ])
+    MealRecordItem.objects.bulk_create([
+        MealRecordItem(meal_record=record, meal_item=item, quantity=100, unit="g")
+        for record in records for item in (meal_item, other_item)
+    ])
+
+    # セッション・ユーザー・食事記録・食事記録の詳細（食品を含む）
+    with django_assert_num_queries(4):
+        response = api_client.get(
+            "/api/meal/", {"date_from": "2025-01-01", "date_to": "2025-03-31", "page_size": 200})
+
+    assert response.status_code == status.HTTP_200_OK
+    results = response.data["results"]
+    assert len(results) == 200
+    assert results[0]["date"] == "2025-03-31"
+    assert results[0]["meal_items"][0]["meal_item"]["name"] in ("鶏むね肉", "白米")
+
+    with django_assert_num_queries(4):
+        response = api_client.get(response.data["next"])
+    assert len(response.data["results"]) == 70
+    assert response.data["results"][-1]["date"] == "2025-01-01"
+
+    response = api_client.get("/api/meal/", {"date_from": "2025-03-30", "date_to": "2025-03-30"})
+    assert [record["date"] for record in response.data["results"]] == ["2025-03-30"] * 3
+
+
+@pytest.mark.django_db
+def test_copy_day_to_range(api_client, user, meal_item, django_assert_max_num_queries):
+    """ ✅ 1日分の食事記録を期間内の各日にまとめてコピーでき、日次サマリーも更新される """
+    api_client.force_login(user)
+    post_meal_record(api_client, meal_item, date="2025-01-15", time_of_day="朝食", quantity=150)
+    post_meal_record(api_client, meal_item, date="2025-01-15", time_of_day="夕食", quantity=50)
+    MealRecord.objects.filter(time_of_day="朝食").update(photo_key="meals/breakfast.jpg")
+
+    # コピー先の日数・記録の件数によらず一定のクエリ数で作成する
+    with django_assert_max_num_queries(20):
+        response = api_client.post("/api/meal/copy/", {
+            "source_date": "2025-01-15", "date_from": "2025-01-16", "date_to": "2025-01-22",
+        }, format="json")
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.data["count"] == 14
+    assert response.data["results"][0]["date"] == "2025-01-16"
+    assert response.data["results"][0]["photo_key"] is None
+    assert MealRecordItem.objects.filter(meal_record__date="2025-01-22").count() == 2
+    summary = api_client.get("/api/meal/summary/", {"date": "2025-01-20"}).data
+    assert summary["total_calories"] == pytest.approx(400)
+
+
+@pytest.mark.django_db
+def test_copy_selected_records(api_client, user, meal_item):
+    """ ✅ 食事記録を指定して複数の日付にコピーできる """
+    api_client.force_login(user)
+    record_id = post_meal_record(api_client, meal_item, time_of_day="昼食").data["id"]
+
+    response = api_client.post("/api/meal/copy/", {
+        "record_ids": [record_id], "target_dates": ["2025-01-18", "2025-01-17", "2025-01-18"],
+    }, format="json")
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert [(record["date"], record["time_of_day"]) for record in response.data["results"]] == [
+        ("2025-01-17", "昼食"), ("2025-01-18", "昼食")]
+
+
+@pytest.mark.django_db
+def test_log_recipe_servings(api_client, user, meal_item):
+    """ ✅ レシピを指定した量だけ食事記録に追加し、集計にも反映される """
+    recipe = Recipe.objects.create(title="鶏むね肉のソテー", description="", prep_time=15, size=2, created_by=user)
+    RecipeIngredient.objects.create(recipe=recipe, meal_item=meal_item, quantity=300)
+    api_client.force_login(user)
+
+    response = api_client.post("/api/meal/from-recipe/", {
+        "recipe_id": recipe.id, "servings": 1.5, "date": "2025-01-15", "time_of_day": "夕食",
+    }, format="json")
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert len(response.data["meal_items"]) == 1
+    item = MealRecordItem.objects.get()
+    assert item.unit == "人前"
+    assert item.quantity == 1.5
+    recipe.refresh_from_db()
+    assert item.meal_item_id == recipe.meal_item_id
+    # 1人前 300kcal（600kcal ÷ 2人前）× 1.5
+    summary = DailyNutritionSummary.objects.get(user=user, date="2025-01-15", time_of_day="夕食")
+    assert summary.calories == pytest.approx(450)
+
+
+# ❌ 異常系テスト
+@pytest.mark.django_db
+def test_summary_invalid_date(api_client, user):
+    """ ❌ 日付形式が不正な場合はエラー """
+    api_client.force_login(user)
+
+    response = api_client.get("/api/meal/summary/", {"date": "2025/01/15"})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_summary_range_too_long(api_client, user):
+    """ ❌ 期間が長すぎる場合はエラー """
+    api_client.force_login(user)
+
+    response = api_client.get("/api/meal/summary/range/", {"date_from": "2024-01-01", "date_to": "2025-12-31"})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_nutrients_without_profile(api_client, user):
+    """ ❌ プロフィール未登録の場合はエラー """
+    api_client.force_login(user)
+
+    response = api_client.get("/api/meal/summary/nutrients/")
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_meal_item_list_unknown_field(api_client, user):
+    """ ❌ 存在しない項目をfieldsに指定した場合はエラー """
+    api_client.force_login(user)
+
+    response = api_client.get("/api/meal/items/", {"fields": "name,password"})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_create_meal_item_invalid_barcode(api_client, user):
+    """ ❌ チェックデジットが不正なバーコードの食品は登録できない """
+    api_client.force_login(user)
+
+    response = api_client.post("/api/meal/items/", {
+        "name": "お茶", "calories": 0, "protein": 0, "fat": 0, "carbs": 0, "unit": "ml", "base_quantity": 100,
+        "jan_ean_code": "4901234567890",
+    }, format="json")
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "jan_ean_code" in response.data
+
+
+@pytest.mark.django_db
+def test_barcode_batch_not_object(api_client, user):
+    """ ❌ リクエストボディがオブジェクトでない場合はエラー """
+    api_client.force_login(user)
+
+    response = api_client.post("/api/meal/items/barcode/batch/", ["4901234567894"], format="json")
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "codes" in response.data
+
+
+@pytest.mark.django_db
+def test_create_meal_record_unknown_meal_item(api_client, user, meal_item):
+    """ ❌ 存在しない食品を指定した場合は何も保存しない """
+    api_client.force_login(user)
+    data = {
+        "date": "2025-01-15", "time_of_day": "朝食",
+        "meal_items": [
+            {"meal_item_id": meal_item.id, "quantity": 100, "unit": "g"},
+            {"meal_item_id": meal_item.id + 100, "quantity": 100, "unit": "g"},
+        ],
+    }
+
+    response = api_client.post("/api/meal/", data, format="json")
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "meal_items" in response.data
+    assert not MealRecord.objects.exists()
+
+
+@pytest.mark.django_db
+def test_upload_photo_not_image(api_client, user, settings, tmp_path):
+    """ ❌ 画像として読み込めないファイルはエラー """
+    settings.MEDIA_ROOT = str(tmp_path)
+    api_client.force_login(user)
+    photo = SimpleUploadedFile("meal.jpg", b"not an image", content_type="image/jpeg")
+
+    response = api_client.post("/api/meal/photo/", {"photo": photo}, format="multipart")
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert not any(tmp_path.iterdir())
+
+
+@pytest.mark.django_db
+def test_upload_photo_storage_error(
+        api_client, user, settings, tmp_path, monkeypatch, django_capture_on_commit_callbacks):
+    """ ❌ 変換後の保存に失敗した場合は失敗として記録し、一時保存したファイルを削除する """
+    settings.MEDIA_ROOT = str(tmp_path)
+    api_client.force_login(user)
+
+    def fail_save(key, content):
+        raise OSError("storage unavailable")
+
+    monkeypatch.setattr("meal.utils.photo._save", fail_save)
+    with django_capture_on_commit_callbacks(execute=True):
+        response = api_client.post("/api/meal/photo/", {"photo": make_jpeg(100, 100)}, format="multipart")
+
+    meal_photo = MealPhoto.objects.get(photo_key=response.data["photo_url"])
+    assert meal_photo.status == MealPhoto.STATUS_FAILED
+    assert meal_photo.error
+    assert meal_photo.staging_key == ""
+    assert not list((tmp_path / STAGING_DIRECTORY).rglob("*.jpg"))
+
+
+@pytest.mark.django_db
+def test_meal_record_list_invalid_range(api_client, user):
+    """ ❌ 期間の日付形式が不正な場合はエラー """
+    api_client.force_login(user)
+
+    response = api_client.get("/api/meal/", {"date_from": "2025/01/01"})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "date_from" in response.data
+
+
+@pytest.mark.django_db
+def test_copy_other_users_record(api_client, user, meal_item):
+    """ ❌ 他のユーザーの食事記録はコピーできない """
+    other = User.objects.create_user(
+        username="other_user", email="other@example.com", name="他のユーザー", password="password123")
+    record = MealRecord.objects.create(user=other, date="2025-01-15", time_of_day="朝食")
+    api_client.force_login(user)
+
+    response = api_client.post("/api/meal/copy/", {
+        "record_ids": [record.id], "target_dates": ["2025-01-16"],
+    }, format="json")
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "record_ids" in response.data
+    assert MealRecord.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_log_recipe_to_other_users_record(api_client, user, meal_item):
+    """ ❌ 他のユーザーの食事記録にはレシピを追加できない """
+    other = User.objects.create_user(
+        username="other_user", email="other@example.com", name="他のユーザー", password="password123")
+    record = MealRecord.objects.create(user=other, date="2025-01-15", time_of_day="朝食")
+    recipe = Recipe.objects.create(title="鶏むね肉のソテー", description="", prep_time=15, created_by=user)
+    api_client.force_login(user)
+
+    response = api_client.post("/api/meal/from-recipe/", {
+        "recipe_id": recipe.id, "record_id": record.id,
+    }, format="json")
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "record_id" in response.data
+    assert not MealRecordItem.objects.exists()
@@ -0,0 +1,124 @@
+""" JAN/EANコード（商品バーコード）の正規化と食品の検索
+
+バーコードは 8桁（JAN短縮/EAN-8）・12桁（UPC-A）・13桁（JAN標準/EAN-13）・14桁（GTIN-14）で
+読み取られることがあるため、チェックデジットを検証した上で以下の形式に正規化する。
+
+- 8桁: そのまま
+- 12桁・14桁: 先頭に0を補う・先頭の0を除いて13桁にする（13桁で表せない14桁はそのまま）
+
+保存済みのデータが正規化されていない場合にも一致するよう、検索時は同じコードの表記揺れ
+（先頭の0の有無）をまとめて完全一致で検索する。
+"""
+
+import threading
+import unicodedata
+
+from cachetools import TTLCache
+
+from meal.models import MealItem
+
+# 有効なバーコードの桁数
+BARCODE_LENGTHS = (8, 12, 13, 14)
+
+# 一括検索で指定できるコードの最大件数
+BARCODE_BATCH_LIMIT = 100
+
+# 最近ヒットしたバーコード（正規化済みコード → 食品）のキャッシュの件数と有効期限（秒）
+BARCODE_CACHE_SIZE = 4096
+BARCODE_CACHE_TTL = 300
+
+
+def is_valid_check_digit(digits) -> bool:
+    """ GTIN（JAN/EAN/UPC）のチェックデジット（モジュラス10 ウェイト3-1）を検証する """
+    body, check_digit = digits[:-1], int(digits[-1])
+    # チェックデジットの直前の桁から順に 3, 1, 3, 1... の重みを掛ける
+    total = sum(int(digit) * (3 if i % 2 == 0 else 1) for i, digit in enumerate(reversed(body)))
+    return (10 - total % 10) % 10 == check_digit
+
+
+def normalize_barcode(code):
+    """ バーコードを正規化する
+
+    全角数字・空白・ハイフンを含む入力も受け付ける。
+
+    Returns:
+        str | None: 正規化したコード。桁数・チェックデジットが不正な場合はNone
+    """
+    if not code:
+        return None
+    digits = "".join(unicodedata.normalize("NFKC", str(code)).replace("-", "").split())
+    if not digits.isascii() or not digits.isdigit() or len(digits) not in BARCODE_LENGTHS:
+        return None
+    if not is_valid_check_digit(digits):
+        return None
+
+    if len(digits) == 12:
+        return "0" + digits
+    if len(digits) == 14 and digits.startswith("0"):
+        return digits[1:]
+    return digits
+
+
+def barcode_variants(normalized) -> set:
+    """ 正規化したコードと同じ商品を表すコードの表記（先頭の0の有無）を返す """
+    variants = {normalized}
+    if len(normalized) == 13:
+        variants.add("0" + normalized)
+        if normalized.startswith("0"):
+            variants.add(normalized[1:])
+    elif len(normalized) == 8:
+        # EAN-8をGTIN-13/14の桁数に0埋めしたもの
+        variants.update({normalized.zfill(13), normalized.zfill(14)})
+    return variants
+
+
+_barcode_cache = TTLCache(maxsize=BARCODE_CACHE_SIZE, ttl=BARCODE_CACHE_TTL)
+_barcode_cache_lock = threading.Lock()
+
+
+def forget_barcode(code):
+    """ キャッシュからバーコードを削除する（同じコードの食品が登録された場合に呼び出す） """
+    normalized = normalize_barcode(code)
+    if normalized:
+        with _barcode_cache_lock:
+            _barcode_cache.pop(normalized, None)
+
+
+def clear_barcode_cache():
+    """ バーコードのキャッシュを削除する """
+    with _barcode_cache_lock:
+        _barcode_cache.clear()
+
+
+def lookup_barcodes(normalized_codes) -> dict:
+    """ 正規化済みのバーコードから食品をまとめて検索する
+
+    キャッシュにないコードのみ1回のクエリで検索する。
+    同じコードの食品が複数ある場合は公式食品 → 登録が古い食品の順に優先する。
+
+    Returns:
+        dict: {正規化済みコード: MealItem}（見つからなかったコードは含まない）
+    """
+    found = {}
+    with _barcode_cache_lock:
+        for normalized in normalized_codes:
+            meal_item = _barcode_cache.get(normalized)
+            if meal_item is not None:
+                found[normalized] = meal_item
+
+    missing = {normalized: barcode_variants(normalized) for normalized in normalized_codes if normalized not in found}
+    if not missing:
+        return found
+
+    variant_to_code = {variant: normalized for normalized, variants in missing.items() for variant in variants}
+    meal_items = MealItem.objects.filter(
+        jan_ean_code__in=variant_to_code.keys()
+    ).order_by("-is_official", "id")
+    hits = {}
+    for meal_item in meal_items:
+        hits.setdefault(variant_to_code[meal_item.jan_ean_code], meal_item)
+
+    with _barcode_cache_lock:
+        _barcode_cache.update(hits)
+    found.update(hits)
+    return found
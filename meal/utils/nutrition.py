@@ -1,9 +1,16 @@
 from datetime import date
+from functools import lru_cache
+from types import MappingProxyType
 import json
 import os
 
+from django.core.cache import cache
+
 from weight.models import WeightRecord
 
+# 推奨量キャッシュの有効期限（秒）。体重更新時は明示的に削除する
+NUTRIENT_TARGETS_CACHE_TIMEOUT = 60 * 60
+
 # --- 栄養素の単位辞書 ---
 nutrient_units = {
     "energy": "kcal",
@@ -19,6 +26,38 @@ nutrient_units = {
     "コレステロール": "mg", "食物繊維": "g", "食塩相当量": "g"
 }
 
+# --- MealItemの栄養素フィールドと推奨量のキーの対応 ---
+nutrient_target_keys = {
+    "calories": "energy", "protein": "protein", "fat": "fat", "carbs": "carbohydrate",
+    "vitamin_a": "ビタミンA", "vitamin_d": "ビタミンD", "vitamin_e": "ビタミンE", "vitamin_k": "ビタミンK",
+    "vitamin_b1": "ビタミンB1", "vitamin_b2": "ビタミンB2", "niacin": "ナイアシン", "vitamin_b6": "ビタミンB6",
+    "vitamin_b12": "ビタミンB12", "folic_acid": "葉酸", "pantothenic_acid": "パントテン酸", "biotin": "ビオチン",
+    "vitamin_c": "ビタミンC", "sodium": "ナトリウム", "potassium": "カリウム", "calcium": "カルシウム",
+    "magnesium": "マグネシウム", "phosphorus": "リン", "iron": "鉄", "zinc": "亜鉛", "copper": "銅",
+    "manganese": "マンガン", "iodine": "ヨウ素", "selenium": "セレン", "chromium": "クロム",
+    "molybdenum": "モリブデン", "cholesterol": "コレステロール", "dietary_fiber": "食物繊維",
+    "salt_equivalent": "食塩相当量"
+}
+
+
+@lru_cache(maxsize=None)
+def load_recommended_intake() -> MappingProxyType:
+    """ 推奨摂取量JSONをプロセスごとに1回だけ読み込む
+
+    Returns:
+        MappingProxyType: {(sex, age_group): {栄養素名: 推奨量}} の読み取り専用辞書
+    """
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    json_path = os.path.join(base_dir, "recommended_intake_complete.json")
+    with open(json_path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+
+    return MappingProxyType({
+        (sex, age_group): MappingProxyType(values)
+        for sex, age_groups in raw.items()
+        for age_group, values in age_groups.items()
+    })
+
 
 class NutrientRecommendationCalculator:
     """ 推奨栄養素計算クラス """
@@ -27,16 +66,11 @@ class NutrientRecommendationCalculator:
         self.birth_date = user.birth_date
         self.height = user.height
         self.activity_level = user.activity_level
-        self.weight = WeightRecord.objects.filter(user=user).order_by('-date').first().weight if user.weight else 0
+        latest_weight = WeightRecord.objects.filter(user=user).order_by('-record_date').first()
+        self.weight = latest_weight.weight if latest_weight else 0
         self.age = user.calculate_age()
         self.age_group = self._get_age_group()
 
-        # JSONファイルからrecommended_intakeを読み込む
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        json_path = os.path.join(base_dir, "recommended_intake_complete.json")
-        with open(json_path, "r", encoding="utf-8") as f:
-            self.recommended_intake = json.load(f)
-
     def _get_age_group(self) -> str:
         age = self.age
         if 18 <= age <= 29:
@@ -75,7 +109,7 @@ class NutrientRecommendationCalculator:
         }
 
     def get_micronutrient_targets(self) -> dict:
-        return self.recommended_intake[self.sex][self.age_group]
+        return dict(load_recommended_intake()[(self.sex, self.age_group)])
 
     def get_all_targets(self) -> dict:
         return {
@@ -92,3 +126,59 @@ class NutrientRecommendationCalculator:
             }
             for key, value in raw.items()
         }
+
+
+def _nutrient_targets_cache_key(user_id) -> str:
+    return f"meal:nutrient_targets:{user_id}"
+
+
+def _profile_fingerprint(user) -> tuple:
+    """ 推奨量の計算に使うプロフィール項目（年齢の変化も含む） """
+    return (user.sex, str(user.birth_date), user.height, user.activity_level, user.calculate_age())
+
+
+def get_nutrient_targets(user) -> dict:
+    """ ユーザーの推奨量をキャッシュから取得する（なければ計算してキャッシュする）
+
+    プロフィール（性別・生年月日・身長・活動レベル）が変わった場合はキャッシュを使わずに再計算する。
+    体重の変更は invalidate_nutrient_targets() で明示的にキャッシュを削除する。
+    """
+    key = _nutrient_targets_cache_key(user.pk)
+    fingerprint = _profile_fingerprint(user)
+
+    cached = cache.get(key)
+    if cached and cached["fingerprint"] == fingerprint:
+        return dict(cached["targets"])
+
+    targets = NutrientRecommendationCalculator(user).get_all_targets()
+    cache.set(key, {"fingerprint": fingerprint, "targets": targets}, NUTRIENT_TARGETS_CACHE_TIMEOUT)
+    return dict(targets)
+
+
+def invalidate_nutrient_targets(user_id):
+    """ ユーザーの推奨量キャッシュを削除する（体重記録の作成・更新時に呼び出す） """
+    cache.delete(_nutrient_targets_cache_key(user_id))
+
+
+def build_intake_report(intake: dict, targets: dict) -> list:
+    """ 栄養素ごとの摂取量と推奨量、達成率(%)の一覧を作成する
+
+    Args:
+        intake: {MealItemの栄養素フィールド: 摂取量 or None}
+        targets: NutrientRecommendationCalculator.get_all_targets() の戻り値
+    """
+    report = []
+    for field, target_key in nutrient_target_keys.items():
+        value = intake.get(field)
+        target = targets.get(target_key)
+        report.append({
+            "key": field,
+            "name": target_key,
+            "unit": nutrient_units.get(target_key, ""),
+            "intake": round(value or 0.0, 3),
+            # 栄養素データのある食品を1つも記録していない場合はFalse
+            "has_data": value is not None,
+            "target": target,
+            "percent": round((value or 0.0) / target * 100, 1) if target else None,
+        })
+    return report
@@ -0,0 +1,157 @@
+""" 食事写真の変換
+
+アップロードされた写真（JPEG/PNG/HEICなど）はそのまま一時保存場所に保存し、
+バックグラウンドのタスク（meal.tasks.process_meal_photo_task）でPillowで読み込んで、
+向きを補正してEXIF（位置情報など）を除去した上で、WebPの本体とサムネイルを保存する。
+
+保存先のキー:
+    meals/staging/{ユーザーID}/{UUID}.{拡張子} … 変換前のファイル（変換後に削除）
+    meals/{ユーザーID}/{UUID}/original.webp   … 本体（長辺 ORIGINAL_MAX_SIDE px 以下）
+    meals/{ユーザーID}/{UUID}/{サイズ名}.webp  … 正方形に切り抜いたサムネイル
+"""
+
+import io
+import posixpath
+import re
+import uuid
+
+import pillow_heif
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from meal.models import MealPhoto
+
+# HEIC/HEIF（iPhoneの標準形式）をPillowで読み込めるようにする
+pillow_heif.register_heif_opener()
+
+# アップロードできるファイルの最大サイズ（バイト）
+MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+
+# 読み込む画像の最大ピクセル数（解凍爆弾対策）
+MAX_IMAGE_PIXELS = 50_000_000
+
+# 本体の長辺の最大ピクセル数と画質
+ORIGINAL_MAX_SIDE = 2048
+ORIGINAL_QUALITY = 82
+
+# サムネイルのサイズ名 → 一辺のピクセル数（中央を正方形に切り抜く）
+THUMBNAIL_SIZES = {
+    "small": 200,
+    "medium": 600,
+}
+THUMBNAIL_QUALITY = 75
+
+# 一覧で使うサムネイル
+LIST_THUMBNAIL_SIZE = "small"
+
+ORIGINAL_NAME = "original.webp"
+
+# 変換前のファイルの一時保存場所
+STAGING_DIRECTORY = "meals/staging"
+
+_PHOTO_KEY_PATTERN = re.compile(r"^meals/\d+/[0-9a-f]{32}/original\.webp$")
+
+
+def thumbnail_key(photo_key, size=LIST_THUMBNAIL_SIZE):
+    """ 写真のキーからサムネイルのキーを返す（変換前にアップロードされた写真の場合はNone） """
+    if not photo_key or not _PHOTO_KEY_PATTERN.match(photo_key):
+        return None
+    return posixpath.join(posixpath.dirname(photo_key), f"{size}.webp")
+
+
+def thumbnail_keys(photo_key) -> dict:
+    """ 写真のキーから全サイズのサムネイルのキーを返す """
+    return {size: thumbnail_key(photo_key, size) for size in THUMBNAIL_SIZES}
+
+
+def _encode_webp(image, quality) -> ContentFile:
+    buffer = io.BytesIO()
+    # exif を渡さずに保存するため、EXIFは書き込まれない
+    image.save(buffer, format="WEBP", quality=quality, method=4)
+    return ContentFile(buffer.getvalue())
+
+
+def validate_photo(photo):
+    """
+    アップロードされたファイルのサイズと画像の形式・解像度を確認する（ヘッダーのみ読み込み、デコードはしない）
+
+    Raises:
+        ValueError: ファイルサイズが大きすぎる・画像として読み込めない場合
+    """
+    if photo.size > MAX_UPLOAD_SIZE:
+        raise ValueError(f"画像ファイルのサイズは{MAX_UPLOAD_SIZE // (1024 * 1024)}MB以下にしてください。")
+
+    try:
+        with Image.open(photo) as image:
+            if image.width * image.height > MAX_IMAGE_PIXELS:
+                raise ValueError("画像の解像度が大きすぎます。")
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        raise ValueError("画像ファイルを読み込めませんでした。")
+    finally:
+        photo.seek(0)
+
+
+def load_photo(photo):
+    """
+    写真を読み込み、向きを補正したRGB画像を返す
+
+    Raises:
+        ValueError: 画像として読み込めない場合
+    """
+    validate_photo(photo)
+    try:
+        with Image.open(photo) as image:
+            # EXIFの向き情報を画素に反映してから、EXIFを持たない画像に変換する
+            image = ImageOps.exif_transpose(image)
+            return image.convert("RGB")
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        raise ValueError("画像ファイルを読み込めませんでした。")
+
+
+def _save(key, content):
+    """ キーを変えずに保存する（タスクの再実行で同じキーに保存する場合は上書きする） """
+    if default_storage.exists(key):
+        default_storage.delete(key)
+    return default_storage.save(key, content)
+
+
+def stage_meal_photo(photo, user_id):
+    """
+    アップロードされた写真を変換前の一時保存場所に保存し、変換待ちの MealPhoto を作成する
+
+    変換後の本体のキーはこの時点で決まるため、食事記録の photo_key にすぐに指定できる。
+
+    Raises:
+        ValueError: 画像として保存できない場合
+    """
+    validate_photo(photo)
+
+    photo_id = uuid.uuid4().hex
+    ext = posixpath.splitext(photo.name)[-1].lower()
+    staging_key = default_storage.save(f"{STAGING_DIRECTORY}/{user_id}/{photo_id}{ext}", photo)
+    return MealPhoto.objects.create(
+        user_id=user_id,
+        photo_key=f"meals/{user_id}/{photo_id}/{ORIGINAL_NAME}",
+        staging_key=staging_key,
+    )
+
+
+def process_meal_photo(meal_photo):
+    """
+    一時保存した写真を変換して本体とサムネイルを保存する
+
+    Raises:
+        ValueError: 画像として読み込めない場合
+    """
+    with default_storage.open(meal_photo.staging_key) as photo:
+        image = load_photo(photo)
+
+    original = image.copy()
+    original.thumbnail((ORIGINAL_MAX_SIDE, ORIGINAL_MAX_SIDE), Image.Resampling.LANCZOS)
+    _save(meal_photo.photo_key, _encode_webp(original, ORIGINAL_QUALITY))
+
+    for size, key in thumbnail_keys(meal_photo.photo_key).items():
+        side = THUMBNAIL_SIZES[size]
+        thumbnail = ImageOps.fit(image, (side, side), Image.Resampling.LANCZOS)
+        _save(key, _encode_webp(thumbnail, THUMBNAIL_QUALITY))
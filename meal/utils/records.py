@@ -0,0 +1,55 @@
+""" 食事記録のコピー
+
+前日の朝食など、同じ内容の食事記録を別の日付にまとめて複製する。
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+
+from meal.models import MealRecord, MealRecordItem
+from meal.utils.summary import refresh_daily_summaries
+
+# コピー先に指定できる最大日数
+MAX_COPY_TARGET_DAYS = 31
+
+# 一度にコピーできる食事記録の最大件数（コピー元の件数 × コピー先の日数）
+MAX_COPY_RECORDS = 500
+
+
+def date_range(date_from, date_to) -> list:
+    """ 開始日〜終了日（両端を含む）の日付のリストを返す """
+    return [date_from + timedelta(days=day) for day in range((date_to - date_from).days + 1)]
+
+
+def copy_meal_records(user, records, target_dates) -> list:
+    """
+    食事記録（食品を含む）を指定した日付にコピーする
+
+    食事記録と食品はそれぞれ1回の一括INSERTで作成し、コピー先の日付の日次サマリーもまとめて再計算する。
+    写真はコピーしない。
+
+    Args:
+        records: コピー元のMealRecord（meal_itemsを取得済みであること）
+        target_dates: コピー先の日付のリスト
+
+    Returns:
+        list: 作成したMealRecordのID（コピー先の日付順・コピー元の順）
+    """
+    with transaction.atomic():
+        new_records = MealRecord.objects.bulk_create([
+            MealRecord(user=user, date=target_date, time_of_day=record.time_of_day)
+            for target_date in target_dates for record in records
+        ])
+
+        sources = [record for _ in target_dates for record in records]
+        MealRecordItem.objects.bulk_create([
+            MealRecordItem(
+                meal_record=new_record, meal_item_id=item.meal_item_id, quantity=item.quantity, unit=item.unit)
+            for new_record, source in zip(new_records, sources)
+            for item in source.meal_items.all()
+        ])
+
+        refresh_daily_summaries(user, target_dates)
+
+    return [record.id for record in new_records]
@@ -0,0 +1,309 @@
+""" 食品検索インデックス
+
+食品名と検索キーワードを正規化（全角/半角・カタカナ/ひらがな・大文字/小文字の統一）して
+MealItemSearchIndex に保存し、順位付きの部分一致検索を行う。
+
+- PostgreSQL: pg_trgm の GIN インデックスで search_text の部分一致を検索
+- SQLite など: プロセス内の n-gram 転置インデックスで候補を絞り込む
+"""
+
+import math
+import threading
+import unicodedata
+import uuid
+from collections import defaultdict
+
+from cachetools import TTLCache
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, Count, IntegerField, Max, Q, Value, When
+from django.db.models.functions import Coalesce, Length
+
+from meal.models import MealItem, MealItemSearchIndex, MealRecordItem
+
+# 転置インデックスのn-gram長
+NGRAM_SIZE = 2
+
+# 転置インデックスから返す候補の最大件数
+SEARCH_CANDIDATE_LIMIT = 500
+
+# オートコンプリートで順位付けする候補の件数
+AUTOCOMPLETE_CANDIDATES = 50
+
+# オートコンプリートの候補キャッシュ（正規化済みの入力 → 候補）の件数と有効期限（秒）
+AUTOCOMPLETE_CACHE_SIZE = 1024
+AUTOCOMPLETE_CACHE_TTL = 60
+
+# 記録回数による順位の補正の重み（log(1 + 記録回数) に掛ける）
+AUTOCOMPLETE_USAGE_WEIGHT = 0.5
+
+# カタカナ（ァ〜ヶ）→ ひらがな（ぁ〜ゖ）の変換表
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(ord("ァ"), ord("ヶ") + 1)}
+
+
+def normalize_text(text) -> str:
+    """ 検索用に文字列を正規化する
+
+    - NFKC正規化（全角英数→半角、半角カナ→全角カナ）
+    - 英字を小文字に統一
+    - カタカナをひらがなに統一
+    - 空白を除去
+    """
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", text).lower().translate(_KATAKANA_TO_HIRAGANA)
+    return "".join(text.split())
+
+
+def split_keywords(search_keywords) -> list:
+    """ カンマ区切りの検索キーワードを正規化して分割する（全角カンマ・読点も区切りとして扱う） """
+    if not search_keywords:
+        return []
+    text = unicodedata.normalize("NFKC", search_keywords).replace("、", ",")
+    return [keyword for keyword in (normalize_text(part) for part in text.split(",")) if keyword]
+
+
+def ngrams(text, size=NGRAM_SIZE) -> set:
+    """ 文字列のn-gramを返す（n文字未満の場合は文字列そのもの） """
+    if len(text) < size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def build_index_values(name, search_keywords) -> dict:
+    """ MealItemSearchIndex に保存する値を作成する """
+    normalized_name = normalize_text(name)
+    parts = [normalized_name] + split_keywords(search_keywords)
+    return {
+        "normalized_name": normalized_name[:100],
+        # 正規化済みの各語は空白を含まないため、語をまたいだ一致は起こらない
+        "search_text": " ".join(parts),
+    }
+
+
+def update_search_index(meal_item):
+    """ 食品1件の検索インデックスを作成・更新する """
+    MealItemSearchIndex.objects.update_or_create(
+        meal_item=meal_item,
+        defaults=build_index_values(meal_item.name, meal_item.search_keywords),
+    )
+    clear_autocomplete_cache()
+
+
+def rebuild_search_index(queryset=None, batch_size=1000) -> int:
+    """ 検索インデックスを一括で再構築する
+
+    Args:
+        queryset: 対象のMealItem（指定しない場合は全件）
+
+    Returns:
+        int: 再構築した件数
+    """
+    if queryset is None:
+        queryset = MealItem.objects.all()
+
+    count = 0
+    batch = []
+    for meal_item_id, name, search_keywords in queryset.values_list("id", "name", "search_keywords").iterator():
+        batch.append(MealItemSearchIndex(meal_item_id=meal_item_id, **build_index_values(name, search_keywords)))
+        if len(batch) >= batch_size:
+            count += _save_index_batch(batch)
+            batch = []
+    if batch:
+        count += _save_index_batch(batch)
+    clear_autocomplete_cache()
+    return count
+
+
+def _save_index_batch(batch) -> int:
+    MealItemSearchIndex.objects.bulk_create(
+        batch,
+        update_conflicts=True,
+        unique_fields=["meal_item"],
+        update_fields=["normalized_name", "search_text", "updated_at"],
+    )
+    return len(batch)
+
+
+def uses_trigram_index() -> bool:
+    """ pg_trgm の GIN インデックスを使えるか（PostgreSQLの場合のみ） """
+    return connection.vendor == "postgresql"
+
+
+class InvertedIndex:
+    """ プロセス内のn-gram転置インデックス（PostgreSQL以外で使用）
+
+    検索インデックスの件数と最終更新日時をバージョンとして持ち、
+    他プロセスで食品が追加・更新された場合も次回の検索時に再構築される。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._postings = {}
+        self._entries = {}
+
+    def _current_version(self):
+        stamp = MealItemSearchIndex.objects.aggregate(count=Count("pk"), updated_at=Max("updated_at"))
+        return (stamp["count"], stamp["updated_at"])
+
+    def _ensure_fresh(self):
+        version = self._current_version()
+        if version == self._version:
+            return
+
+        with self._lock:
+            if version == self._version:
+                return
+            postings = defaultdict(set)
+            entries = {}
+            rows = MealItemSearchIndex.objects.values_list("meal_item_id", "normalized_name", "search_text")
+            for meal_item_id, normalized_name, search_text in rows.iterator():
+                entries[meal_item_id] = (normalized_name, search_text)
+                for part in search_text.split():
+                    for gram in ngrams(part):
+                        postings[gram].add(meal_item_id)
+            self._postings, self._entries, self._version = dict(postings), entries, version
+
+    def search(self, query, limit=SEARCH_CANDIDATE_LIMIT) -> list:
+        """ 正規化済みのクエリに部分一致する食品IDを順位順に返す """
+        self._ensure_fresh()
+        postings, entries = self._postings, self._entries
+
+        grams = ngrams(query)
+        if len(query) < NGRAM_SIZE:
+            # 1文字の場合はその文字を含むn-gramの和集合を候補にする
+            candidates = set().union(*(ids for gram, ids in postings.items() if query in gram))
+        else:
+            posting_lists = sorted((postings.get(gram, set()) for gram in grams), key=len)
+            candidates = set.intersection(*posting_lists) if posting_lists else set()
+
+        ranked = []
+        for meal_item_id in candidates:
+            normalized_name, search_text = entries[meal_item_id]
+            if query not in search_text:
+                continue
+            ranked.append((rank_match(query, normalized_name), len(normalized_name), meal_item_id))
+        ranked.sort()
+        return [meal_item_id for _, _, meal_item_id in ranked[:limit]]
+
+
+_inverted_index = InvertedIndex()
+
+
+def rank_match(query, normalized_name) -> int:
+    """ 一致の順位（0: 完全一致, 1: 前方一致, 2: 食品名の部分一致, 3: キーワードのみ一致） """
+    if normalized_name == query:
+        return 0
+    if normalized_name.startswith(query):
+        return 1
+    if query in normalized_name:
+        return 2
+    return 3
+
+
+def rank_expression(query):
+    """ rank_match() と同じ順位をSQLで計算する式 """
+    return Case(
+        When(search_index__normalized_name=query, then=Value(0)),
+        When(search_index__normalized_name__startswith=query, then=Value(1)),
+        When(search_index__normalized_name__contains=query, then=Value(2)),
+        default=Value(3),
+        output_field=IntegerField(),
+    )
+
+
+def search_meal_items(queryset, query):
+    """ 食品を検索し、順位（search_rank）の昇順に並べたQuerySetを返す
+
+    管理画面・シェルで作成されたなど、検索インデックスのない食品は食品名・検索キーワードの
+    部分一致（icontains）で検索し、キーワードのみ一致と同じ順位とする。
+
+    Args:
+        queryset: 検索対象のMealItemのQuerySet
+        query: 検索文字列（正規化前）
+    """
+    normalized = normalize_text(query)
+    if not normalized:
+        return queryset.none()
+
+    if uses_trigram_index():
+        indexed = Q(search_index__search_text__contains=normalized)
+    else:
+        indexed = Q(id__in=_inverted_index.search(normalized))
+    keyword = query.strip()
+    not_indexed = Q(search_index__isnull=True) & (Q(name__icontains=keyword) | Q(search_keywords__icontains=keyword))
+
+    return queryset.filter(indexed | not_indexed).annotate(
+        search_rank=rank_expression(normalized),
+        search_name_length=Coalesce(Length("search_index__normalized_name"), Length("name")),
+    ).order_by("search_rank", "search_name_length", "id")
+
+
+_autocomplete_cache = TTLCache(maxsize=AUTOCOMPLETE_CACHE_SIZE, ttl=AUTOCOMPLETE_CACHE_TTL)
+_autocomplete_cache_lock = threading.Lock()
+
+
+# 候補キャッシュのバージョンのキー（共有キャッシュに保存し、変更で全プロセスの候補キャッシュを無効にする）
+AUTOCOMPLETE_VERSION_KEY = "meal:autocomplete_version"
+
+
+def clear_autocomplete_cache():
+    """ オートコンプリートの候補キャッシュを削除する（検索インデックスの更新時に呼び出す）
+
+    このプロセスの候補は削除し、他のプロセスの候補はバージョンの変更で次回の検索時に無効にする。
+    """
+    cache.delete(AUTOCOMPLETE_VERSION_KEY)
+    with _autocomplete_cache_lock:
+        _autocomplete_cache.clear()
+
+
+def _autocomplete_candidates(normalized) -> list:
+    """ 入力に一致する候補（軽量な項目のみ）を取得する。よく入力される前方部分はキャッシュする """
+    version = cache.get_or_set(AUTOCOMPLETE_VERSION_KEY, lambda: uuid.uuid4().hex, None)
+    key = (version, normalized)
+    with _autocomplete_cache_lock:
+        cached = _autocomplete_cache.get(key)
+    if cached is not None:
+        return cached
+
+    candidates = list(
+        search_meal_items(MealItem.objects.all(), normalized).values(
+            "id", "name", "unit", "base_quantity", "calories", "search_rank"
+        )[:AUTOCOMPLETE_CANDIDATES]
+    )
+    with _autocomplete_cache_lock:
+        _autocomplete_cache[key] = candidates
+    return candidates
+
+
+def autocomplete_meal_items(user, query, limit=10) -> list:
+    """ オートコンプリート用に食品を検索する
+
+    文字列の一致順位に、ユーザーがその食品を記録した回数による補正を加えて並べる。
+
+    Returns:
+        list: [{"id", "name", "unit", "base_quantity", "calories"}, ...]
+    """
+    normalized = normalize_text(query)
+    if not normalized:
+        return []
+
+    candidates = _autocomplete_candidates(normalized)
+    usage = dict(
+        MealRecordItem.objects.filter(
+            meal_record__user=user, meal_item_id__in=[candidate["id"] for candidate in candidates]
+        ).values("meal_item_id").annotate(count=Count("id")).values_list("meal_item_id", "count").order_by()
+    )
+
+    def score(position, candidate):
+        text_score = 1.0 / (1 + candidate["search_rank"])
+        usage_score = AUTOCOMPLETE_USAGE_WEIGHT * math.log1p(usage.get(candidate["id"], 0))
+        # 同点の場合は検索結果の順位を維持する
+        return (-(text_score + usage_score), position)
+
+    ranked = sorted(enumerate(candidates), key=lambda pair: score(*pair))[:limit]
+    return [
+        {key: candidate[key] for key in ("id", "name", "unit", "base_quantity", "calories")}
+        for _, candidate in ranked
+    ]
@@ -0,0 +1,242 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, DateField, F, Sum
+from django.db.models.functions import Trunc
+
+from meal.models import DailyNutritionSummary, MealRecord, MealRecordItem
+
+# --- 食事タイプ（朝食・昼食・夕食・間食） ---
+TIME_OF_DAY_CHOICES = [choice for choice, _ in MealRecord._meta.get_field("time_of_day").choices]
+
+# --- サマリーで集計するPFC ---
+SUMMARY_FIELDS = ("calories", "protein", "fat", "carbs")
+
+# --- 期間サマリーの集計単位 ---
+RANGE_GROUP_BY_CHOICES = ("day", "week", "month")
+
+# --- MealItemの拡張栄養素（ビタミン・ミネラルなど） ---
+MICRONUTRIENT_FIELDS = (
+    "vitamin_a", "vitamin_d", "vitamin_e", "vitamin_k", "vitamin_b1", "vitamin_b2",
+    "niacin", "vitamin_b6", "vitamin_b12", "folic_acid", "pantothenic_acid",
+    "biotin", "vitamin_c", "sodium", "potassium", "calcium", "magnesium",
+    "phosphorus", "iron", "zinc", "copper", "manganese", "iodine", "selenium",
+    "chromium", "molybdenum", "cholesterol", "dietary_fiber", "salt_equivalent",
+)
+
+
+def intake_sum(field, prefix="meal_item__"):
+    """ 摂取量に応じた栄養素の合計式を返す
+
+    base_quantityあたりの値なので、摂取量 / base_quantity の比率を掛けて合計する。
+    例: base_quantity=100g, calories=200kcal, quantity=150gの場合 → 200 * (150/100) = 300kcal
+    NULLの栄養素はSUMで無視される（全てNULLの場合はNoneになる）。
+    """
+    return Sum(F(f"{prefix}{field}") * F("quantity") / F(f"{prefix}base_quantity"))
+
+
+def compute_nutrition_by_date(user, dates) -> dict:
+    """ 指定日の食事記録から日付・食事タイプ別の栄養素をDBで集計する
+
+    Returns:
+        dict: {(date, time_of_day): {"calories": ..., "protein": ..., "fat": ..., "carbs": ..., "record_count": ...}}
+              記録が存在する日付・食事タイプのみ含む
+    """
+    totals = {}
+
+    records = MealRecord.objects.filter(
+        user=user, date__in=dates
+    ).values("date", "time_of_day").annotate(record_count=Count("id")).order_by()
+    for row in records:
+        key = (row["date"], row["time_of_day"])
+        totals[key] = {field: 0.0 for field in SUMMARY_FIELDS}
+        totals[key]["record_count"] = row["record_count"]
+
+    items = MealRecordItem.objects.filter(
+        meal_record__user=user, meal_record__date__in=dates
+    ).values("meal_record__date", "meal_record__time_of_day").annotate(
+        **{field: intake_sum(field) for field in SUMMARY_FIELDS}
+    ).order_by()
+    for row in items:
+        summary = totals[(row["meal_record__date"], row["meal_record__time_of_day"])]
+        for field in SUMMARY_FIELDS:
+            summary[field] = row[field] or 0.0
+
+    return totals
+
+
+def compute_daily_nutrition(user, target_date) -> dict:
+    """ 指定日の食事記録から食事タイプ別の栄養素をDBで集計する
+
+    Returns:
+        dict: {time_of_day: {"calories": ..., "protein": ..., "fat": ..., "carbs": ..., "record_count": ...}}
+              記録が存在する食事タイプのみ含む
+    """
+    return {
+        time_of_day: values
+        for (_, time_of_day), values in compute_nutrition_by_date(user, [target_date]).items()
+    }
+
+
+def _lock_summaries(user):
+    """ ユーザーの日次栄養サマリーの再計算を直列化する（ユーザーの行をトランザクション終了までロックする）
+
+    同じユーザーの食事記録が同時に保存された場合に、後から再計算する側が先の保存のコミットを待ってから
+    集計するようにし、一方の記録が抜けた集計で上書きされるのを防ぐ。トランザクション内で呼び出す。
+    """
+    list(get_user_model().objects.select_for_update().filter(pk=user.pk).values_list("pk", flat=True))
+
+
+def refresh_daily_summaries(user, dates):
+    """ 複数の日付の日次栄養サマリーをまとめて再計算して保存する
+
+    日付の件数によらず、ロック1回・集計2回・削除1回・一括INSERT1回のクエリで更新する。
+    食事記録のコピーなど、複数の日付の記録をまとめて作成した場合に呼び出す。
+    """
+    dates = set(dates)
+
+    with transaction.atomic():
+        _lock_summaries(user)
+        totals = compute_nutrition_by_date(user, dates)
+        DailyNutritionSummary.objects.filter(user=user, date__in=dates).delete()
+        DailyNutritionSummary.objects.bulk_create([
+            DailyNutritionSummary(user=user, date=target_date, time_of_day=time_of_day, **values)
+            for (target_date, time_of_day), values in totals.items()
+        ])
+
+
+def refresh_summaries_for_meal_items(meal_item_ids) -> int:
+    """ 食品の栄養素を変更した場合に、その食品を記録した日の日次栄養サマリーをまとめて再計算する
+
+    食品マスタの取り込みなど、既存の食品の値を更新した場合に呼び出す。
+
+    Returns:
+        int: 再計算した (ユーザー, 日付) の件数
+    """
+    targets = set(
+        MealRecordItem.objects.filter(meal_item_id__in=meal_item_ids)
+        .values_list("meal_record__user_id", "meal_record__date").distinct()
+    )
+    dates_by_user = {}
+    for user_id, target_date in targets:
+        dates_by_user.setdefault(user_id, set()).add(target_date)
+
+    users = get_user_model().objects.in_bulk(dates_by_user.keys())
+    for user_id, dates in dates_by_user.items():
+        refresh_daily_summaries(users[user_id], dates)
+    return len(targets)
+
+
+def refresh_daily_summary(user, target_date):
+    """ 指定日の日次栄養サマリーを再計算して保存する
+
+    食事記録の作成・更新・削除時に呼び出し、サマリーテーブルを最新の状態に保つ。
+    ユーザーごとにロックしてから集計するため、同時に保存された記録も漏れなく集計される。
+    """
+    with transaction.atomic():
+        _lock_summaries(user)
+        totals = compute_daily_nutrition(user, target_date)
+        DailyNutritionSummary.objects.filter(
+            user=user, date=target_date
+        ).exclude(time_of_day__in=totals.keys()).delete()
+
+        for time_of_day, values in totals.items():
+            DailyNutritionSummary.objects.update_or_create(
+                user=user, date=target_date, time_of_day=time_of_day,
+                defaults=values,
+            )
+
+
+def compute_daily_intake(user, target_date) -> dict:
+    """ 指定日の全栄養素（PFC + 拡張栄養素）の摂取量を1回のSQL集計で求める
+
+    Returns:
+        dict: {field: 摂取量}。栄養素データのある食品が1つもない場合はNone
+    """
+    return MealRecordItem.objects.filter(
+        meal_record__user=user, meal_record__date=target_date
+    ).aggregate(
+        **{field: intake_sum(field) for field in SUMMARY_FIELDS + MICRONUTRIENT_FIELDS}
+    )
+
+
+def build_summary_response(user, target_date) -> dict:
+    """ 日次栄養サマリーテーブルからAPIレスポンスを組み立てる """
+    meal_type_calories = {time_of_day: 0.0 for time_of_day in TIME_OF_DAY_CHOICES}
+    response = {f"total_{field}": 0.0 for field in SUMMARY_FIELDS}
+    record_count = 0
+
+    for summary in DailyNutritionSummary.objects.filter(user=user, date=target_date):
+        for field in SUMMARY_FIELDS:
+            response[f"total_{field}"] += getattr(summary, field)
+        meal_type_calories[summary.time_of_day] += summary.calories
+        record_count += summary.record_count
+
+    response["record_count"] = record_count
+    response["meal_type_calories"] = meal_type_calories
+    response["date"] = target_date.isoformat()
+    return response
+
+
+def _period_start(target_date, group_by):
+    """ 日付が属する集計期間の開始日を返す（週は月曜始まり） """
+    if group_by == "week":
+        return target_date - timedelta(days=target_date.weekday())
+    if group_by == "month":
+        return target_date.replace(day=1)
+    return target_date
+
+
+def _iter_periods(date_from, date_to, group_by):
+    """ 期間内の集計期間の開始日を順に返す """
+    period = _period_start(date_from, group_by)
+    while period <= date_to:
+        yield period
+        if group_by == "week":
+            period += timedelta(days=7)
+        elif group_by == "month":
+            period = (period.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            period += timedelta(days=1)
+
+
+def compute_range_nutrition(user, date_from, date_to, group_by="day", include_micronutrients=False) -> list:
+    """ 期間内の栄養素を日・週・月単位でSQL集計（記録件数・栄養素の2回）で求める
+
+    記録件数は日次サマリーと同じく、食品のない食事記録も含めて MealRecord から数える。
+
+    Returns:
+        list: 集計期間ごとの栄養素合計（記録がない期間は0で埋める）
+    """
+    fields = SUMMARY_FIELDS + (MICRONUTRIENT_FIELDS if include_micronutrients else ())
+
+    record_counts = dict(
+        MealRecord.objects.filter(
+            user=user, date__range=(date_from, date_to)
+        ).annotate(
+            period=Trunc("date", group_by, output_field=DateField())
+        ).values("period").annotate(record_count=Count("id")).values_list("period", "record_count").order_by()
+    )
+    rows = MealRecordItem.objects.filter(
+        meal_record__user=user, meal_record__date__range=(date_from, date_to)
+    ).annotate(
+        period=Trunc("meal_record__date", group_by, output_field=DateField())
+    ).values("period").annotate(
+        **{field: intake_sum(field) for field in fields}
+    ).order_by("period")
+    totals = {row["period"]: row for row in rows}
+
+    results = []
+    for period in _iter_periods(date_from, date_to, group_by):
+        row = totals.get(period, {})
+        result = {
+            "period": period.isoformat(),
+            "record_count": record_counts.get(period, 0),
+            **{f"total_{field}": row.get(field) or 0.0 for field in SUMMARY_FIELDS},
+        }
+        if include_micronutrients:
+            # 栄養素データのない食品しか記録がない場合はNoneのまま返す
+            result["micronutrients"] = {field: row.get(field) for field in MICRONUTRIENT_FIELDS}
+        results.append(result)
+    return results
@@ -1,27 +1,44 @@
 from datetime import date
 from itertools import chain
-import os, uuid
 
 from rest_framework import viewsets, permissions
 from rest_framework.views import APIView, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.parsers import MultiPartParser, FormParser
 from .models import MealRecord, MealItem, MealRecordItem
-from .serializers import MealRecordSerializer, MealItemSerializer
-from django.core.files.storage import default_storage
-from django.utils.text import slugify
+from .pagination import MealItemCursorPagination, MealItemSearchPagination, MealRecordCursorPagination
+from .serializers import (
+    MealItemSerializer, MealRecordCopySerializer, MealRecordFromRecipeSerializer, MealRecordSerializer)
+from .tasks import process_meal_photo_task
+from .utils.barcode import BARCODE_BATCH_LIMIT, lookup_barcodes, normalize_barcode
+from .utils.nutrition import build_intake_report, get_nutrient_targets
+from .utils.photo import MAX_UPLOAD_SIZE, stage_meal_photo, thumbnail_keys
+from .utils.records import MAX_COPY_TARGET_DAYS, copy_meal_records
+from .utils.search import autocomplete_meal_items, search_meal_items
+from .utils.summary import (
+    RANGE_GROUP_BY_CHOICES, build_summary_response, compute_daily_intake, compute_range_nutrition,
+    refresh_daily_summary)
 from accounts.utils import generate_presigned_url
-from django.db.models import Prefetch, Q
+from django.db import transaction
+from django.db.models import Prefetch
 
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiExample
 from drf_spectacular.types import OpenApiTypes
 
+# 期間サマリーで指定できる最大日数
+MAX_SUMMARY_RANGE_DAYS = 366
+
+# 食品オートコンプリートの取得件数
+AUTOCOMPLETE_DEFAULT_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 30
+
 
 @extend_schema_view(
     list=extend_schema(
         summary="食事記録一覧取得",
-        description="ログインユーザーの食事記録一覧を取得します。日付でフィルタリングも可能です。",
+        description="ログインユーザーの食事記録一覧を日付の新しい順に取得します。日付・期間でフィルタリングも可能です。結果はカーソルでページングされます。",
         parameters=[
             OpenApiParameter(
                 name='date',
@@ -32,6 +49,30 @@ from drf_spectacular.types import OpenApiTypes
                     OpenApiExample('今日の記録', value='2024-01-15'),
                 ]
             ),
+            OpenApiParameter(
+                name='date_from',
+                type=OpenApiTypes.DATE,
+                location=OpenApiParameter.QUERY,
+                description='期間の開始日（YYYY-MM-DD形式、この日を含む）',
+            ),
+            OpenApiParameter(
+                name='date_to',
+                type=OpenApiTypes.DATE,
+                location=OpenApiParameter.QUERY,
+                description='期間の終了日（YYYY-MM-DD形式、この日を含む）',
+            ),
+            OpenApiParameter(
+                name='cursor',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='ページのカーソル（レスポンスの next / previous に含まれる値）',
+            ),
+            OpenApiParameter(
+                name='page_size',
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description=f'1ページの件数（デフォルト: {MealRecordCursorPagination.page_size}、最大: {MealRecordCursorPagination.max_page_size}）',
+            ),
         ],
         tags=["食事記録"]
     ),
@@ -73,12 +114,15 @@ class MealRecordViewSet(viewsets.ModelViewSet):
     - 食事記録の作成
     - 食事記録の更新
     - 食事記録の削除
+    - 食事記録のコピー（既存の記録を複数の日付にまとめて記録）
+    - レシピからの食事記録（1人前あたりの栄養素で記録）
     - 日次栄養サマリーの取得
 
     認証: 必須（IsAuthenticated）
     """
     serializer_class = MealRecordSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = MealRecordCursorPagination
 
     def get_queryset(self):
         """
@@ -87,13 +131,29 @@ class MealRecordViewSet(viewsets.ModelViewSet):
         クエリパラメータ:
             date (str, optional): 特定の日付の記録を取得（YYYY-MM-DD形式）
                                  例: ?date=2024-01-15
+            date_from (str, optional): 期間の開始日（YYYY-MM-DD形式）
+            date_to (str, optional): 期間の終了日（YYYY-MM-DD形式）
+                                 例: ?date_from=2024-01-01&date_to=2024-01-31
 
         Returns:
             QuerySet: ログインユーザーの食事記録（日付の降順）
         """
-        if self.request.GET.get('date'):
-            return MealRecord.objects.filter(user=self.request.user, date=self.request.GET['date']).order_by("-date")
-        return MealRecord.objects.filter(user=self.request.user).order_by("-date")
+        queryset = MealRecord.objects.filter(user=self.request.user).order_by("-date", "-id")
+
+        for param, lookup in (('date', 'date'), ('date_from', 'date__gte'), ('date_to', 'date__lte')):
+            value = self.request.query_params.get(param)
+            if not value:
+                continue
+            try:
+                queryset = queryset.filter(**{lookup: date.fromisoformat(value)})
+            except ValueError:
+                raise ValidationError({param: "日付形式が正しくありません。YYYY-MM-DD形式で入力してください。"})
+
+        if self.action in ('list', 'retrieve'):
+            # 食品まで含めて2回のクエリで取得する（件数によらず一定）
+            queryset = queryset.prefetch_related(
+                Prefetch("meal_items", queryset=MealRecordItem.objects.select_related("meal_item")))
+        return queryset
 
     def perform_create(self, serializer):
         """
@@ -104,6 +164,17 @@ class MealRecordViewSet(viewsets.ModelViewSet):
         """
         serializer.save(user=self.request.user)
 
+    def perform_destroy(self, instance):
+        """
+        食事記録を削除（日次栄養サマリーも再計算する）
+
+        Args:
+            instance: 削除するMealRecord
+        """
+        user, target_date = instance.user, instance.date
+        instance.delete()
+        refresh_daily_summary(user, target_date)
+
     @extend_schema(
         summary="指定日の栄養サマリー取得",
         description="指定した日付のすべての食事記録から栄養素を集計して返します。朝食、昼食、夕食、間食別のカロリーも含まれます。日付が指定されない場合は本日のデータを返します。",
@@ -175,75 +246,276 @@ class MealRecordViewSet(viewsets.ModelViewSet):
         else:
             target_date = date.today()
 
-        records = MealRecord.objects.filter(
-            user=request.user,
-            date=target_date
-        ).prefetch_related(
-            Prefetch('meal_items', queryset=MealRecordItem.objects.select_related('meal_item'))
-        )
-
-        if not records.exists():
-            return Response({
-                "total_calories": 0.0,
-                "total_protein": 0.0,
-                "total_fat": 0.0,
-                "total_carbs": 0.0,
-                "record_count": 0,
-                "meal_type_calories": {
-                    "朝食": 0.0,
-                    "昼食": 0.0,
-                    "夕食": 0.0,
-                    "間食": 0.0
+        # 食事記録の作成・更新・削除時に集計済みの日次サマリーを読み出す
+        return Response(build_summary_response(request.user, target_date))
+
+    @extend_schema(
+        summary="期間の栄養サマリー取得",
+        description="指定した期間の食事記録から栄養素を日・週・月単位で集計して返します。グラフ描画用に1回のリクエストで期間全体を取得できます。記録のない期間は0で埋められます。",
+        parameters=[
+            OpenApiParameter(
+                name='date_from',
+                type=OpenApiTypes.DATE,
+                location=OpenApiParameter.QUERY,
+                description='開始日（YYYY-MM-DD形式）',
+                required=True,
+            ),
+            OpenApiParameter(
+                name='date_to',
+                type=OpenApiTypes.DATE,
+                location=OpenApiParameter.QUERY,
+                description='終了日（YYYY-MM-DD形式）。開始日から最大366日まで',
+                required=True,
+            ),
+            OpenApiParameter(
+                name='group_by',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='集計単位（day, week, month）。デフォルトはday。週は月曜始まり',
+                required=False,
+                enum=list(RANGE_GROUP_BY_CHOICES),
+            ),
+            OpenApiParameter(
+                name='include_micronutrients',
+                type=OpenApiTypes.BOOL,
+                location=OpenApiParameter.QUERY,
+                description='trueの場合、ビタミン・ミネラルなどの拡張栄養素も集計する',
+                required=False,
+            ),
+        ],
+        responses={
+            200: {
+                "type": "object",
+                "properties": {
+                    "date_from": {"type": "string", "description": "開始日（YYYY-MM-DD形式）"},
+                    "date_to": {"type": "string", "description": "終了日（YYYY-MM-DD形式）"},
+                    "group_by": {"type": "string", "description": "集計単位"},
+                    "results": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "period": {"type": "string", "description": "集計期間の開始日（YYYY-MM-DD形式）"},
+                                "record_count": {"type": "integer", "description": "食事記録数"},
+                                "total_calories": {"type": "number", "description": "総カロリー (kcal)"},
+                                "total_protein": {"type": "number", "description": "総タンパク質 (g)"},
+                                "total_fat": {"type": "number", "description": "総脂質 (g)"},
+                                "total_carbs": {"type": "number", "description": "総炭水化物 (g)"},
+                                "micronutrients": {"type": "object", "description": "拡張栄養素の合計（include_micronutrients指定時のみ）"},
+                            }
+                        }
+                    }
+                },
+                "example": {
+                    "date_from": "2024-01-15",
+                    "date_to": "2024-01-16",
+                    "group_by": "day",
+                    "results": [
+                        {"period": "2024-01-15", "record_count": 3, "total_calories": 2100.5,
+                         "total_protein": 120.3, "total_fat": 85.7, "total_carbs": 250.8},
+                        {"period": "2024-01-16", "record_count": 0, "total_calories": 0.0,
+                         "total_protein": 0.0, "total_fat": 0.0, "total_carbs": 0.0},
+                    ]
+                }
+            }
+        },
+        tags=["食事記録"]
+    )
+    @action(methods=['get'], detail=False, url_path='summary/range', url_name='summary-range')
+    def summary_range(self, request):
+        """指定期間の食事記録の栄養サマリーを集計単位ごとに取得"""
+        try:
+            date_from = date.fromisoformat(request.query_params.get('date_from', ''))
+            date_to = date.fromisoformat(request.query_params.get('date_to', ''))
+        except ValueError:
+            return Response(
+                {"error": "日付形式が正しくありません。YYYY-MM-DD形式で入力してください。"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if date_from > date_to or (date_to - date_from).days >= MAX_SUMMARY_RANGE_DAYS:
+            return Response(
+                {"error": f"期間は開始日から{MAX_SUMMARY_RANGE_DAYS}日以内で指定してください。"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        group_by = request.query_params.get('group_by', 'day')
+        if group_by not in RANGE_GROUP_BY_CHOICES:
+            return Response(
+                {"error": "group_byにはday, week, monthのいずれかを指定してください。"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        include_micronutrients = request.query_params.get('include_micronutrients', '').lower() in ('true', '1')
+
+        return Response({
+            "date_from": date_from.isoformat(),
+            "date_to": date_to.isoformat(),
+            "group_by": group_by,
+            "results": compute_range_nutrition(
+                request.user, date_from, date_to, group_by, include_micronutrients),
+        })
+
+    @extend_schema(
+        summary="指定日の栄養素摂取量と推奨量の比較",
+        description="指定した日付の食事記録から全栄養素（PFC + ビタミン・ミネラルなど）の摂取量を1回のSQL集計で求め、ユーザーの推奨量に対する達成率(%)を返します。推奨量の計算にはプロフィール（性別・生年月日・身長・活動レベル）と最新の体重を使用します。",
+        parameters=[
+            OpenApiParameter(
+                name='date',
+                type=OpenApiTypes.DATE,
+                location=OpenApiParameter.QUERY,
+                description='取得したい日付（YYYY-MM-DD形式）。指定しない場合は本日',
+                required=False,
+            ),
+        ],
+        responses={
+            200: {
+                "type": "object",
+                "properties": {
+                    "date": {"type": "string", "description": "取得した日付（YYYY-MM-DD形式）"},
+                    "nutrients": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "key": {"type": "string", "description": "栄養素フィールド名"},
+                                "name": {"type": "string", "description": "栄養素名"},
+                                "unit": {"type": "string", "description": "単位"},
+                                "intake": {"type": "number", "description": "摂取量"},
+                                "has_data": {"type": "boolean", "description": "栄養素データのある食品を記録しているか"},
+                                "target": {"type": "number", "description": "推奨量"},
+                                "percent": {"type": "number", "description": "推奨量に対する達成率(%)"},
+                            }
+                        }
+                    }
                 },
-                "date": target_date.isoformat()
-            })
-
-        # 食事タイプ別のカロリーを初期化
-        meal_type_calories = {
-            "朝食": 0.0,
-            "昼食": 0.0,
-            "夕食": 0.0,
-            "間食": 0.0
-        }
-
-        # 総栄養素を初期化
-        total_calories = 0.0
-        total_protein = 0.0
-        total_fat = 0.0
-        total_carbs = 0.0
-
-        # 各食事記録を処理
-        for record in records:
-            record_calories = 0.0
-
-            # その記録の各食品のカロリーを計算
-            for meal_item in record.meal_items.all():
-                # base_quantityあたりの値なので、実際の摂取量に応じて計算
-                # 例: base_quantity=100g, calories=200kcal, quantity=150gの場合
-                # 実際のカロリー = 200 * (150/100) = 300kcal
-                ratio = meal_item.quantity / meal_item.meal_item.base_quantity
-                item_calories = meal_item.meal_item.calories * ratio
-                record_calories += item_calories
-
-                # 総栄養素に加算
-                total_calories += item_calories
-                total_protein += meal_item.meal_item.protein * ratio
-                total_fat += meal_item.meal_item.fat * ratio
-                total_carbs += meal_item.meal_item.carbs * ratio
-
-            # 食事タイプ別のカロリーに加算
-            meal_type_calories[record.time_of_day] += record_calories
+                "example": {
+                    "date": "2024-01-15",
+                    "nutrients": [
+                        {"key": "calories", "name": "energy", "unit": "kcal", "intake": 2100.5,
+                         "has_data": True, "target": 2650, "percent": 79.3},
+                        {"key": "vitamin_c", "name": "ビタミンC", "unit": "mg", "intake": 45.0,
+                         "has_data": True, "target": 100, "percent": 45.0},
+                    ]
+                }
+            },
+            400: {
+                "type": "object",
+                "properties": {
+                    "error": {"type": "string", "description": "エラーメッセージ"}
+                },
+                "example": {"error": "推奨量の計算には性別・生年月日・身長・活動レベルの登録が必要です。"}
+            }
+        },
+        tags=["食事記録"]
+    )
+    @action(methods=['get'], detail=False, url_path='summary/nutrients', url_name='summary-nutrients')
+    def nutrients(self, request):
+        """指定日の全栄養素の摂取量と推奨量に対する達成率を取得"""
+        target_date = request.query_params.get('date')
+        if target_date:
+            try:
+                target_date = date.fromisoformat(target_date)
+            except ValueError:
+                return Response(
+                    {"error": "日付形式が正しくありません。YYYY-MM-DD形式で入力してください。"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        else:
+            target_date = date.today()
+
+        user = request.user
+        if not (user.birth_date and user.height and user.activity_level):
+            return Response(
+                {"error": "推奨量の計算には性別・生年月日・身長・活動レベルの登録が必要です。"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            targets = get_nutrient_targets(user)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+        intake = compute_daily_intake(user, target_date)
         return Response({
-            "total_calories": total_calories,
-            "total_protein": total_protein,
-            "total_fat": total_fat,
-            "total_carbs": total_carbs,
-            "record_count": records.count(),
-            "meal_type_calories": meal_type_calories,
-            "date": target_date.isoformat()
+            "date": target_date.isoformat(),
+            "nutrients": build_intake_report(intake, targets),
         })
 
+    @extend_schema(
+        summary="食事記録のコピー",
+        description=f"既存の食事記録（食品を含む）を指定した日付にまとめてコピーします。コピー元は食事記録のIDか日付（その日の全記録、食事タイプで絞り込み可能）、コピー先は日付のリストか期間（最大{MAX_COPY_TARGET_DAYS}日）で指定します。写真はコピーされません。",
+        request=MealRecordCopySerializer,
+        examples=[
+            OpenApiExample(
+                '前日の朝食を今日にコピー',
+                value={"source_date": "2024-01-14", "time_of_day": "朝食", "target_dates": ["2024-01-15"]},
+                request_only=True,
+            ),
+            OpenApiExample(
+                '1日分の食事を1週間分にコピー',
+                value={"source_date": "2024-01-14", "date_from": "2024-01-15", "date_to": "2024-01-21"},
+                request_only=True,
+            ),
+            OpenApiExample(
+                '食事記録を指定してコピー',
+                value={"record_ids": [12, 13], "target_dates": ["2024-01-15", "2024-01-17"]},
+                request_only=True,
+            ),
+        ],
+        responses={
+            201: {
+                "type": "object",
+                "properties": {
+                    "count": {"type": "integer", "description": "作成した食事記録の件数"},
+                    "results": {"type": "array", "items": {"type": "object"}, "description": "作成した食事記録"},
+                }
+            },
+            400: {"description": "コピー元・コピー先の指定が正しくない場合"},
+        },
+        tags=["食事記録"]
+    )
+    @action(methods=['post'], detail=False, url_path='copy', url_name='copy')
+    def copy(self, request):
+        """既存の食事記録を指定した日付にまとめてコピー"""
+        serializer = MealRecordCopySerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+
+        record_ids = copy_meal_records(
+            request.user, serializer.validated_data["records"], serializer.validated_data["target_dates"])
+
+        created = MealRecord.objects.filter(id__in=record_ids).order_by("date", "id").prefetch_related(
+            Prefetch("meal_items", queryset=MealRecordItem.objects.select_related("meal_item")))
+        return Response({
+            "count": len(record_ids),
+            "results": self.get_serializer(created, many=True).data,
+        }, status=status.HTTP_201_CREATED)
+
+    @extend_schema(
+        summary="レシピを食事記録に追加",
+        description="レシピを指定した量（人前）だけ食事記録に追加します。材料を展開せず、材料から計算した1人前あたりの栄養素で記録されます。record_id を指定した場合は既存の食事記録に追加し、指定しない場合は date・time_of_day で新しく作成します。",
+        request=MealRecordFromRecipeSerializer,
+        examples=[
+            OpenApiExample(
+                'レシピを1.5人前記録',
+                value={"recipe_id": 3, "servings": 1.5, "date": "2024-01-15", "time_of_day": "夕食"},
+                request_only=True,
+            ),
+        ],
+        responses={
+            201: MealRecordSerializer,
+            400: {"description": "レシピ・食事記録が存在しない、または指定が正しくない場合"},
+        },
+        tags=["食事記録"]
+    )
+    @action(methods=['post'], detail=False, url_path='from-recipe', url_name='from-recipe')
+    def from_recipe(self, request):
+        """レシピを指定した量だけ食事記録に追加"""
+        serializer = MealRecordFromRecipeSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        try:
+            record = serializer.save()
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(record).data, status=status.HTTP_201_CREATED)
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -260,6 +532,33 @@ class MealRecordViewSet(viewsets.ModelViewSet):
                     OpenApiExample('ご飯で検索', value='ご飯'),
                 ]
             ),
+            OpenApiParameter(
+                name='fields',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='取得する項目（カンマ区切り）。IDは常に含まれます。',
+                examples=[
+                    OpenApiExample('PFCのみ取得', value='name,calories,protein,fat,carbs,unit,base_quantity'),
+                ]
+            ),
+            OpenApiParameter(
+                name='cursor',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='ページのカーソル（レスポンスの next / previous に含まれる値）。searchを指定しない場合のみ',
+            ),
+            OpenApiParameter(
+                name='offset',
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description='検索結果の取得開始位置（searchを指定した場合のみ。レスポンスにはcountが含まれます）',
+            ),
+            OpenApiParameter(
+                name='page_size',
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description=f'1ページの件数（デフォルト: {MealItemCursorPagination.page_size}、最大: {MealItemCursorPagination.max_page_size}）',
+            ),
         ],
         tags=["食品データ"]
     ),
@@ -342,6 +641,14 @@ class MealRecordViewSet(viewsets.ModelViewSet):
     retrieve=extend_schema(
         summary="食品データ詳細取得",
         description="指定したIDの食品データの詳細を取得します。",
+        parameters=[
+            OpenApiParameter(
+                name='fields',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='取得する項目（カンマ区切り）。IDは常に含まれます。',
+            ),
+        ],
         tags=["食品データ"]
     ),
     update=extend_schema(
@@ -383,6 +690,46 @@ class MealItemViewSet(viewsets.ModelViewSet):
     """
     serializer_class = MealItemSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = MealItemCursorPagination
+
+    def get_sparse_fields(self):
+        """
+        fieldsクエリパラメータから出力する項目を取得（一覧・詳細取得のみ）
+
+        Returns:
+            tuple | None: 出力する項目（IDを含む）。指定がない場合はNone
+
+        Raises:
+            ValidationError: 存在しない項目が指定された場合
+        """
+        if self.action not in ('list', 'retrieve'):
+            return None
+        fields_param = self.request.query_params.get('fields')
+        if not fields_param:
+            return None
+
+        fields = [field.strip() for field in fields_param.split(',') if field.strip()]
+        unknown = [field for field in fields if field not in MealItemSerializer.Meta.fields]
+        if unknown:
+            raise ValidationError({"fields": f"存在しない項目が指定されています: {', '.join(unknown)}"})
+        return tuple(dict.fromkeys(['id', *fields]))
+
+    def get_serializer(self, *args, **kwargs):
+        """ fieldsが指定された場合は、その項目のみを出力するシリアライザーを返す """
+        fields = self.get_sparse_fields()
+        if fields is not None:
+            kwargs['fields'] = fields
+        return super().get_serializer(*args, **kwargs)
+
+    @property
+    def paginator(self):
+        """ 検索時は検索順位で並べるため、オフセットでページングする """
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get('search'):
+                self._paginator = MealItemSearchPagination()
+            else:
+                self._paginator = MealItemCursorPagination()
+        return self._paginator
 
     def get_queryset(self):
         """
@@ -391,6 +738,8 @@ class MealItemViewSet(viewsets.ModelViewSet):
         クエリパラメータ:
             search (str, optional): 食品名または検索キーワードで検索
                                    例: ?search=鶏肉
+            fields (str, optional): 取得する項目（カンマ区切り）。指定した列のみSELECTする
+                                   例: ?fields=name,calories,protein,fat,carbs
 
         Returns:
             QuerySet: 食品データ一覧（検索条件でフィルタリング済み）
@@ -398,15 +747,19 @@ class MealItemViewSet(viewsets.ModelViewSet):
         検索対象:
         - 食品名（name）
         - 検索キーワード（search_keywords）
+
+        全角/半角・カタカナ/ひらがな・大文字/小文字は区別しない。
         """
         queryset = MealItem.objects.all()
         search_query = self.request.query_params.get('search', None)
         if search_query:
-            # 検索キーワードでフィルタリング
-            queryset = queryset.filter(
-                Q(name__icontains=search_query) |
-                Q(search_keywords__icontains=search_query)
-            )
+            # 検索インデックスで絞り込み、完全一致 → 前方一致 → 部分一致 → キーワード一致の順に並べる
+            queryset = search_meal_items(queryset, search_query)
+
+        fields = self.get_sparse_fields()
+        if fields is not None:
+            # 出力しない栄養素のカラムはSELECTしない
+            queryset = queryset.only(*fields)
         return queryset
 
     def perform_create(self, serializer):
@@ -418,6 +771,148 @@ class MealItemViewSet(viewsets.ModelViewSet):
         """
         serializer.save()
 
+    @extend_schema(
+        summary="食品名のオートコンプリート",
+        description="入力途中の文字列に一致する食品を、ID・食品名・単位・基準量・カロリーのみの軽量な形式で返します。よく記録する食品ほど上位に表示されます。",
+        parameters=[
+            OpenApiParameter(
+                name='q',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='入力途中の食品名',
+                required=True,
+                examples=[
+                    OpenApiExample('鶏肉で検索', value='とり'),
+                ]
+            ),
+            OpenApiParameter(
+                name='limit',
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description=f'取得件数（デフォルト: {AUTOCOMPLETE_DEFAULT_LIMIT}、最大: {AUTOCOMPLETE_MAX_LIMIT}）',
+                required=False,
+            ),
+        ],
+        responses={
+            200: {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "id": {"type": "integer", "description": "食品ID"},
+                        "name": {"type": "string", "description": "食品名"},
+                        "unit": {"type": "string", "description": "単位"},
+                        "base_quantity": {"type": "number", "description": "基準量"},
+                        "calories": {"type": "number", "description": "基準量あたりのカロリー (kcal)"},
+                    }
+                },
+                "example": [
+                    {"id": 12, "name": "鶏むね肉", "unit": "g", "base_quantity": 100.0, "calories": 108.0},
+                ]
+            }
+        },
+        tags=["食品データ"]
+    )
+    @action(methods=['get'], detail=False, url_path='autocomplete', url_name='autocomplete')
+    def autocomplete(self, request):
+        """入力途中の食品名から候補を取得"""
+        try:
+            limit = int(request.query_params.get('limit', AUTOCOMPLETE_DEFAULT_LIMIT))
+        except ValueError:
+            limit = AUTOCOMPLETE_DEFAULT_LIMIT
+        limit = max(1, min(limit, AUTOCOMPLETE_MAX_LIMIT))
+
+        query = request.query_params.get('q', '')
+        return Response(autocomplete_meal_items(request.user, query, limit))
+
+    @extend_schema(
+        summary="バーコードで食品を検索",
+        description="JAN/EANコード（8・12・13・14桁）に完全一致する食品を取得します。チェックデジットを検証し、先頭の0の有無は区別しません。",
+        parameters=[
+            OpenApiParameter(
+                name='code',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='読み取ったバーコード',
+                required=True,
+                examples=[
+                    OpenApiExample('JAN標準（13桁）', value='4901234567894'),
+                ]
+            ),
+        ],
+        responses={
+            200: MealItemSerializer,
+            400: {"description": "バーコードが正しくない場合"},
+            404: {"description": "該当する食品がない場合"},
+        },
+        tags=["食品データ"]
+    )
+    @action(methods=['get'], detail=False, url_path='barcode', url_name='barcode')
+    def barcode(self, request):
+        """バーコードから食品を1件取得"""
+        normalized = normalize_barcode(request.query_params.get('code'))
+        if normalized is None:
+            return Response({"detail": "JAN/EANコードが正しくありません。"}, status=status.HTTP_400_BAD_REQUEST)
+
+        meal_item = lookup_barcodes([normalized]).get(normalized)
+        if meal_item is None:
+            return Response({"detail": "該当する食品が見つかりません。"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(MealItemSerializer(meal_item).data)
+
+    @extend_schema(
+        summary="バーコードで食品を一括検索",
+        description=f"複数のJAN/EANコードに一致する食品を1回のリクエストで取得します（最大{BARCODE_BATCH_LIMIT}件）。結果は指定した順に返し、コードが正しくない・該当する食品がない場合は meal_item が null になります。",
+        request={
+            "application/json": {
+                "type": "object",
+                "properties": {
+                    "codes": {"type": "array", "items": {"type": "string"}, "description": "読み取ったバーコードのリスト"},
+                },
+                "required": ["codes"],
+                "example": {"codes": ["4901234567894", "49123456"]}
+            }
+        },
+        responses={
+            200: {
+                "type": "object",
+                "properties": {
+                    "results": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "code": {"type": "string", "description": "指定したコード"},
+                                "normalized_code": {"type": "string", "nullable": True, "description": "正規化したコード（不正な場合はnull）"},
+                                "meal_item": {"type": "object", "nullable": True, "description": "該当する食品"},
+                            }
+                        }
+                    }
+                }
+            },
+            400: {"description": "codesの形式が正しくない場合"},
+        },
+        tags=["食品データ"]
+    )
+    @action(methods=['post'], detail=False, url_path='barcode/batch', url_name='barcode-batch')
+    def barcode_batch(self, request):
+        """複数のバーコードから食品をまとめて取得"""
+        codes = request.data.get('codes') if isinstance(request.data, dict) else None
+        if not isinstance(codes, list) or not codes:
+            return Response({"codes": "バーコードのリストを指定してください。"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(codes) > BARCODE_BATCH_LIMIT:
+            return Response({"codes": f"一度に検索できるのは{BARCODE_BATCH_LIMIT}件までです。"}, status=status.HTTP_400_BAD_REQUEST)
+
+        normalized_codes = [normalize_barcode(code) for code in codes]
+        found = lookup_barcodes({normalized for normalized in normalized_codes if normalized})
+        serialized = {normalized: MealItemSerializer(meal_item).data for normalized, meal_item in found.items()}
+
+        return Response({
+            "results": [
+                {"code": code, "normalized_code": normalized, "meal_item": serialized.get(normalized)}
+                for code, normalized in zip(codes, normalized_codes)
+            ]
+        })
+
     def update(self, request, *args, **kwargs):
         """
         食品データの更新は禁止
@@ -442,8 +937,8 @@ class PhotoUploadView(APIView):
     食事画像アップロードAPI
 
     食事の写真をアップロードするためのAPIです。
-    アップロードされた画像はS3などのストレージに保存され、
-    ファイルパスが返されます。
+    アップロードされた画像は一時保存場所に保存され、変換後のファイルパスがすぐに返されます。
+    向きの補正・EXIFの除去・WebPへの圧縮とサムネイルの作成はバックグラウンドのタスクで行います。
 
     URL: /meal/photo-upload/
     Method: POST
@@ -455,7 +950,7 @@ class PhotoUploadView(APIView):
 
     @extend_schema(
         summary="食事画像アップロード",
-        description="食事の写真をアップロードします。アップロードされた画像はストレージに保存され、ファイルパスが返されます。",
+        description=f"食事の写真（JPEG・PNG・HEICなど、{MAX_UPLOAD_SIZE // (1024 * 1024)}MBまで）をアップロードします。画像はバックグラウンドでWebPに変換され、変換後の本体とサムネイルのファイルパスがすぐに返されます。変換が終わるまで、食事記録の photo_status は processing になります。",
         request={
             'multipart/form-data': {
                 'type': 'object',
@@ -473,10 +968,21 @@ class PhotoUploadView(APIView):
             201: {
                 "type": "object",
                 "properties": {
-                    "photo_url": {"type": "string", "description": "アップロードされた画像のファイルパス"}
+                    "photo_url": {"type": "string", "description": "変換後の画像のファイルパス（食事記録の photo_key に指定）"},
+                    "thumbnails": {
+                        "type": "object",
+                        "description": "サイズ名ごとのサムネイルのファイルパス",
+                        "additionalProperties": {"type": "string"},
+                    },
+                    "status": {"type": "string", "enum": ["processing", "ready", "failed"], "description": "変換状況"},
                 },
                 "example": {
-                    "photo_url": "meals/123-abc12345-chicken-dinner.jpg"
+                    "photo_url": "meals/123/0f8e4c3a9b2d4e6f8a1b2c3d4e5f6a7b/original.webp",
+                    "thumbnails": {
+                        "small": "meals/123/0f8e4c3a9b2d4e6f8a1b2c3d4e5f6a7b/small.webp",
+                        "medium": "meals/123/0f8e4c3a9b2d4e6f8a1b2c3d4e5f6a7b/medium.webp",
+                    },
+                    "status": "processing"
                 }
             },
             400: {
@@ -503,7 +1009,9 @@ class PhotoUploadView(APIView):
 
             成功時のレスポンス例:
             {
-                "photo_url": "meals/123-abc12345-chicken-dinner.jpg"
+                "photo_url": "meals/123/0f8e.../original.webp",
+                "thumbnails": {"small": "meals/123/0f8e.../small.webp", "medium": "meals/123/0f8e.../medium.webp"},
+                "status": "processing"
             }
 
             エラー時のレスポンス例:
@@ -512,21 +1020,23 @@ class PhotoUploadView(APIView):
             }
 
         Notes:
-            - ファイル名は自動的にサニタイズされ、ユニークな名前が生成されます
-            - 形式: "{user_id}-{uuid}-{sanitized_name}.{ext}"
-            - 保存先: meals/ ディレクトリ
+            - 保存先: meals/{user_id}/{uuid}/ ディレクトリ
+            - 本体は長辺2048px以下、サムネイルは正方形（small: 200px, medium: 600px）
         """
         photo = request.FILES.get('photo')
         if not photo:
             return Response({'error': '画像ファイルがありません。'}, status=400)
 
-        # 拡張子を取得
-        ext = os.path.splitext(photo.name)[-1].lower()
-        sanitized_name = slugify(os.path.splitext(photo.name)[0])
-
-        # ユーザーID + UUID をファイル名に設定（同じユーザーのファイルでも重複しない）
-        unique_filename = f"{request.user.id}-{uuid.uuid4().hex[:8]}-{sanitized_name}{ext}"
+        try:
+            meal_photo = stage_meal_photo(photo, request.user.id)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
 
-        file_path = default_storage.save(f"meals/{unique_filename}", photo)
+        # 変換はトランザクションのコミット後にバックグラウンドで行う（ワーカーが未コミットの行を参照しないように）
+        transaction.on_commit(lambda: process_meal_photo_task.enqueue(meal_photo.id))
 
-        return Response({"photo_url": file_path}, status=201)
+        return Response({
+            "photo_url": meal_photo.photo_key,
+            "thumbnails": thumbnail_keys(meal_photo.photo_key),
+            "status": meal_photo.status,
+        }, status=201)
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from .models import Recipe, RecipeIngredient, RecipeStep, RecipeTip, RecipeTag
+from .utils import recompute_recipe_nutrition
 
 
 # Register your models here.
@@ -25,10 +26,35 @@ class RecipeAdmin(admin.ModelAdmin):
         RecipeTipInline, ]
     search_fields = ('title',)
     filter_horizontal = ('tags',)
+    readonly_fields = ('meal_item',)
+
+    def save_related(self, request, form, formsets, change):
+        """材料の保存後に栄養素を再計算する"""
+        super().save_related(request, form, formsets, change)
+        recompute_recipe_nutrition(form.instance, owner=request.user)
+
+
+class RecipeIngredientAdmin(admin.ModelAdmin):
+    """材料を個別に変更した場合もレシピの栄養素を再計算する"""
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        recompute_recipe_nutrition(obj.recipe, owner=request.user)
+
+    def delete_model(self, request, obj):
+        recipe = obj.recipe
+        super().delete_model(request, obj)
+        recompute_recipe_nutrition(recipe, owner=request.user)
+
+    def delete_queryset(self, request, queryset):
+        recipes = list(Recipe.objects.filter(ingredients__in=queryset).distinct())
+        super().delete_queryset(request, queryset)
+        for recipe in recipes:
+            recompute_recipe_nutrition(recipe, owner=request.user)
 
 
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(RecipeTag)
-admin.site.register(RecipeIngredient)
+admin.site.register(RecipeIngredient, RecipeIngredientAdmin)
 admin.site.register(RecipeStep)
 admin.site.register(RecipeTip)
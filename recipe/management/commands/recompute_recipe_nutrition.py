@@ -0,0 +1,42 @@
+""" レシピの栄養素を再計算するコマンド
+
+材料（RecipeIngredient）からレシピ全体と1人前あたりの栄養素を再計算します。
+食品マスタの取り込みで材料の栄養素が変わった場合や、既存レシピのバックフィルに使用します。
+
+使用例:
+    python manage.py recompute_recipe_nutrition
+    python manage.py recompute_recipe_nutrition --recipe 12
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import CustomUser
+from recipe.models import Recipe
+from recipe.utils import recompute_recipe_nutrition
+
+
+class Command(BaseCommand):
+    help = '材料からレシピの栄養素（全体・1人前）を再計算'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipe', type=int, help='対象レシピID（指定しない場合は全レシピ）')
+        parser.add_argument('--owner', type=int, default=1, help='作成者のいないレシピの1人前の食品データの作成者とするユーザーID（デフォルト: 1）')
+
+    def handle(self, *args, **options):
+        owner = CustomUser.objects.filter(pk=options['owner']).first()
+
+        recipes = Recipe.objects.select_related('meal_item', 'created_by')
+        if options['recipe']:
+            recipes = recipes.filter(pk=options['recipe'])
+            if not recipes.exists():
+                raise CommandError(f"レシピ（ID: {options['recipe']}）が存在しません。")
+
+        count = 0
+        for recipe in recipes.iterator():
+            try:
+                recompute_recipe_nutrition(recipe, owner=owner)
+            except ValueError as e:
+                self.stdout.write(self.style.WARNING(f"Skipped recipe {recipe.pk}: {e}"))
+                continue
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Recomputed nutrition for {count} recipes."))
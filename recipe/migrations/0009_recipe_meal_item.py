@@ -0,0 +1,20 @@
+# Generated by Django 5.1.6 on 2026-10-18 15:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meal', '0015_mealrecord_user_date_index'),
+        ('recipe', '0008_recipe_biotin_recipe_calcium_recipe_cholesterol_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='meal_item',
+            field=models.OneToOneField(blank=True, help_text='食事記録用の1人前あたりの栄養素（材料から自動計算）', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='recipe', to='meal.mealitem', verbose_name='1人前の食品データ'),
+        ),
+    ]
@@ -32,6 +32,10 @@ class Recipe(models.Model):
         upload_to='public/recipes', null=True, blank=True)
 
     size = models.IntegerField(verbose_name="何人前かを記録", default=1)
+    meal_item = models.OneToOneField(
+        MealItem, null=True, blank=True, verbose_name="1人前の食品データ",
+        on_delete=models.SET_NULL, related_name="recipe",
+        help_text="食事記録用の1人前あたりの栄養素（材料から自動計算）")
     # 栄養素に関するフィールド
     total_calories = models.FloatField(verbose_name="カロリー", default=0)
     total_protein = models.FloatField(verbose_name="たんぱく質", default=0)
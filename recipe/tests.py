@@ -1,3 +1,99 @@
-from django.test import TestCase
+import pytest
+from django.contrib.auth import get_user_model
 
-# Create your tests here.
+from meal.models import MealItem, MealRecord, MealRecordItem
+from recipe.models import Recipe, RecipeIngredient
+from recipe.utils import SERVING_UNIT, recompute_recipe_nutrition
+
+User = get_user_model()
+
+
+@pytest.fixture
+def user():
+    """ テスト用のユーザー """
+    return User.objects.create_user(
+        username="test_user", email="test@example.com", name="テストユーザー", password="password123")
+
+
+@pytest.fixture
+def recipe(user):
+    """ 2人前のレシピ（鶏むね肉200g + ごはん300g） """
+    chicken = MealItem.objects.create(
+        name="鶏むね肉", calories=200, protein=20, fat=10, carbs=5,
+        unit="g", base_quantity=100, vitamin_b6=0.5, created_by=user)
+    rice = MealItem.objects.create(
+        name="ごはん", calories=150, protein=2.5, fat=0.3, carbs=37,
+        unit="g", base_quantity=100, created_by=user)
+    recipe = Recipe.objects.create(title="親子丼", description="", prep_time=20, size=2, created_by=user)
+    RecipeIngredient.objects.create(recipe=recipe, meal_item=chicken, quantity=200)
+    RecipeIngredient.objects.create(recipe=recipe, meal_item=rice, quantity=300)
+    return recipe
+
+
+# ✅ 正常系テスト
+@pytest.mark.django_db
+def test_recompute_recipe_nutrition(recipe):
+    """ ✅ 材料からレシピ全体と1人前の栄養素を計算する """
+    recompute_recipe_nutrition(recipe)
+
+    recipe.refresh_from_db()
+    assert recipe.total_calories == pytest.approx(850)
+    assert recipe.total_protein == pytest.approx(47.5)
+    assert recipe.vitamin_b6 == pytest.approx(1.0)
+    assert recipe.calcium is None
+
+    meal_item = recipe.meal_item
+    assert meal_item.unit == SERVING_UNIT
+    assert meal_item.base_quantity == 1
+    assert meal_item.calories == pytest.approx(425)
+    assert meal_item.vitamin_b6 == pytest.approx(0.5)
+    assert meal_item.is_official is False
+
+
+@pytest.mark.django_db
+def test_recompute_updates_existing_meal_item(recipe):
+    """ ✅ 材料を変更して再計算すると、同じ1人前の食品データが更新される """
+    recompute_recipe_nutrition(recipe)
+    meal_item_id = recipe.meal_item_id
+
+    recipe.ingredients.filter(meal_item__name="ごはん").delete()
+    recompute_recipe_nutrition(recipe)
+
+    recipe.refresh_from_db()
+    assert recipe.meal_item_id == meal_item_id
+    assert recipe.total_calories == pytest.approx(400)
+    assert recipe.meal_item.calories == pytest.approx(200)
+
+
+@pytest.mark.django_db
+def test_recompute_keeps_recorded_meal_item(recipe, user):
+    """ ✅ 食事記録で使われた1人前の食品データは変更せず、新しい食品データを作成する """
+    recompute_recipe_nutrition(recipe)
+    recorded = recipe.meal_item
+    record = MealRecord.objects.create(user=user, date="2025-01-15", time_of_day="昼食")
+    MealRecordItem.objects.create(meal_record=record, meal_item=recorded, quantity=1, unit=SERVING_UNIT)
+
+    # 栄養素が変わらない場合は同じ食品データを使う
+    recompute_recipe_nutrition(recipe)
+    assert recipe.meal_item_id == recorded.id
+
+    recipe.ingredients.filter(meal_item__name="ごはん").delete()
+    recompute_recipe_nutrition(recipe)
+
+    recipe.refresh_from_db()
+    assert recipe.meal_item_id != recorded.id
+    assert recipe.meal_item.calories == pytest.approx(200)
+    recorded.refresh_from_db()
+    assert recorded.calories == pytest.approx(425)
+
+
+# ❌ 異常系テスト
+@pytest.mark.django_db
+def test_recompute_without_owner(recipe):
+    """ ❌ 作成者のいないレシピは作成者を指定しないと1人前の食品データを作成できない """
+    recipe.created_by = None
+    recipe.save()
+
+    with pytest.raises(ValueError):
+        recompute_recipe_nutrition(recipe)
+    assert not MealItem.objects.filter(unit=SERVING_UNIT).exists()
@@ -0,0 +1,87 @@
+""" レシピの栄養素の計算
+
+材料（RecipeIngredient）の使用量から、レシピ全体の栄養素の合計を1回のSQL集計で求めて Recipe に保存し、
+食事記録用に1人前あたりの栄養素を持つ MealItem（単位: 人前、基準量: 1）を作成・更新する。
+既に食事記録で使われている MealItem の栄養素が変わる場合は、過去の食事記録（と日次栄養サマリー）が
+変わらないよう、新しい MealItem を作成してレシピに紐付け直す。
+"""
+
+from django.db import transaction
+
+from meal.models import MealItem, MealRecordItem
+from meal.utils.search import update_search_index
+from meal.utils.summary import MICRONUTRIENT_FIELDS, SUMMARY_FIELDS, intake_sum
+from recipe.models import Recipe, RecipeIngredient
+
+# 1人前の食品データの単位
+SERVING_UNIT = "人前"
+
+
+def compute_recipe_totals(recipe) -> dict:
+    """ 材料からレシピ全体の栄養素（PFC + 拡張栄養素）の合計を1回のSQL集計で求める
+
+    Returns:
+        dict: {field: 合計}。材料がない場合のPFCは0、栄養素データのある材料がない拡張栄養素はNone
+    """
+    totals = RecipeIngredient.objects.filter(recipe=recipe).aggregate(
+        **{field: intake_sum(field) for field in SUMMARY_FIELDS + MICRONUTRIENT_FIELDS}
+    )
+    for field in SUMMARY_FIELDS:
+        totals[field] = totals[field] or 0.0
+    return totals
+
+
+def _is_recorded_with_other_values(meal_item, per_serving) -> bool:
+    """ 食品データが食事記録で使われていて、かつ1人前の栄養素が変わるか """
+    changed = any(getattr(meal_item, field) != value for field, value in per_serving.items())
+    return changed and MealRecordItem.objects.filter(meal_item=meal_item).exists()
+
+
+@transaction.atomic
+def recompute_recipe_nutrition(recipe, owner=None) -> Recipe:
+    """ レシピの栄養素を材料から再計算し、1人前の食品データも更新する
+
+    材料の追加・変更・削除の後に呼び出す。
+    1人前の食品データが食事記録で使われていて栄養素が変わる場合は、新しい食品データを作成する。
+
+    Args:
+        owner: 1人前の食品データを新しく作成する場合の作成者（レシピの作成者がいない場合に使用）
+
+    Raises:
+        ValueError: 1人前の食品データの作成者が決まらない場合
+    """
+    totals = compute_recipe_totals(recipe)
+    for field in SUMMARY_FIELDS:
+        setattr(recipe, f"total_{field}", totals[field])
+    for field in MICRONUTRIENT_FIELDS:
+        setattr(recipe, field, totals[field])
+
+    servings = recipe.size if recipe.size and recipe.size > 0 else 1
+    per_serving = {
+        field: (value / servings if value is not None else None)
+        for field, value in totals.items()
+    }
+
+    meal_item = recipe.meal_item
+    if meal_item is not None and _is_recorded_with_other_values(meal_item, per_serving):
+        meal_item = None
+    if meal_item is None:
+        created_by = recipe.created_by or owner
+        if created_by is None:
+            raise ValueError("1人前の食品データの作成者が指定されていません。")
+        meal_item = MealItem(created_by=created_by)
+
+    meal_item.is_official = False
+    meal_item.name = recipe.title[:100]
+    meal_item.unit = SERVING_UNIT
+    meal_item.base_quantity = 1
+    for field, value in per_serving.items():
+        setattr(meal_item, field, value)
+    meal_item.save()
+    update_search_index(meal_item)
+
+    recipe.meal_item = meal_item
+    recipe.save(update_fields=[
+        "meal_item", *(f"total_{field}" for field in SUMMARY_FIELDS), *MICRONUTRIENT_FIELDS,
+    ])
+    return recipe
@@ -1,7 +1,9 @@
+from django.db import transaction
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiExample
 from drf_spectacular.types import OpenApiTypes
+from meal.utils.nutrition import invalidate_nutrient_targets
 from .models import WeightRecord
 from .serializers import WeightRecordSerializer
 
@@ -91,12 +93,18 @@ class WeightRecordListCreateView(generics.ListCreateAPIView):
             existing_record.weight = serializer.validated_data.get('weight', existing_record.weight)
             existing_record.fat = serializer.validated_data.get('fat', existing_record.fat)
             existing_record.save()
-
-            # 更新したデータを返す
-            return Response(WeightRecordSerializer(existing_record).data, status=status.HTTP_200_OK)
+            response = Response(WeightRecordSerializer(existing_record).data, status=status.HTTP_200_OK)
         else:
             # 新規作成
             serializer.save(user=user)
+            response = None
+
+        # 最新の体重が変わるため、栄養素の推奨量キャッシュを削除する
+        # （保存前に削除すると、同時に推奨量を取得したリクエストが古い体重で再びキャッシュしてしまうため、確定後に削除する）
+        transaction.on_commit(lambda: invalidate_nutrient_targets(user.pk))
+
+        # 更新したデータを返す
+        return response
 
 
 @extend_schema(
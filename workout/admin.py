@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import WorkoutSession, WorkoutExercise, WorkoutExerciseSet
+from .models import PersonalRecord, WorkoutSession, WorkoutExercise, WorkoutExerciseSet
 
 
 class WorkoutExerciseSetInline(admin.TabularInline):
@@ -56,3 +56,15 @@ class WorkoutExerciseSetAdmin(admin.ModelAdmin):
     list_display = ['workout_exercise_id', 'order', 'weight', 'reps', 'distance', 'duration', 'fat_burn']
     list_filter = ['workout_exercise_id__workout_session_id__date', 'workout_exercise_id__workout_session_id']
     ordering = ['workout_exercise_id', 'order']
+
+
+@admin.register(PersonalRecord)
+class PersonalRecordAdmin(admin.ModelAdmin):
+    """自己ベスト管理（rebuild_personal_records コマンドで再計算）"""
+    list_display = ['user', 'exercise', 'max_weight', 'max_weight_reps', 'max_estimated_1rm', 'max_session_volume', 'updated_at']
+    search_fields = ['user__username', 'exercise__name']
+    readonly_fields = ['updated_at']
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return queryset.select_related('user', 'exercise')
@@ -0,0 +1,164 @@
+""" エクササイズごとの成長分析
+
+ユーザーのエクササイズのセット（重量・回数）を1回のクエリでまとめて取得し、以下を計算する。
+
+- 日ごとの総挙上量（重量(kg) × 回数の合計）・セット数・回数
+- 日ごと・全期間のベストセット（推定1RMが最大のセット）
+- 推定1RM（Epley式・Brzycki式）
+- 回数帯ごとの自己ベスト（最大重量）
+
+結果はユーザー・エクササイズ・期間ごとにキャッシュする。
+トレーニングセッションの作成・更新・削除時に invalidate_exercise_progress() でユーザーのキャッシュを無効にする。
+"""
+
+import uuid
+
+from django.core.cache import cache
+
+from .models import WorkoutExerciseSet
+
+# 分析結果キャッシュの有効期限（秒）。セッションの変更時は明示的に無効にする
+EXERCISE_PROGRESS_CACHE_TIMEOUT = 60 * 60 * 24
+
+# 自己ベストを集計する回数帯（名前, 最小回数, 最大回数（Noneは上限なし））
+REP_RANGES = (
+    ("1", 1, 1),
+    ("2-3", 2, 3),
+    ("4-6", 4, 6),
+    ("7-10", 7, 10),
+    ("11-15", 11, 15),
+    ("16+", 16, None),
+)
+
+# Brzycki式で計算できる回数の上限（37回以上は分母が0以下になる）
+BRZYCKI_MAX_REPS = 36
+
+
+def epley(weight, reps):
+    """ Epley式の推定1RM: 重量 × (1 + 回数 / 30)（1回の場合は重量そのもの） """
+    if reps == 1:
+        return weight
+    return weight * (1 + reps / 30)
+
+
+def brzycki(weight, reps):
+    """ Brzycki式の推定1RM: 重量 × 36 / (37 - 回数)（37回以上の場合はNone） """
+    if reps > BRZYCKI_MAX_REPS:
+        return None
+    return weight * 36 / (37 - reps)
+
+
+def rep_range_of(reps):
+    """ 回数が含まれる回数帯の名前を返す """
+    for name, low, high in REP_RANGES:
+        if reps >= low and (high is None or reps <= high):
+            return name
+    return None
+
+
+def _round(value):
+    return round(value, 1) if value is not None else None
+
+
+def _set_summary(weight, reps):
+    """ セットの重量・回数と推定1RM """
+    return {
+        "weight": weight,
+        "reps": reps,
+        "estimated_1rm": {
+            "epley": _round(epley(weight, reps)),
+            "brzycki": _round(brzycki(weight, reps)),
+        },
+    }
+
+
+def _version_key(user_id) -> str:
+    return f"workout:progress_version:{user_id}"
+
+
+def _cache_key(user_id, exercise_id, date_from, date_to) -> str:
+    # ユーザーごとのバージョンをキーに含め、バージョンの変更で全エクササイズのキャッシュを無効にする
+    version = cache.get_or_set(_version_key(user_id), lambda: uuid.uuid4().hex, None)
+    return f"workout:progress:{user_id}:{version}:{exercise_id}:{date_from or ''}:{date_to or ''}"
+
+
+def invalidate_exercise_progress(user_id):
+    """ ユーザーの分析結果キャッシュを無効にする（トレーニングセッションの作成・更新・削除時に呼び出す） """
+    cache.delete(_version_key(user_id))
+
+
+def compute_exercise_progress(user, exercise_id, date_from=None, date_to=None) -> dict:
+    """
+    エクササイズの成長分析を計算する（キャッシュは使わない）
+
+    重量と回数のあるセットのみを対象とし、日付・重量・回数の列のみを1回のクエリで取得する。
+
+    Returns:
+        dict: {"daily": [...], "best_set": {...} | None, "personal_records": [...]}
+    """
+    sets = WorkoutExerciseSet.objects.filter(
+        workout_exercise_id__workout_session_id__user_id=user,
+        workout_exercise_id__exercise_id=exercise_id,
+        weight__isnull=False,
+        reps__gt=0,
+    )
+    if date_from:
+        sets = sets.filter(workout_exercise_id__workout_session_id__date__gte=date_from)
+    if date_to:
+        sets = sets.filter(workout_exercise_id__workout_session_id__date__lte=date_to)
+    rows = sets.order_by('workout_exercise_id__workout_session_id__date').values_list(
+        'workout_exercise_id__workout_session_id__date', 'weight', 'reps')
+
+    daily = {}
+    best = None
+    records = {}
+    for day, weight, reps in rows.iterator():
+        estimated = epley(weight, reps)
+
+        summary = daily.get(day)
+        if summary is None:
+            summary = daily[day] = {"date": day, "volume": 0.0, "sets": 0, "reps": 0, "_best": None}
+        summary["volume"] += weight * reps
+        summary["sets"] += 1
+        summary["reps"] += reps
+        # 推定1RMが同じ場合は重量の重いセットを優先する
+        if summary["_best"] is None or (estimated, weight) > summary["_best"][:2]:
+            summary["_best"] = (estimated, weight, reps)
+        if best is None or (estimated, weight) > best[:2]:
+            best = (estimated, weight, reps, day)
+
+        rep_range = rep_range_of(reps)
+        record = records.get(rep_range)
+        # 同じ重量の場合は回数の多いセット、さらに同じ場合は古い日付を自己ベストとする
+        if record is None or (weight, reps) > (record["weight"], record["reps"]):
+            records[rep_range] = {"rep_range": rep_range, "weight": weight, "reps": reps, "date": day}
+
+    daily_list = []
+    for summary in daily.values():
+        _, weight, reps = summary.pop("_best")
+        summary["volume"] = _round(summary["volume"])
+        summary["best_set"] = _set_summary(weight, reps)
+        daily_list.append(summary)
+
+    best_set = None
+    if best is not None:
+        _, weight, reps, day = best
+        best_set = {**_set_summary(weight, reps), "date": day}
+
+    return {
+        "daily": daily_list,
+        "best_set": best_set,
+        "personal_records": [records[name] for name, _, _ in REP_RANGES if name in records],
+    }
+
+
+def get_exercise_progress(user, exercise_id, date_from=None, date_to=None) -> dict:
+    """ エクササイズの成長分析をキャッシュから取得する（なければ計算してキャッシュする） """
+    key = _cache_key(user.pk, exercise_id, date_from, date_to)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    progress = compute_exercise_progress(user, exercise_id, date_from, date_to)
+    cache.set(key, progress, EXERCISE_PROGRESS_CACHE_TIMEOUT)
+    return progress
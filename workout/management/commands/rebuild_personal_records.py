@@ -0,0 +1,25 @@
+""" 自己ベストを再構築するコマンド
+
+トレーニングセッションのセットから自己ベスト（PersonalRecord）を再計算します。
+既存データのバックフィルや、セットの値を下げる変更を反映する場合に使用します。
+
+使用例:
+    python manage.py rebuild_personal_records
+    python manage.py rebuild_personal_records --user 3
+"""
+
+from django.core.management.base import BaseCommand
+
+from workout.personal_records import rebuild_personal_records
+
+
+class Command(BaseCommand):
+    help = 'トレーニングセッションのセットから自己ベストを再構築'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='対象ユーザーID（指定しない場合は全ユーザー）')
+        parser.add_argument('--exercise', type=int, action='append', help='対象エクササイズID（複数指定可、指定しない場合は全エクササイズ）')
+
+    def handle(self, *args, **options):
+        count = rebuild_personal_records(options['user'], options['exercise'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} personal records."))
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-18 15:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workout', '0002_remove_workoutexercise_name_workoutexercise_exercise'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='workoutsession',
+            index=models.Index(fields=['user_id', '-date', '-created_at'], name='workout_session_user_date_idx'),
+        ),
+    ]
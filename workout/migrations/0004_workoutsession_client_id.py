@@ -0,0 +1,24 @@
+# Generated by Django 5.1.6 on 2026-10-18 15:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workout', '0003_workoutsession_user_date_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workoutsession',
+            name='client_id',
+            field=models.CharField(blank=True, help_text='クライアントが生成したID（UUIDなど）。同じIDで再送された場合は新しく作成しない', max_length=64, null=True, verbose_name='クライアントID'),
+        ),
+        migrations.AddConstraint(
+            model_name='workoutsession',
+            constraint=models.UniqueConstraint(condition=models.Q(('client_id__isnull', False)), fields=('user_id', 'client_id'), name='unique_workout_session_client_id'),
+        ),
+    ]
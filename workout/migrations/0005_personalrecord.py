@@ -0,0 +1,38 @@
+# Generated by Django 5.1.6 on 2026-10-18 15:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exercise', '0001_initial'),
+        ('workout', '0004_workoutsession_client_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonalRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('max_weight', models.FloatField(verbose_name='最大重量(kg)')),
+                ('max_weight_reps', models.IntegerField(verbose_name='最大重量での回数')),
+                ('max_weight_date', models.DateField(verbose_name='最大重量の記録日')),
+                ('max_estimated_1rm', models.FloatField(verbose_name='最大推定1RM(kg)')),
+                ('max_estimated_1rm_date', models.DateField(verbose_name='最大推定1RMの記録日')),
+                ('max_session_volume', models.FloatField(verbose_name='最大総挙上量')),
+                ('max_session_volume_date', models.DateField(verbose_name='最大総挙上量の記録日')),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='更新日時')),
+                ('exercise', models.ForeignKey(help_text='エクササイズ', on_delete=django.db.models.deletion.CASCADE, related_name='personal_records', to='exercise.exercise')),
+                ('user', models.ForeignKey(help_text='ユーザー', on_delete=django.db.models.deletion.CASCADE, related_name='personal_records', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': '自己ベスト',
+                'verbose_name_plural': '自己ベスト',
+                'constraints': [models.UniqueConstraint(fields=('user', 'exercise'), name='unique_personal_record_per_exercise')],
+            },
+        ),
+    ]
@@ -14,6 +14,7 @@ class WorkoutSession(models.Model):
         name (CharField): セッション名
         date (DateField): 日付
         memo (TextField): メモ
+        client_id (CharField): クライアントが生成したID（オフライン同期の再送で重複作成しないためのキー）
         created_at (DateTimeField): 作成日時
         updated_at (DateTimeField): 更新日時
     """
@@ -38,6 +39,13 @@ class WorkoutSession(models.Model):
         blank=True,
         help_text='トレーニングのメモ'
     )
+    client_id = models.CharField(
+        verbose_name='クライアントID',
+        max_length=64,
+        null=True,
+        blank=True,
+        help_text='クライアントが生成したID（UUIDなど）。同じIDで再送された場合は新しく作成しない'
+    )
     created_at = models.DateTimeField(
         auto_now_add=True,
         help_text='作成日時'
@@ -47,6 +55,20 @@ class WorkoutSession(models.Model):
         help_text='更新日時'
     )
 
+    class Meta:
+        indexes = [
+            # ユーザーごとの期間指定・日付順の一覧取得用
+            models.Index(fields=['user_id', '-date', '-created_at'], name='workout_session_user_date_idx'),
+        ]
+        constraints = [
+            # 同じクライアントIDのセッションはユーザーごとに1件のみ
+            models.UniqueConstraint(
+                fields=['user_id', 'client_id'],
+                condition=models.Q(client_id__isnull=False),
+                name='unique_workout_session_client_id'
+            )
+        ]
+
 
 class WorkoutExercise(models.Model):
     """
@@ -186,3 +208,58 @@ class WorkoutExerciseSet(models.Model):
         auto_now=True,
         help_text='更新日時'
     )
+
+
+class PersonalRecord(models.Model):
+    """
+    自己ベストモデル
+
+    ユーザー・エクササイズごとの自己ベストを保持します。
+    トレーニングセッションの保存時に、保存したセットとの比較のみで更新します（過去の全セットは参照しない）。
+    セッションの削除時や既存データの反映には rebuild_personal_records で再計算します。
+
+    Attributes:
+        user (ForeignKey): ユーザー
+        exercise (ForeignKey): エクササイズ
+        max_weight (FloatField): 最大重量(kg)
+        max_weight_reps (IntegerField): 最大重量での最大回数
+        max_weight_date (DateField): 最大重量の記録日
+        max_estimated_1rm (FloatField): 最大推定1RM(kg)（Epley式）
+        max_estimated_1rm_date (DateField): 最大推定1RMの記録日
+        max_session_volume (FloatField): 1セッションの最大総挙上量（重量(kg) × 回数の合計）
+        max_session_volume_date (DateField): 最大総挙上量の記録日
+        updated_at (DateTimeField): 更新日時
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        related_name='personal_records',
+        on_delete=models.CASCADE,
+        help_text='ユーザー'
+    )
+    exercise = models.ForeignKey(
+        'exercise.Exercise',
+        related_name='personal_records',
+        on_delete=models.CASCADE,
+        help_text='エクササイズ'
+    )
+    max_weight = models.FloatField(verbose_name='最大重量(kg)')
+    max_weight_reps = models.IntegerField(verbose_name='最大重量での回数')
+    max_weight_date = models.DateField(verbose_name='最大重量の記録日')
+    max_estimated_1rm = models.FloatField(verbose_name='最大推定1RM(kg)')
+    max_estimated_1rm_date = models.DateField(verbose_name='最大推定1RMの記録日')
+    max_session_volume = models.FloatField(verbose_name='最大総挙上量')
+    max_session_volume_date = models.DateField(verbose_name='最大総挙上量の記録日')
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        help_text='更新日時'
+    )
+
+    class Meta:
+        verbose_name = '自己ベスト'
+        verbose_name_plural = '自己ベスト'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'exercise'], name='unique_personal_record_per_exercise')
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.exercise.name}: {self.max_weight}kg × {self.max_weight_reps}"
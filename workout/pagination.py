@@ -0,0 +1,9 @@
+from rest_framework.pagination import CursorPagination
+
+
+class WorkoutSessionCursorPagination(CursorPagination):
+    """ トレーニングセッション一覧のカーソルページネーション（日付の新しい順） """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-date', '-created_at')
@@ -0,0 +1,258 @@
+""" 自己ベストの更新
+
+トレーニングセッションの保存時は、保存したセットから求めたエクササイズごとのセッション内ベストと
+保存済みの自己ベスト（PersonalRecord）のみを比較して更新する（過去の全セットは参照しない）。
+そのため、セッションの削除やセットの値を下げる変更は増分では反映できない。
+削除時と、更新で値が下がったエクササイズは対象のエクササイズのみ、
+既存データの反映には rebuild_personal_records コマンドで全件を再計算する。
+"""
+
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .analytics import epley
+from .models import PersonalRecord, WorkoutExerciseSet
+
+# 自己ベストの種類
+RECORD_TYPES = ('max_weight', 'max_estimated_1rm', 'max_session_volume')
+
+# 自己ベストの値の項目（更新時に保存する項目）
+RECORD_FIELDS = (
+    'max_weight', 'max_weight_reps', 'max_weight_date',
+    'max_estimated_1rm', 'max_estimated_1rm_date',
+    'max_session_volume', 'max_session_volume_date',
+)
+
+
+class _Best:
+    """ エクササイズごとのベストの集計 """
+
+    def __init__(self):
+        self.weight = None
+        self.volume = 0.0
+        self.estimated_1rm = None
+
+    def add(self, weight, reps):
+        """ セットを加える（重量と回数のあるセットのみ） """
+        # 同じ重量の場合は回数の多いセットを優先する
+        if self.weight is None or (weight, reps) > self.weight:
+            self.weight = (weight, reps)
+        self.volume += weight * reps
+        estimated = epley(weight, reps)
+        if self.estimated_1rm is None or estimated > self.estimated_1rm:
+            self.estimated_1rm = estimated
+
+
+def session_bests(exercises_data) -> dict:
+    """
+    保存する種目データからエクササイズごとのセッション内ベストを求める
+
+    Args:
+        exercises_data: WorkoutSessionSerializer でバリデーション済みの種目データのリスト
+
+    Returns:
+        dict: {エクササイズID: _Best}（重量と回数のあるセットがないエクササイズは含まない）
+    """
+    bests = {}
+    for exercise_data in exercises_data:
+        for set_data in exercise_data['workout_exercise_sets']:
+            weight, reps = set_data.get('weight'), set_data.get('reps')
+            if weight is None or not reps or reps <= 0:
+                continue
+            bests.setdefault(exercise_data['exercise_id'], _Best()).add(weight, reps)
+    return bests
+
+
+def stored_session_bests(session_ids) -> dict:
+    """
+    保存済みのセットからセッションごと・エクササイズごとのセッション内ベストを1回のクエリで求める
+
+    Returns:
+        dict: {セッションID: {エクササイズID: _Best}}
+    """
+    rows = WorkoutExerciseSet.objects.filter(
+        workout_exercise_id__workout_session_id__in=session_ids,
+        workout_exercise_id__exercise__isnull=False,
+        weight__isnull=False,
+        reps__gt=0,
+    ).values_list('workout_exercise_id__workout_session_id', 'workout_exercise_id__exercise_id', 'weight', 'reps')
+
+    bests = {}
+    for session_id, exercise_id, weight, reps in rows:
+        bests.setdefault(session_id, {}).setdefault(exercise_id, _Best()).add(weight, reps)
+    return bests
+
+
+def lowered_exercises(old_bests, new_bests) -> set:
+    """ 更新前よりセッション内ベストのいずれかが下がった（またはなくなった）エクササイズ """
+    lowered = set()
+    for exercise_id, old in old_bests.items():
+        new = new_bests.get(exercise_id)
+        if (new is None or new.weight < old.weight or new.estimated_1rm < old.estimated_1rm
+                or new.volume < old.volume):
+            lowered.add(exercise_id)
+    return lowered
+
+
+def _apply(record, best, day) -> list:
+    """
+    セッション内ベストが自己ベストを上回る項目を更新する
+
+    Returns:
+        list: 更新した自己ベストの種類
+    """
+    improved = []
+    if best.weight > (record.max_weight, record.max_weight_reps):
+        record.max_weight, record.max_weight_reps = best.weight
+        record.max_weight_date = day
+        improved.append('max_weight')
+    if best.estimated_1rm > record.max_estimated_1rm:
+        record.max_estimated_1rm = best.estimated_1rm
+        record.max_estimated_1rm_date = day
+        improved.append('max_estimated_1rm')
+    if best.volume > record.max_session_volume:
+        record.max_session_volume = best.volume
+        record.max_session_volume_date = day
+        improved.append('max_session_volume')
+    if improved:
+        # bulk_update では auto_now が反映されないため明示的に設定する
+        record.updated_at = timezone.now()
+    return improved
+
+
+def _new_record(user_id, exercise_id, best, day) -> PersonalRecord:
+    weight, reps = best.weight
+    return PersonalRecord(
+        user_id=user_id,
+        exercise_id=exercise_id,
+        max_weight=weight,
+        max_weight_reps=reps,
+        max_weight_date=day,
+        max_estimated_1rm=best.estimated_1rm,
+        max_estimated_1rm_date=day,
+        max_session_volume=best.volume,
+        max_session_volume_date=day,
+    )
+
+
+def update_personal_records(user, sessions, retry=True) -> dict:
+    """
+    保存したセッションのセットで自己ベストを更新する（トランザクション内で呼び出す）
+
+    保存済みの自己ベストを1回のクエリで取得（行ロック）し、更新・作成はそれぞれ一括で行う。
+    初めて記録したエクササイズは自己ベストを作成するが、更新とはみなさない。
+
+    Args:
+        sessions: [(WorkoutSession, 種目データのリスト), ...]
+        retry: 自己ベストの作成が同時に保存された自己ベストと重複した場合に、1回だけやり直すか
+
+    Returns:
+        dict: {セッションID: [{"exercise": エクササイズID, "records": [更新した自己ベストの種類]}, ...]}
+    """
+    bests_by_session = [(session, session_bests(exercises_data)) for session, exercises_data in sessions]
+    exercise_ids = {exercise_id for _, bests in bests_by_session for exercise_id in bests}
+    records = {
+        record.exercise_id: record
+        for record in PersonalRecord.objects.select_for_update().filter(user=user, exercise_id__in=exercise_ids)
+    }
+
+    results = {session.id: [] for session, _ in sessions}
+    to_create, to_update = {}, {}
+    for session, bests in bests_by_session:
+        for exercise_id, best in bests.items():
+            record = records.get(exercise_id)
+            if record is None:
+                records[exercise_id] = to_create[exercise_id] = _new_record(user.pk, exercise_id, best, session.date)
+                continue
+
+            improved = _apply(record, best, session.date)
+            if not improved:
+                continue
+            if record.pk:
+                to_update[exercise_id] = record
+            results[session.id].append({'exercise': exercise_id, 'records': improved})
+
+    if to_create:
+        try:
+            with transaction.atomic():
+                PersonalRecord.objects.bulk_create(to_create.values())
+        except IntegrityError:
+            if not retry:
+                raise
+            # 同じエクササイズの初めての記録が同時に保存された場合は、保存された自己ベストと比較し直す
+            return update_personal_records(user, sessions, retry=False)
+    if to_update:
+        PersonalRecord.objects.bulk_update(to_update.values(), RECORD_FIELDS + ('updated_at',))
+    return results
+
+
+@transaction.atomic
+def rebuild_personal_records(user_id=None, exercise_ids=None) -> int:
+    """
+    セットから自己ベストを再計算する
+
+    対象のセットを1回のクエリで日付順に取得して集計し、対象の自己ベストを作り直す。
+
+    Args:
+        user_id: 対象ユーザーID（指定しない場合は全ユーザー）
+        exercise_ids: 対象エクササイズIDのリスト（指定しない場合は全エクササイズ）
+
+    Returns:
+        int: 作成した自己ベストの件数
+    """
+    sets = WorkoutExerciseSet.objects.filter(
+        weight__isnull=False, reps__gt=0, workout_exercise_id__exercise__isnull=False)
+    records = PersonalRecord.objects.all()
+    if user_id is not None:
+        sets = sets.filter(workout_exercise_id__workout_session_id__user_id=user_id)
+        records = records.filter(user_id=user_id)
+    if exercise_ids is not None:
+        sets = sets.filter(workout_exercise_id__exercise_id__in=exercise_ids)
+        records = records.filter(exercise_id__in=exercise_ids)
+
+    rows = sets.order_by('workout_exercise_id__workout_session_id__date', 'id').values_list(
+        'workout_exercise_id__workout_session_id__user_id',
+        'workout_exercise_id__exercise_id',
+        'workout_exercise_id__workout_session_id',
+        'workout_exercise_id__workout_session_id__date',
+        'weight',
+        'reps',
+    )
+
+    # セッションごとに集計してから、古いセッションから順に自己ベストに反映する
+    session_bests_by_key = defaultdict(_Best)
+    session_dates = {}
+    for user, exercise_id, session_id, day, weight, reps in rows.iterator():
+        session_bests_by_key[(user, exercise_id, session_id)].add(weight, reps)
+        session_dates[session_id] = day
+
+    new_records = {}
+    for (user, exercise_id, session_id), best in session_bests_by_key.items():
+        day = session_dates[session_id]
+        record = new_records.get((user, exercise_id))
+        if record is None:
+            new_records[(user, exercise_id)] = _new_record(user, exercise_id, best, day)
+        else:
+            _apply(record, best, day)
+
+    records.delete()
+    PersonalRecord.objects.bulk_create(new_records.values(), batch_size=1000)
+    return len(new_records)
+
+
+def rebuild_lowered_personal_records(user_id, old_bests, new_bests, date_changed) -> None:
+    """
+    セッションの更新で増分では反映できない自己ベストを再計算する
+
+    セッション内ベストが下がった（またはなくなった）エクササイズが対象。
+    日付を変更した場合は記録日も変わるため、更新前のセッションの全エクササイズを対象にする。
+
+    Args:
+        old_bests: 更新前のセッション内ベスト（stored_session_bests の値）
+        new_bests: 更新後のセッション内ベスト（session_bests の値）
+    """
+    exercise_ids = set(old_bests) if date_changed else lowered_exercises(old_bests, new_bests)
+    if exercise_ids:
+        rebuild_personal_records(user_id, exercise_ids)
@@ -1,5 +1,79 @@
+from django.db import transaction
+from django.db.models import Prefetch, Q, prefetch_related_objects
+from django.utils import timezone
 from rest_framework import serializers
+from exercise.models import Exercise
 from .models import WorkoutSession, WorkoutExercise, WorkoutExerciseSet
+from .personal_records import (
+    rebuild_lowered_personal_records, session_bests, stored_session_bests, update_personal_records)
+
+
+# 一括同期で一度に送信できるセッションの最大件数
+WORKOUT_BATCH_LIMIT = 50
+
+# 更新で同じ日に同じ名前のセッションが重複する場合のエラーメッセージ
+DUPLICATE_SESSION_MESSAGE = "同じ日に同じ名前のトレーニングセッションが既に存在します。"
+
+# セットの順番以外の項目（差分更新で比較する項目）
+SET_FIELDS = (
+    'weight', 'reps', 'distance', 'distance_unit',
+    'duration', 'duration_unit', 'fat_burn', 'memo'
+)
+
+
+def workout_exercises_prefetch():
+    """種目（エクササイズ込み）とセットを順番どおりにまとめて取得するPrefetch"""
+    return Prefetch(
+        'workout_exercises',
+        queryset=WorkoutExercise.objects.select_related('exercise').order_by('order').prefetch_related(
+            Prefetch(
+                'workout_exercise_sets',
+                queryset=WorkoutExerciseSet.objects.order_by('order')
+            )
+        )
+    )
+
+
+def allowed_exercise_names(user, exercise_ids):
+    """
+    ユーザーが使用できるエクササイズの名前を1回のクエリで取得
+
+    公式エクササイズまたはユーザーが作成したエクササイズのみ使用可能。
+
+    Returns:
+        dict: {エクササイズID: エクササイズ名}（使用できないIDは含まない）
+    """
+    exercises = Exercise.objects.filter(id__in=exercise_ids)
+    if user is not None:
+        exercises = exercises.filter(Q(is_official=True) | Q(created_by=user))
+    return dict(exercises.values_list('id', 'name'))
+
+
+def bulk_create_exercises(sessions):
+    """
+    複数のセッションの種目とセットを作成（種目・セットそれぞれ1回の一括INSERT）
+
+    Args:
+        sessions: [(WorkoutSession, 種目データのリスト), ...]
+    """
+    pairs = [
+        (workout_session, exercise_data)
+        for workout_session, exercises_data in sessions
+        for exercise_data in exercises_data
+    ]
+    exercises = WorkoutExercise.objects.bulk_create([
+        WorkoutExercise(
+            workout_session_id=workout_session,
+            exercise_id=exercise_data['exercise_id'],
+            order=exercise_data['order'],
+        )
+        for workout_session, exercise_data in pairs
+    ])
+    WorkoutExerciseSet.objects.bulk_create([
+        WorkoutExerciseSet(workout_exercise_id=exercise, **set_data)
+        for exercise, (_, exercise_data) in zip(exercises, pairs)
+        for set_data in exercise_data['workout_exercise_sets']
+    ])
 
 
 class WorkoutExerciseSetSerializer(serializers.ModelSerializer):
@@ -20,10 +94,7 @@ class WorkoutExerciseSetSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = WorkoutExerciseSet
-        fields = (
-            'order', 'weight', 'reps', 'distance', 'distance_unit',
-            'duration', 'duration_unit', 'fat_burn', 'memo'
-        )
+        fields = ('order',) + SET_FIELDS
 
     def validate_order(self, value):
         if value < 1:
@@ -67,6 +138,15 @@ class WorkoutExerciseSerializer(serializers.ModelSerializer):
         order (int): 種目の順番
         workout_exercise_sets (list): セット情報のリスト
     """
+    # 存在・権限の確認は WorkoutSessionSerializer で全種目まとめて行う（種目ごとにクエリを発行しない）
+    exercise = serializers.IntegerField(
+        source='exercise_id',
+        error_messages={
+            'required': "エクササイズを指定してください。",
+            'null': "エクササイズを指定してください。",
+        },
+        help_text='エクササイズID'
+    )
     workout_exercise_sets = WorkoutExerciseSetSerializer(many=True)
     exercise_name = serializers.SerializerMethodField()
     exercise_type = serializers.SerializerMethodField()
@@ -88,17 +168,30 @@ class WorkoutExerciseSerializer(serializers.ModelSerializer):
         """エクササイズタイプを取得（Null対応）"""
         return obj.exercise.exercise_type if obj.exercise else "unknown"
 
-    def validate_exercise(self, value):
-        """エクササイズのアクセス権限をチェック"""
-        if value is None:
-            raise serializers.ValidationError("エクササイズを指定してください。")
 
-        request = self.context.get('request')
-        if request:
-            # 公式エクササイズまたはユーザーが作成したエクササイズのみ使用可能
-            if not value.is_official and value.created_by != request.user:
-                raise serializers.ValidationError("このエクササイズを使用する権限がありません。")
-        return value
+
+class WorkoutSessionListSerializer(serializers.ModelSerializer):
+    """
+    トレーニングセッション一覧用のシリアライザー（読み取り専用）
+
+    種目とセットは含めず、件数と総挙上量をSQLで集計した値（ビューでannotate）を返します。
+
+    Fields:
+        id (int): トレーニングセッションの一意識別子
+        name (str): セッション名
+        date (date): トレーニング日
+        exercise_count (int): 種目数
+        set_count (int): セット数
+        total_volume (float): 総挙上量（重量(kg) × 回数の合計）
+    """
+    exercise_count = serializers.IntegerField(read_only=True)
+    set_count = serializers.IntegerField(read_only=True)
+    total_volume = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = WorkoutSession
+        fields = ('id', 'name', 'date', 'exercise_count', 'set_count', 'total_volume')
+        read_only_fields = fields
 
 
 class WorkoutSessionSerializer(serializers.ModelSerializer):
@@ -112,15 +205,21 @@ class WorkoutSessionSerializer(serializers.ModelSerializer):
         name (str): セッション名、必須
         date (date): トレーニング日、必須
         memo (str): メモ、オプション
+        client_id (str): クライアントが生成したID、オプション（作成時のみ指定可能）
         workout_exercises (list): 種目情報のリスト
+        new_personal_records (list): 作成・更新で更新した自己ベスト（読み取り専用、取得時は空）
         created_at (datetime): 作成日時（読み取り専用）
         updated_at (datetime): 更新日時（読み取り専用）
     """
     workout_exercises = WorkoutExerciseSerializer(many=True)
+    new_personal_records = serializers.SerializerMethodField()
 
     class Meta:
         model = WorkoutSession
-        fields = ('id', 'name', 'date', 'memo', 'workout_exercises', 'created_at', 'updated_at')
+        fields = (
+            'id', 'name', 'date', 'memo', 'client_id', 'workout_exercises', 'new_personal_records',
+            'created_at', 'updated_at'
+        )
         read_only_fields = ('id', 'created_at', 'updated_at')
 
     def validate_name(self, value):
@@ -137,17 +236,38 @@ class WorkoutSessionSerializer(serializers.ModelSerializer):
         if len(orders) != len(set(orders)):
             raise serializers.ValidationError("種目の順番が重複しています。")
 
+        # エクササイズの存在とアクセス権限を1回のクエリでチェック
+        # （一括同期では全セッション分を事前にまとめて取得した結果を使う）
+        exercise_ids = {exercise['exercise_id'] for exercise in value}
+        exercise_names = self.context.get('exercise_names')
+        if exercise_names is None:
+            request = self.context.get('request')
+            exercise_names = allowed_exercise_names(request.user if request else None, exercise_ids)
+        if exercise_ids - exercise_names.keys():
+            raise serializers.ValidationError("このエクササイズを使用する権限がありません。")
+
         # 各種目でセットの順番が重複していないかチェック
         for exercise in value:
             sets = exercise.get('workout_exercise_sets', [])
             if sets:
                 set_orders = [s.get('order') for s in sets]
                 if len(set_orders) != len(set(set_orders)):
-                    exercise_name = exercise.get('exercise').name if exercise.get('exercise') else "不明な種目"
+                    exercise_name = exercise_names[exercise['exercise_id']]
                     raise serializers.ValidationError(f"種目「{exercise_name}」でセットの順番が重複しています。")
 
         return value
 
+    def get_new_personal_records(self, obj):
+        """作成・更新で更新した自己ベスト [{"exercise": エクササイズID, "records": [自己ベストの種類]}, ...]"""
+        return getattr(self, '_new_personal_records', {}).get(obj.id, [])
+
+    def to_representation(self, instance):
+        """種目とセットをまとめて取得してから出力する（取得済みの場合はそのまま）"""
+        if 'workout_exercises' not in getattr(instance, '_prefetched_objects_cache', {}):
+            prefetch_related_objects([instance], workout_exercises_prefetch())
+        return super().to_representation(instance)
+
+    @transaction.atomic
     def create(self, validated_data):
         """トレーニングセッションを作成（ネストされた種目とセットも保存）"""
         request = self.context.get("request")
@@ -161,12 +281,15 @@ class WorkoutSessionSerializer(serializers.ModelSerializer):
 
         # ネストされた種目とセットを作成
         self._create_exercises(workout_session, exercises_data)
+        self._new_personal_records = update_personal_records(request.user, [(workout_session, exercises_data)])
 
         return workout_session
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """トレーニングセッションを更新（ネストされた種目とセットも更新）"""
         exercises_data = validated_data.pop('workout_exercises', None)
+        old_date = instance.date
 
         # WorkoutSessionの基本情報を更新
         instance.name = validated_data.get('name', instance.name)
@@ -174,27 +297,234 @@ class WorkoutSessionSerializer(serializers.ModelSerializer):
         instance.memo = validated_data.get('memo', instance.memo)
         instance.save()
 
+        if exercises_data is None and instance.date == old_date:
+            return instance
+
+        old_bests = stored_session_bests([instance.id]).get(instance.id, {})
         if exercises_data is not None:
-            # 既存の種目とセットを削除してから新しく作成（デリートインサート）
-            instance.workout_exercises.all().delete()
-            self._create_exercises(instance, exercises_data)
+            self._update_exercises(instance, exercises_data)
+            self._new_personal_records = update_personal_records(instance.user_id, [(instance, exercises_data)])
+            new_bests = session_bests(exercises_data)
+        else:
+            new_bests = old_bests
+        rebuild_lowered_personal_records(instance.user_id.pk, old_bests, new_bests, instance.date != old_date)
 
         return instance
 
-    def _create_exercises(self, workout_session, exercises_data):
-        """種目とセットを作成"""
+    def _update_exercises(self, workout_session, exercises_data):
+        """
+        種目とセットを既存の行と比較して更新
+
+        種目・セットは順番（order）で既存の行と対応付け、変更のあった行のみ一括更新する。
+        対応する行がない場合は追加、指定されなかった既存の行は削除する。
+        変更のない行は更新しないため、作成日時・更新日時もそのまま残る。
+        """
+        existing_exercises = {
+            exercise.order: exercise
+            for exercise in workout_session.workout_exercises.all()
+        }
+        existing_sets = {}
+        for workout_set in WorkoutExerciseSet.objects.filter(workout_exercise_id__workout_session_id=workout_session):
+            existing_sets.setdefault(workout_set.workout_exercise_id_id, {})[workout_set.order] = workout_set
+
+        now = timezone.now()
+        new_exercises = []
+        exercises_to_update, sets_to_create, sets_to_update, sets_to_delete = [], [], [], []
         for exercise_data in exercises_data:
-            sets_data = exercise_data.pop('workout_exercise_sets')
+            exercise = existing_exercises.pop(exercise_data['order'], None)
+            if exercise is None:
+                new_exercises.append(exercise_data)
+                continue
+
+            if exercise.exercise_id != exercise_data['exercise_id']:
+                exercise.exercise_id = exercise_data['exercise_id']
+                exercise.updated_at = now
+                exercises_to_update.append(exercise)
+
+            sets = existing_sets.get(exercise.id, {})
+            for set_data in exercise_data['workout_exercise_sets']:
+                workout_set = sets.pop(set_data['order'], None)
+                if workout_set is None:
+                    sets_to_create.append(WorkoutExerciseSet(workout_exercise_id=exercise, **set_data))
+                    continue
+                # 指定されなかった項目は空にする（更新前の削除・再作成と同じ結果）
+                changed = [field for field in SET_FIELDS if getattr(workout_set, field) != set_data.get(field)]
+                if changed:
+                    for field in changed:
+                        setattr(workout_set, field, set_data.get(field))
+                    workout_set.updated_at = now
+                    sets_to_update.append(workout_set)
+            sets_to_delete += [workout_set.id for workout_set in sets.values()]
+
+        if existing_exercises:
+            # 削除した種目のセットも削除される
+            WorkoutExercise.objects.filter(id__in=[exercise.id for exercise in existing_exercises.values()]).delete()
+        if sets_to_delete:
+            WorkoutExerciseSet.objects.filter(id__in=sets_to_delete).delete()
+        if exercises_to_update:
+            WorkoutExercise.objects.bulk_update(exercises_to_update, ['exercise', 'updated_at'])
+        if sets_to_update:
+            WorkoutExerciseSet.objects.bulk_update(sets_to_update, SET_FIELDS + ('updated_at',))
+        if sets_to_create:
+            WorkoutExerciseSet.objects.bulk_create(sets_to_create)
+        if new_exercises:
+            self._create_exercises(workout_session, new_exercises)
+
+    def _create_exercises(self, workout_session, exercises_data):
+        """種目とセットを作成（種目・セットそれぞれ1回の一括INSERT）"""
+        bulk_create_exercises([(workout_session, exercises_data)])
 
-            # WorkoutExerciseを作成
-            exercise = WorkoutExercise.objects.create(
-                workout_session_id=workout_session,
-                **exercise_data
-            )
 
-            # WorkoutExerciseSetを作成
-            for set_data in sets_data:
-                WorkoutExerciseSet.objects.create(
-                    workout_exercise_id=exercise,
-                    **set_data
-                )
\ No newline at end of file
+class WorkoutSessionBatchSerializer(serializers.Serializer):
+    """
+    トレーニングセッションの一括同期（オフライン時に溜めたセッションの送信）
+
+    各セッションには client_id が必須。同じユーザー・client_id のセッションが既にある場合は
+    そのセッションを更新し、ない場合は作成する（通信が切れて再送しても重複作成しない）。
+    不正なセッションは保存せず、結果にエラーを含める。
+    """
+    sessions = serializers.ListField(
+        child=serializers.DictField(), allow_empty=False, max_length=WORKOUT_BATCH_LIMIT,
+        help_text=f'トレーニングセッションのリスト（最大{WORKOUT_BATCH_LIMIT}件、各要素に client_id が必須）'
+    )
+
+    def create(self, validated_data):
+        """
+        セッションをまとめて作成・更新
+
+        Returns:
+            list: 送信順の結果
+                [{"client_id", "status": "created" | "updated" | "invalid", "id", "errors", "new_personal_records"}, ...]
+        """
+        request = self.context['request']
+        sessions_data = validated_data['sessions']
+
+        client_ids = [str(data.get('client_id') or '') for data in sessions_data]
+        existing = {
+            session.client_id: session
+            for session in WorkoutSession.objects.filter(
+                user_id=request.user, client_id__in=[client_id for client_id in client_ids if client_id])
+        }
+
+        # 全セッションのエクササイズをまとめて権限チェックする
+        exercise_ids = set()
+        for data in sessions_data:
+            for exercise in data.get('workout_exercises') or []:
+                try:
+                    exercise_ids.add(int(exercise.get('exercise')))
+                except (AttributeError, TypeError, ValueError):
+                    # 不正な値はセッションごとのバリデーションでエラーにする
+                    continue
+        context = {**self.context, 'exercise_names': allowed_exercise_names(request.user, exercise_ids)}
+
+        results, to_create, to_update = [], [], []
+        seen = set()
+        for client_id, data in zip(client_ids, sessions_data):
+            result = {'client_id': client_id or None, 'status': 'invalid', 'id': None, 'errors': None}
+            results.append(result)
+            if not client_id:
+                result['errors'] = {'client_id': ["client_id を指定してください。"]}
+                continue
+            if client_id in seen:
+                result['errors'] = {'client_id': ["同じ client_id のセッションが重複しています。"]}
+                continue
+            seen.add(client_id)
+
+            serializer = WorkoutSessionSerializer(instance=existing.get(client_id), data=data, context=context)
+            if not serializer.is_valid():
+                result['errors'] = serializer.errors
+                continue
+            (to_update if serializer.instance else to_create).append((result, serializer))
+
+        to_update = self._exclude_duplicate_names(request.user, to_update)
+
+        with transaction.atomic():
+            sessions = WorkoutSession.objects.bulk_create([
+                WorkoutSession(
+                    user_id=request.user,
+                    client_id=result['client_id'],
+                    name=serializer.validated_data['name'],
+                    date=serializer.validated_data['date'],
+                    memo=serializer.validated_data.get('memo'),
+                )
+                for result, serializer in to_create
+            ])
+            bulk_create_exercises([
+                (session, serializer.validated_data['workout_exercises'])
+                for session, (_, serializer) in zip(sessions, to_create)
+            ])
+            for session, (result, _) in zip(sessions, to_create):
+                result.update(status='created', id=session.id)
+
+            # 値を下げた・日付を変えたセッションの自己ベストを再計算するため、更新前のベストを取得する
+            old_bests = stored_session_bests([serializer.instance.id for _, serializer in to_update])
+            old_dates = {serializer.instance.id: serializer.instance.date for _, serializer in to_update}
+
+            now = timezone.now()
+            for result, serializer in to_update:
+                session, data = serializer.instance, serializer.validated_data
+                session.name = data['name']
+                session.date = data['date']
+                session.memo = data.get('memo', session.memo)
+                session.updated_at = now
+            WorkoutSession.objects.bulk_update(
+                [serializer.instance for _, serializer in to_update], ['name', 'date', 'memo', 'updated_at'])
+            for result, serializer in to_update:
+                serializer._update_exercises(serializer.instance, serializer.validated_data['workout_exercises'])
+                result.update(status='updated', id=serializer.instance.id)
+
+            # 保存した全セッションの自己ベストをまとめて更新する
+            # （送信順ではなく日付順に反映し、同じ値の自己ベストは古い日付を記録日にする。再計算と同じ結果になる）
+            saved = list(zip(sessions, (serializer for _, serializer in to_create))) + [
+                (serializer.instance, serializer) for _, serializer in to_update
+            ]
+            saved.sort(key=lambda pair: (pair[0].date, pair[0].id))
+            new_personal_records = update_personal_records(request.user, [
+                (session, serializer.validated_data['workout_exercises']) for session, serializer in saved
+            ])
+            for _, serializer in to_update:
+                session = serializer.instance
+                rebuild_lowered_personal_records(
+                    request.user.pk,
+                    old_bests.get(session.id, {}),
+                    session_bests(serializer.validated_data['workout_exercises']),
+                    session.date != old_dates[session.id],
+                )
+
+        for result in results:
+            result['new_personal_records'] = new_personal_records.get(result['id'], [])
+        return results
+
+    def _exclude_duplicate_names(self, user, to_update):
+        """
+        個別の更新（PUT）と同じく、同じ日に同じ名前のセッションになる更新をエラーにする
+
+        名前・日付を変更するセッションと同じ名前・日付の既存セッションを1回のクエリで取得し、
+        一括同期内の他のセッションとの重複も確認する。
+
+        Returns:
+            list: 保存する (結果, シリアライザー) のリスト
+        """
+        renamed = Q()
+        for _, serializer in to_update:
+            session, data = serializer.instance, serializer.validated_data
+            if (data['name'], data['date']) != (session.name, session.date):
+                renamed |= Q(name=data['name'], date=data['date'])
+        if not renamed:
+            return to_update
+
+        taken = {}
+        for session_id, name, date in WorkoutSession.objects.filter(renamed, user_id=user).values_list(
+                'id', 'name', 'date'):
+            taken.setdefault((name, date), set()).add(session_id)
+
+        accepted = []
+        for result, serializer in to_update:
+            session, data = serializer.instance, serializer.validated_data
+            key = (data['name'], data['date'])
+            if key != (session.name, session.date) and taken.get(key, set()) - {session.id}:
+                result['errors'] = {'non_field_errors': [DUPLICATE_SESSION_MESSAGE]}
+                continue
+            taken.setdefault(key, set()).add(session.id)
+            accepted.append((result, serializer))
+        return accepted
@@ -1,3 +1,399 @@
-from django.test import TestCase
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from exercise.models import Exercise, ExerciseCategory
+from workout.models import PersonalRecord, WorkoutExercise, WorkoutExerciseSet, WorkoutSession
+from workout.personal_records import RECORD_FIELDS
+
+User = get_user_model()
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """ テスト間でキャッシュを共有しない """
+    cache.clear()
+
+
+@pytest.fixture
+def api_client():
+    """ テスト用のAPIクライアント """
+    return APIClient()
+
+
+@pytest.fixture
+def user():
+    """ テスト用のユーザー（メール認証済み） """
+    user = User.objects.create_user(
+        username="test_user", email="test@example.com", name="テストユーザー", password="password123")
+    user.is_active = True
+    user.save()
+    return user
+
+
+@pytest.fixture
+def exercise():
+    """ 公式エクササイズ """
+    category = ExerciseCategory.objects.create(name="胸")
+    return Exercise.objects.create(name="ベンチプレス", category=category, description="", is_official=True)
+
+
+def create_session(user, exercise, date, sets=((60, 10), (70, 8))):
+    """ 1種目のトレーニングセッションを作成するヘルパー関数 """
+    session = WorkoutSession.objects.create(user_id=user, name="胸トレーニング", date=date)
+    workout_exercise = WorkoutExercise.objects.create(workout_session_id=session, exercise=exercise, order=1)
+    for order, (weight, reps) in enumerate(sets, start=1):
+        WorkoutExerciseSet.objects.create(
+            workout_exercise_id=workout_exercise, order=order, weight=weight, reps=reps)
+    return session
+
+
+def session_payload(exercises, sets_per_exercise, date="2025-01-01"):
+    """ 種目ごとに同じ件数のセットを持つセッション作成APIのリクエスト """
+    return {
+        "name": "全身トレーニング",
+        "date": date,
+        "workout_exercises": [
+            {
+                "exercise": exercise.id,
+                "order": order,
+                "workout_exercise_sets": [
+                    {"order": set_order, "weight": 50 + set_order, "reps": 10}
+                    for set_order in range(1, sets_per_exercise + 1)
+                ],
+            }
+            for order, exercise in enumerate(exercises, start=1)
+        ],
+    }
+
+
+# ✅ 正常系テスト
+@pytest.mark.django_db
+def test_session_list_is_lean_and_paginated(api_client, user, exercise, django_assert_max_num_queries):
+    """ ✅ 一覧は種目・セットを含まず、件数と総挙上量を返す（カーソルページネーション） """
+    for day in range(1, 4):
+        create_session(user, exercise, f"2025-01-0{day}")
+    api_client.force_login(user)
+
+    with django_assert_max_num_queries(3):
+        response = api_client.get("/api/workouts/", {"page_size": 2})
+
+    assert response.status_code == status.HTTP_200_OK
+    results = response.data["results"]
+    assert [session["date"] for session in results] == ["2025-01-03", "2025-01-02"]
+    assert results[0]["exercise_count"] == 1
+    assert results[0]["set_count"] == 2
+    assert results[0]["total_volume"] == pytest.approx(60 * 10 + 70 * 8)
+    assert "workout_exercises" not in results[0]
+
+    response = api_client.get(response.data["next"])
+    assert [session["date"] for session in response.data["results"]] == ["2025-01-01"]
+
+
+@pytest.mark.django_db
+def test_session_retrieve_is_nested(api_client, user, exercise):
+    """ ✅ 詳細取得は種目とセットを含む """
+    session = create_session(user, exercise, "2025-01-01")
+    api_client.force_login(user)
+
+    response = api_client.get(f"/api/workouts/{session.id}/")
+
+    assert response.status_code == status.HTTP_200_OK
+    sets = response.data["workout_exercises"][0]["workout_exercise_sets"]
+    assert [s["weight"] for s in sets] == [60, 70]
+
+
+@pytest.mark.django_db
+def test_session_update_only_changed_rows(api_client, user, exercise):
+    """ ✅ 更新時は順番で既存の種目・セットと対応付け、変更のあった行のみ更新する """
+    session = create_session(user, exercise, "2025-01-01", sets=((60, 10), (70, 8), (75, 6)))
+    squat = Exercise.objects.create(
+        name="スクワット", category=exercise.category, description="", is_official=True)
+    WorkoutExercise.objects.create(workout_session_id=session, exercise=squat, order=2)
+    first_set, second_set, third_set = WorkoutExerciseSet.objects.order_by("order")
+    api_client.force_login(user)
+
+    response = api_client.put(f"/api/workouts/{session.id}/", {
+        "name": "胸トレーニング",
+        "date": "2025-01-01",
+        "workout_exercises": [{
+            "exercise": exercise.id,
+            "order": 1,
+            "workout_exercise_sets": [
+                {"order": 1, "weight": 60, "reps": 10},
+                {"order": 2, "weight": 70, "reps": 9},
+                {"order": 4, "weight": 80, "reps": 3},
+            ],
+        }],
+    }, format="json")
+
+    assert response.status_code == status.HTTP_200_OK
+    sets = {s.order: s for s in WorkoutExerciseSet.objects.all()}
+    assert sorted(sets) == [1, 2, 4]
+    # 変更のない行・変更した行はそのまま残る
+    assert sets[1].id == first_set.id and sets[1].updated_at == first_set.updated_at
+    assert sets[2].id == second_set.id and sets[2].reps == 9
+    assert sets[2].created_at == second_set.created_at
+    assert not WorkoutExerciseSet.objects.filter(id=third_set.id).exists()
+    assert list(WorkoutExercise.objects.values_list("order", flat=True)) == [1]
+
+
+@pytest.mark.django_db
+def test_session_create_queries_independent_of_size(api_client, user, exercise):
+    """ ✅ セッション作成のクエリ数は種目・セットの件数によらず一定（1種目1セット / 15種目60セット） """
+    exercises = [exercise] + [
+        Exercise.objects.create(name=f"種目{i}", category=exercise.category, description="", is_official=True)
+        for i in range(15)
+    ]
+    api_client.force_login(user)
+
+    # 自己ベストの作成・更新の条件を揃えるため、それぞれ初めて記録するエクササイズを使う
+    with CaptureQueriesContext(connection) as small:
+        response = api_client.post("/api/workouts/", session_payload(exercises[:1], 1), format="json")
+    assert response.status_code == status.HTTP_201_CREATED
+
+    with CaptureQueriesContext(connection) as large:
+        response = api_client.post("/api/workouts/", session_payload(exercises[1:], 4, "2025-01-02"), format="json")
+    assert response.status_code == status.HTTP_201_CREATED
+    assert len(response.data["workout_exercises"]) == 15
+    assert WorkoutExerciseSet.objects.count() == 1 + 60
+
+    assert len(large.captured_queries) == len(small.captured_queries)
+
+
+@pytest.mark.django_db
+def test_session_batch_is_idempotent(api_client, user, exercise):
+    """ ✅ 一括同期は client_id で作成・更新を判定し、再送しても重複作成しない """
+    api_client.force_login(user)
+    first = {**session_payload([exercise], 2), "client_id": "session-1"}
+    second = {**session_payload([exercise], 1, "2025-01-02"), "client_id": "session-2"}
+
+    response = api_client.post("/api/workouts/batch/", {"sessions": [first, second]}, format="json")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [r["status"] for r in response.data["results"]] == ["created", "created"]
+    ids = [r["id"] for r in response.data["results"]]
+
+    # 通信が切れた想定で再送（2件目はセットを追加）
+    second["workout_exercises"][0]["workout_exercise_sets"].append({"order": 2, "weight": 60, "reps": 5})
+    response = api_client.post("/api/workouts/batch/", {"sessions": [first, second]}, format="json")
+
+    assert [r["status"] for r in response.data["results"]] == ["updated", "updated"]
+    assert [r["id"] for r in response.data["results"]] == ids
+    assert WorkoutSession.objects.count() == 2
+    assert WorkoutExerciseSet.objects.filter(workout_exercise_id__workout_session_id=ids[1]).count() == 2
+
+
+@pytest.mark.django_db
+def test_exercise_progress(api_client, user, exercise, django_assert_num_queries):
+    """ ✅ エクササイズの日ごとの総挙上量・推定1RM・回数帯ごとの自己ベストを返し、結果をキャッシュする """
+    create_session(user, exercise, "2025-01-01", sets=((60, 10), (70, 8)))
+    create_session(user, exercise, "2025-01-03", sets=((80, 3), (100, 1)))
+    api_client.force_login(user)
+
+    response = api_client.get("/api/workouts/progress/", {"exercise": exercise.id})
+
+    assert response.status_code == status.HTTP_200_OK
+    first, second = response.data["daily"]
+    assert first["volume"] == pytest.approx(60 * 10 + 70 * 8)
+    assert first["sets"] == 2
+    # 70kg×8回（Epley 88.7kg）は 60kg×10回（Epley 80kg）より推定1RMが大きい
+    assert (first["best_set"]["weight"], first["best_set"]["reps"]) == (70, 8)
+    assert first["best_set"]["estimated_1rm"]["brzycki"] == pytest.approx(70 * 36 / 29, abs=0.1)
+    assert response.data["best_set"]["weight"] == 100
+    assert response.data["best_set"]["estimated_1rm"]["epley"] == 100
+    assert {r["rep_range"]: r["weight"] for r in response.data["personal_records"]} == {
+        "1": 100, "2-3": 80, "7-10": 70}
+
+    # 2回目はキャッシュから返す（セッション・認証以外のクエリを発行しない）
+    with django_assert_num_queries(3):
+        api_client.get("/api/workouts/progress/", {"exercise": exercise.id})
+
+
+@pytest.mark.django_db
+def test_exercise_progress_invalidated_on_session_write(api_client, user, exercise):
+    """ ✅ セッションを作成・削除すると成長分析が再計算される """
+    session = create_session(user, exercise, "2025-01-01", sets=((60, 10),))
+    api_client.force_login(user)
+    assert len(api_client.get("/api/workouts/progress/", {"exercise": exercise.id}).data["daily"]) == 1
+
+    api_client.post("/api/workouts/", session_payload([exercise], 1, "2025-01-02"), format="json")
+    assert len(api_client.get("/api/workouts/progress/", {"exercise": exercise.id}).data["daily"]) == 2
+
+    api_client.delete(f"/api/workouts/{session.id}/")
+    daily = api_client.get("/api/workouts/progress/", {"exercise": exercise.id}).data["daily"]
+    assert [str(day["date"]) for day in daily] == ["2025-01-02"]
+
+
+@pytest.mark.django_db
+def test_new_personal_records_on_save(api_client, user, exercise):
+    """ ✅ セッション保存時に自己ベストを更新し、更新した自己ベストを返す """
+    api_client.force_login(user)
+    first = session_payload([exercise], 2)
+
+    response = api_client.post("/api/workouts/", first, format="json")
+    # 初めて記録したエクササイズは更新とみなさない
+    assert response.data["new_personal_records"] == []
+    record = PersonalRecord.objects.get(user=user, exercise=exercise)
+    assert (record.max_weight, record.max_weight_reps) == (52, 10)
+    created_at = record.updated_at
+
+    # 重量は同じで回数が多いセット → 最大重量と推定1RMのみ更新（総挙上量は前回より少ない）
+    second = session_payload([exercise], 1, "2025-01-02")
+    second["workout_exercises"][0]["workout_exercise_sets"] = [{"order": 1, "weight": 52, "reps": 12}]
+    response = api_client.post("/api/workouts/", second, format="json")
+
+    assert response.data["new_personal_records"] == [
+        {"exercise": exercise.id, "records": ["max_weight", "max_estimated_1rm"]}]
+    record.refresh_from_db()
+    assert (record.max_weight, record.max_weight_reps, str(record.max_weight_date)) == (52, 12, "2025-01-02")
+    assert record.max_session_volume == 51 * 10 + 52 * 10
+    assert record.updated_at > created_at
+
+    # 取得時は空
+    response = api_client.get(f"/api/workouts/{response.data['id']}/")
+    assert response.data["new_personal_records"] == []
+
+
+@pytest.mark.django_db
+def test_rebuild_personal_records(api_client, user, exercise):
+    """ ✅ セッションを削除すると自己ベストを再計算し、コマンドで全件を再構築できる """
+    create_session(user, exercise, "2025-01-01", sets=((60, 10),))
+    heavy = create_session(user, exercise, "2025-01-02", sets=((100, 1),))
+    call_command("rebuild_personal_records")
+    assert PersonalRecord.objects.get().max_weight == 100
+
+    api_client.force_login(user)
+    api_client.delete(f"/api/workouts/{heavy.id}/")
+
+    record = PersonalRecord.objects.get()
+    assert (record.max_weight, record.max_weight_reps, str(record.max_weight_date)) == (60, 10, "2025-01-01")
+    assert record.max_session_volume == 600
+
+
+@pytest.mark.django_db
+def test_personal_records_follow_lowered_update(api_client, user, exercise):
+    """ ✅ セッションの値を下げる・日付を変える更新では、自己ベストを再計算する """
+    api_client.force_login(user)
+    create_session(user, exercise, "2025-01-01", sets=((60, 10),))
+    call_command("rebuild_personal_records")
+    payload = session_payload([exercise], 1, "2025-01-02")
+    payload["workout_exercises"][0]["workout_exercise_sets"] = [{"order": 1, "weight": 100, "reps": 5}]
+    session_id = api_client.post("/api/workouts/", payload, format="json").data["id"]
+    assert PersonalRecord.objects.get().max_weight == 100
+
+    # 重いセットを入力ミスとして修正する
+    payload["workout_exercises"][0]["workout_exercise_sets"] = [{"order": 1, "weight": 50, "reps": 5}]
+    response = api_client.put(f"/api/workouts/{session_id}/", payload, format="json")
+
+    assert response.status_code == status.HTTP_200_OK
+    record = PersonalRecord.objects.get()
+    assert (record.max_weight, record.max_weight_reps, str(record.max_weight_date)) == (60, 10, "2025-01-01")
+    assert record.max_session_volume == 600
+
+    # 日付の変更は一括同期でも記録日に反映される
+    api_client.post("/api/workouts/batch/", {"sessions": [{**session_payload([exercise], 1), "client_id": "s-1"}]},
+                    format="json")
+    heavy = {**session_payload([exercise], 1, "2025-01-03"), "client_id": "s-1"}
+    heavy["workout_exercises"][0]["workout_exercise_sets"] = [{"order": 1, "weight": 120, "reps": 1}]
+    api_client.post("/api/workouts/batch/", {"sessions": [heavy]}, format="json")
+    assert str(PersonalRecord.objects.get().max_weight_date) == "2025-01-03"
+    heavy["date"] = "2025-01-04"
+    api_client.post("/api/workouts/batch/", {"sessions": [heavy]}, format="json")
+    assert str(PersonalRecord.objects.get().max_weight_date) == "2025-01-04"
+
+
+@pytest.mark.django_db
+def test_session_batch_applies_personal_records_by_date(api_client, user, exercise):
+    """ ✅ 一括同期は送信順ではなく日付順に自己ベストを反映し、再計算と同じ記録日になる """
+    api_client.force_login(user)
+    newer = {**session_payload([exercise], 1, "2025-01-05"), "client_id": "session-2"}
+    older = {**session_payload([exercise], 1, "2025-01-01"), "client_id": "session-1"}
+
+    api_client.post("/api/workouts/batch/", {"sessions": [newer, older]}, format="json")
+
+    record = PersonalRecord.objects.get()
+    assert str(record.max_weight_date) == "2025-01-01"
+    call_command("rebuild_personal_records")
+    rebuilt = PersonalRecord.objects.get()
+    assert [getattr(rebuilt, field) for field in RECORD_FIELDS] == [getattr(record, field) for field in RECORD_FIELDS]
+
+
+# ❌ 異常系テスト
+@pytest.mark.django_db
+def test_session_list_invalid_date(api_client, user):
+    """ ❌ 日付形式が不正な場合はエラー """
+    api_client.force_login(user)
+
+    response = api_client.get("/api/workouts/", {"date_from": "2025/01/01"})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "date_from" in response.data
+
+
+@pytest.mark.django_db
+def test_session_create_not_object(api_client, user, exercise):
+    """ ❌ リクエストボディがオブジェクトでない場合はエラー """
+    api_client.force_login(user)
+
+    response = api_client.post("/api/workouts/", [session_payload([exercise], 1)], format="json")
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert not WorkoutSession.objects.exists()
+
+
+@pytest.mark.django_db
+def test_session_create_with_other_users_exercise(api_client, user, exercise):
+    """ ❌ 他のユーザーが作成したエクササイズは使用できない """
+    other = User.objects.create_user(
+        username="other_user", email="other@example.com", name="他のユーザー", password="password123")
+    custom = Exercise.objects.create(name="マイ種目", category=exercise.category, description="", created_by=other)
+    api_client.force_login(user)
+
+    response = api_client.post("/api/workouts/", session_payload([exercise, custom], 1), format="json")
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "workout_exercises" in response.data
+    assert not WorkoutSession.objects.exists()
+
+
+@pytest.mark.django_db
+def test_session_batch_reports_invalid_items(api_client, user, exercise):
+    """ ❌ 不正なセッションは保存せずエラーを返し、他のセッションは保存する """
+    api_client.force_login(user)
+    valid = {**session_payload([exercise], 1), "client_id": "session-1"}
+    no_client_id = session_payload([exercise], 1, "2025-01-02")
+    no_exercises = {**session_payload([], 1, "2025-01-03"), "client_id": "session-3"}
+
+    response = api_client.post(
+        "/api/workouts/batch/", {"sessions": [valid, no_client_id, no_exercises]}, format="json")
+
+    assert response.status_code == status.HTTP_200_OK
+    results = response.data["results"]
+    assert [r["status"] for r in results] == ["created", "invalid", "invalid"]
+    assert "client_id" in results[1]["errors"]
+    assert "workout_exercises" in results[2]["errors"]
+    assert list(WorkoutSession.objects.values_list("client_id", flat=True)) == ["session-1"]
+
+
+@pytest.mark.django_db
+def test_session_batch_rejects_duplicate_name_on_update(api_client, user, exercise):
+    """ ❌ 一括同期の更新でも、同じ日に同じ名前のセッションにはできない（作成は従来どおり可能） """
+    create_session(user, exercise, "2025-01-02")
+    api_client.force_login(user)
+    synced = {**session_payload([exercise], 1), "client_id": "session-1"}
+    api_client.post("/api/workouts/batch/", {"sessions": [synced]}, format="json")
+
+    moved = {**synced, "name": "胸トレーニング", "date": "2025-01-02"}
+    response = api_client.post("/api/workouts/batch/", {"sessions": [moved]}, format="json")
+
+    result = response.data["results"][0]
+    assert result["status"] == "invalid"
+    assert result["errors"] == {"non_field_errors": ["同じ日に同じ名前のトレーニングセッションが既に存在します。"]}
+    session = WorkoutSession.objects.get(client_id="session-1")
+    assert (session.name, str(session.date)) == ("全身トレーニング", "2025-01-01")
@@ -1,18 +1,35 @@
+from datetime import date
+
 from rest_framework import viewsets, permissions
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework import status
-from django.db.models import Prefetch
-from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
+from django.db import IntegrityError
+from django.db.models import Count, Q, F, FloatField, Sum, Value
+from django.db.models.functions import Coalesce
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiExample, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
 
-from .models import WorkoutSession, WorkoutExercise, WorkoutExerciseSet
-from .serializers import WorkoutSessionSerializer
+from exercise.models import Exercise
+from .analytics import REP_RANGES, get_exercise_progress, invalidate_exercise_progress
+from .personal_records import rebuild_personal_records
+from .models import WorkoutSession
+from .pagination import WorkoutSessionCursorPagination
+from .serializers import (
+    DUPLICATE_SESSION_MESSAGE, WORKOUT_BATCH_LIMIT, WorkoutSessionBatchSerializer, WorkoutSessionListSerializer, WorkoutSessionSerializer,
+    workout_exercises_prefetch)
 
 
 @extend_schema_view(
     list=extend_schema(
         summary="トレーニングセッション一覧取得",
-        description="ログインユーザーのトレーニングセッション一覧を取得します。日付でフィルタリングも可能です。",
+        description=(
+            "ログインユーザーのトレーニングセッション一覧を日付の新しい順に取得します。日付でフィルタリングも可能です。"
+            "一覧には種目・セットを含めず、種目数・セット数・総挙上量（重量×回数の合計）のみを返します。"
+            "種目・セットは詳細取得で取得してください。"
+            "カーソルページネーションで、次のページは next のURLで取得します（page_size で件数を指定、最大200件）。"
+        ),
         parameters=[
             OpenApiParameter(
                 name='date',
@@ -33,11 +50,17 @@ from .serializers import WorkoutSessionSerializer
                 description='終了日（YYYY-MM-DD形式）',
             ),
         ],
+        responses=WorkoutSessionListSerializer(many=True),
         tags=["トレーニング記録"]
     ),
     create=extend_schema(
         summary="トレーニングセッション作成",
-        description="新しいトレーニングセッションを作成します。種目とセット情報も一括で作成できます。",
+        description=(
+            "新しいトレーニングセッションを作成します。種目とセット情報も一括で作成できます。"
+            "new_personal_records には、このセッションで更新した自己ベスト（max_weight: 最大重量、"
+            "max_estimated_1rm: 最大推定1RM、max_session_volume: 1セッションの最大総挙上量）がエクササイズごとに入ります。"
+            "client_id を指定した場合、同じ client_id のセッションが既にあれば作成せずにそのセッションを返します（200）。"
+        ),
         tags=["トレーニング記録"]
     ),
     retrieve=extend_schema(
@@ -47,7 +70,10 @@ from .serializers import WorkoutSessionSerializer
     ),
     update=extend_schema(
         summary="トレーニングセッション更新",
-        description="指定したIDのトレーニングセッションを更新します。種目とセット情報も一括で更新できます。",
+        description=(
+            "指定したIDのトレーニングセッションを更新します。種目とセット情報も一括で更新できます。"
+            "new_personal_records には、この更新で更新した自己ベストが入ります。"
+        ),
         tags=["トレーニング記録"]
     ),
     partial_update=extend_schema(
@@ -66,47 +92,78 @@ class WorkoutSessionViewSet(viewsets.ModelViewSet):
     トレーニングセッションのCRUD API
 
     トレーニングセッションの作成、取得、更新、削除を行います。
+    オフライン時に溜めたセッションの一括同期（client_idで重複作成を防止）にも対応します。
+    エクササイズごとの成長分析（総挙上量・推定1RM・自己ベスト）も取得できます。
     すべての操作はログインユーザーのデータのみを対象とします。
     """
     serializer_class = WorkoutSessionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = WorkoutSessionCursorPagination
+
+    def get_serializer_class(self):
+        """一覧取得時は種目・セットを含まない軽量なシリアライザーを使用"""
+        if self.action == 'list':
+            return WorkoutSessionListSerializer
+        return super().get_serializer_class()
 
     def get_queryset(self):
-        """ログインユーザーのトレーニングセッションのみ取得（関連データも含む）"""
+        """
+        ログインユーザーのトレーニングセッションのみ取得
+
+        一覧取得時は種目数・セット数・総挙上量をSQLで集計し、
+        それ以外は種目とセットをまとめて取得する。
+
+        クエリパラメータ:
+            date (str, optional): 特定の日付のセッションを取得（YYYY-MM-DD形式）
+            date_from (str, optional): 期間の開始日（YYYY-MM-DD形式）
+            date_to (str, optional): 期間の終了日（YYYY-MM-DD形式）
+        """
         queryset = WorkoutSession.objects.filter(
             user_id=self.request.user
-        ).prefetch_related(
-            Prefetch(
-                'workout_exercises',
-                queryset=WorkoutExercise.objects.order_by('order').prefetch_related(
-                    Prefetch(
-                        'workout_exercise_sets',
-                        queryset=WorkoutExerciseSet.objects.order_by('order')
-                    )
-                )
-            )
         ).order_by('-date', '-created_at')
 
         # クエリパラメータでフィルタリング
-        date = self.request.query_params.get('date')
-        date_from = self.request.query_params.get('date_from')
-        date_to = self.request.query_params.get('date_to')
+        for param, lookup in (('date', 'date'), ('date_from', 'date__gte'), ('date_to', 'date__lte')):
+            value = self.request.query_params.get(param)
+            if not value:
+                continue
+            try:
+                queryset = queryset.filter(**{lookup: date.fromisoformat(value)})
+            except ValueError:
+                raise ValidationError({param: "日付形式が正しくありません。YYYY-MM-DD形式で入力してください。"})
 
-        if date:
-            queryset = queryset.filter(date=date)
-        if date_from:
-            queryset = queryset.filter(date__gte=date_from)
-        if date_to:
-            queryset = queryset.filter(date__lte=date_to)
+        if self.action == 'list':
+            sets = 'workout_exercises__workout_exercise_sets'
+            return queryset.only('id', 'name', 'date', 'created_at').annotate(
+                exercise_count=Count('workout_exercises', distinct=True),
+                set_count=Count(sets),
+                total_volume=Coalesce(
+                    Sum(F(f'{sets}__weight') * F(f'{sets}__reps'), output_field=FloatField()),
+                    Value(0.0),
+                ),
+            )
 
-        return queryset
+        return queryset.prefetch_related(workout_exercises_prefetch())
 
     def create(self, request, *args, **kwargs):
         """トレーニングセッションを作成"""
+        # 再送された場合は作成済みのセッションを返す（オブジェクト以外のボディはシリアライザーでエラーにする）
+        client_id = request.data.get('client_id') if isinstance(request.data, dict) else None
+        if client_id:
+            existing = self.get_queryset().filter(client_id=client_id).first()
+            if existing:
+                return Response(self.get_serializer(existing).data, status=status.HTTP_200_OK)
+
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        self.perform_create(serializer)
+        try:
+            self.perform_create(serializer)
+        except IntegrityError:
+            return Response(
+                {"error": "同じセッションが同時に送信されました。もう一度送信してください。"},
+                status=status.HTTP_409_CONFLICT
+            )
         headers = self.get_success_headers(serializer.data)
         return Response(
             serializer.data,
@@ -131,7 +188,7 @@ class WorkoutSessionViewSet(viewsets.ModelViewSet):
                 date=new_date or instance.date
             ).exclude(id=instance.id).exists():
                 return Response(
-                    {"non_field_errors": ["同じ日に同じ名前のトレーニングセッションが既に存在します。"]},
+                    {"non_field_errors": [DUPLICATE_SESSION_MESSAGE]},
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
@@ -143,6 +200,186 @@ class WorkoutSessionViewSet(viewsets.ModelViewSet):
 
         return Response(serializer.data)
 
+    @extend_schema(
+        summary="トレーニングセッション一括同期",
+        description=(
+            f"オフライン時に溜めたトレーニングセッションを1回のリクエストでまとめて保存します（最大{WORKOUT_BATCH_LIMIT}件）。"
+            "各セッションには client_id（UUIDなどクライアントで生成したID）が必須です。"
+            "同じ client_id のセッションが既にある場合はそのセッションを更新し、ない場合は作成するため、"
+            "通信が切れて再送してもセッションは重複しません。"
+            "不正なセッションは保存されず、結果の status が invalid になり errors にエラー内容が入ります。"
+            "結果は送信した順に返します。new_personal_records には更新した自己ベストが入ります。"
+        ),
+        request=WorkoutSessionBatchSerializer,
+        examples=[
+            OpenApiExample(
+                '2件のセッションを同期',
+                value={"sessions": [
+                    {
+                        "client_id": "6f1c2a9e-4b1d-4c0e-9a57-2f3b8d1e7c10",
+                        "name": "胸トレーニング",
+                        "date": "2024-01-15",
+                        "workout_exercises": [
+                            {"exercise": 1, "order": 1, "workout_exercise_sets": [{"order": 1, "weight": 60, "reps": 10}]},
+                        ],
+                    },
+                    {
+                        "client_id": "0a8e5d3c-7f2b-4e61-b9d4-5c1a2e3f4b70",
+                        "name": "脚トレーニング",
+                        "date": "2024-01-16",
+                        "workout_exercises": [
+                            {"exercise": 5, "order": 1, "workout_exercise_sets": [{"order": 1, "weight": 80, "reps": 8}]},
+                        ],
+                    },
+                ]},
+                request_only=True,
+            ),
+            OpenApiExample(
+                '同期結果',
+                value={"results": [
+                    {
+                        "client_id": "6f1c2a9e-4b1d-4c0e-9a57-2f3b8d1e7c10", "status": "created", "id": 12,
+                        "errors": None, "new_personal_records": [{"exercise": 1, "records": ["max_weight"]}],
+                    },
+                    {
+                        "client_id": "0a8e5d3c-7f2b-4e61-b9d4-5c1a2e3f4b70", "status": "updated", "id": 9,
+                        "errors": None, "new_personal_records": [],
+                    },
+                ]},
+                response_only=True,
+            ),
+        ],
+        responses={
+            200: {"description": "セッションごとの結果（送信順）"},
+            400: {"description": "sessions が指定されていない・件数が多すぎる場合"},
+            409: {"description": "同じ client_id のセッションが同時に送信された場合（再送してください）"},
+        },
+        tags=["トレーニング記録"]
+    )
+    @action(methods=['post'], detail=False, url_path='batch', url_name='batch')
+    def batch(self, request):
+        """トレーニングセッションを一括で作成・更新"""
+        serializer = WorkoutSessionBatchSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        try:
+            results = serializer.save()
+        except IntegrityError:
+            return Response(
+                {"error": "同じセッションが同時に送信されました。もう一度送信してください。"},
+                status=status.HTTP_409_CONFLICT
+            )
+        invalidate_exercise_progress(request.user.pk)
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        summary="エクササイズの成長分析",
+        description=(
+            "指定したエクササイズのこれまでのセット（重量・回数）から、日ごとの総挙上量（重量×回数の合計）・セット数・回数・ベストセット、"
+            "全期間のベストセット、推定1RM（Epley式: 重量×(1+回数/30)、Brzycki式: 重量×36/(37-回数)）、"
+            f"回数帯（{', '.join(name for name, _, _ in REP_RANGES)}回）ごとの自己ベスト（最大重量）を返します。"
+            "重量と回数が記録されたセットのみが対象です。ベストセットは推定1RM（Epley式）が最大のセットです。"
+            "結果はキャッシュされ、トレーニングセッションを作成・更新・削除すると再計算されます。"
+        ),
+        parameters=[
+            OpenApiParameter(
+                name='exercise',
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                required=True,
+                description='エクササイズID',
+            ),
+            OpenApiParameter(
+                name='date_from',
+                type=OpenApiTypes.DATE,
+                location=OpenApiParameter.QUERY,
+                description='開始日（YYYY-MM-DD形式）',
+            ),
+            OpenApiParameter(
+                name='date_to',
+                type=OpenApiTypes.DATE,
+                location=OpenApiParameter.QUERY,
+                description='終了日（YYYY-MM-DD形式）',
+            ),
+        ],
+        examples=[
+            OpenApiExample(
+                'ベンチプレスの成長分析',
+                value={
+                    "exercise": {"id": 1, "name": "ベンチプレス"},
+                    "daily": [{
+                        "date": "2024-01-15", "volume": 1720.0, "sets": 3, "reps": 24,
+                        "best_set": {"weight": 75.0, "reps": 6, "estimated_1rm": {"epley": 90.0, "brzycki": 87.1}},
+                    }],
+                    "best_set": {
+                        "weight": 75.0, "reps": 6, "estimated_1rm": {"epley": 90.0, "brzycki": 87.1},
+                        "date": "2024-01-15",
+                    },
+                    "personal_records": [
+                        {"rep_range": "4-6", "weight": 75.0, "reps": 6, "date": "2024-01-15"},
+                        {"rep_range": "7-10", "weight": 70.0, "reps": 8, "date": "2024-01-15"},
+                    ],
+                },
+                response_only=True,
+            ),
+        ],
+        responses={
+            200: {"description": "エクササイズの成長分析"},
+            400: {"description": "エクササイズが指定されていない・使用できない、または日付形式が正しくない場合"},
+        },
+        tags=["トレーニング記録"]
+    )
+    @action(methods=['get'], detail=False, url_path='progress', url_name='progress')
+    def progress(self, request):
+        """エクササイズごとの成長分析を取得"""
+        try:
+            exercise_id = int(request.query_params.get('exercise', ''))
+        except ValueError:
+            return Response(
+                {"error": "exerciseにエクササイズIDを指定してください。"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        exercise = Exercise.objects.filter(
+            Q(is_official=True) | Q(created_by=request.user), id=exercise_id
+        ).only('id', 'name').first()
+        if exercise is None:
+            return Response(
+                {"error": "このエクササイズは存在しないか、使用する権限がありません。"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            date_from, date_to = (
+                date.fromisoformat(value) if value else None
+                for value in (request.query_params.get('date_from'), request.query_params.get('date_to'))
+            )
+        except ValueError:
+            return Response(
+                {"error": "日付形式が正しくありません。YYYY-MM-DD形式で入力してください。"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response({
+            "exercise": {"id": exercise.id, "name": exercise.name},
+            **get_exercise_progress(request.user, exercise.id, date_from, date_to),
+        })
+
+    def perform_create(self, serializer):
+        """トレーニングセッションを作成（成長分析のキャッシュを無効にする）"""
+        super().perform_create(serializer)
+        invalidate_exercise_progress(self.request.user.pk)
+
+    def perform_update(self, serializer):
+        """トレーニングセッションを更新（成長分析のキャッシュを無効にする）"""
+        super().perform_update(serializer)
+        invalidate_exercise_progress(self.request.user.pk)
+
+    def perform_destroy(self, instance):
+        """トレーニングセッションを削除（成長分析のキャッシュを無効にし、含まれていたエクササイズの自己ベストを再計算する）"""
+        exercise_ids = list(instance.workout_exercises.values_list('exercise_id', flat=True).distinct())
+        super().perform_destroy(instance)
+        invalidate_exercise_progress(self.request.user.pk)
+        rebuild_personal_records(self.request.user.pk, exercise_ids)
+
     def destroy(self, request, *args, **kwargs):
         """トレーニングセッションを削除"""
         instance = self.get_object()